@@ -0,0 +1,181 @@
+"""
+Connection-flood benchmark for the lobby server.
+
+Starts the lobby (main.py) on a free local port, logs --connections players
+in with up to --concurrency logins in flight, holds them all for --hold
+seconds (long enough for a keep-alive round by default), and then floods it
+with --pings status requests. Reports logins and pings per second, latency
+percentiles, and the server's memory and CPU use per held player.
+
+    python bench_flood.py
+    python bench_flood.py --connections 10000 --concurrency 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import closing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from main import DEFAULT_VERSION, LobbyPackets, raise_open_file_limit  # noqa: E402
+from quarry.types.buffer import Buffer  # noqa: E402
+
+DEFAULT_CONNECTIONS = 2000
+DEFAULT_CONCURRENCY = 200
+DEFAULT_PINGS = 5000
+DEFAULT_HOLD = 12.0
+WELCOME = "Welcome to the lobby!"
+
+
+def find_free_port():
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing is listening on port {port}.")
+
+
+def process_stats(pid):
+    """Resident memory in bytes and user+system CPU seconds of a process, from /proc (Linux only)."""
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return rss, (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def frame(data):
+    return Buffer.pack_varint(len(data)) + data
+
+
+def handshake(port, next_state):
+    return frame(
+        Buffer.pack_varint(0) + Buffer.pack_varint(DEFAULT_VERSION) + Buffer.pack_string("127.0.0.1")
+        + Buffer.pack("H", port) + Buffer.pack_varint(next_state)
+    )
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda p: round(values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000, 3)
+    return {"p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99), "max_ms": round(values[-1] * 1000, 3)}
+
+
+async def login(port, name, expected_bytes, held, latencies, semaphore):
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            login_start = Buffer.pack_varint(0) + Buffer.pack_string(name) + Buffer.pack("??", False, False)
+            writer.write(handshake(port, 2) + frame(login_start))
+            await reader.readexactly(expected_bytes)
+        except (OSError, asyncio.IncompleteReadError):
+            return
+        latencies.append(time.perf_counter() - start)
+        held.append(writer)
+
+
+async def ping(port, latencies, semaphore):
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(handshake(port, 1) + frame(b"\x00") + frame(b"\x01" + Buffer.pack("q", 1)))
+            await reader.read()
+            writer.close()
+        except OSError:
+            return
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args, port, pid):
+    lobby_packets = LobbyPackets(DEFAULT_VERSION, WELCOME)
+    names = ["bench%06d" % index for index in range(args.connections)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rss_before, _ = process_stats(pid)
+
+    held, login_latencies = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        login(port, name, len(lobby_packets.login_success(name)) + len(lobby_packets.world), held, login_latencies, semaphore)
+        for name in names
+    ))
+    login_seconds = time.perf_counter() - start
+
+    rss_held, cpu_start = process_stats(pid)
+    await asyncio.sleep(args.hold)
+    _, cpu_end = process_stats(pid)
+
+    ping_latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(ping(port, ping_latencies, semaphore) for _ in range(args.pings)))
+    ping_seconds = time.perf_counter() - start
+
+    for writer in held:
+        writer.close()
+    return {
+        "connections": args.connections,
+        "concurrency": args.concurrency,
+        "logins": {
+            "succeeded": len(login_latencies),
+            "per_second": round(len(login_latencies) / login_seconds),
+            "latency": percentiles(login_latencies),
+        },
+        "held": {
+            "players": len(held),
+            "rss_bytes": rss_held,
+            "rss_bytes_per_player": round((rss_held - rss_before) / len(held)) if held else None,
+            "idle_cpu_seconds": round(cpu_end - cpu_start, 3),
+            "seconds": args.hold,
+        },
+        "pings": {
+            "succeeded": len(ping_latencies),
+            "per_second": round(len(ping_latencies) / ping_seconds),
+            "latency": percentiles(ping_latencies),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flood the lobby server with logins and status pings.")
+    parser.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS, help=f"Players to log in and hold (default: {DEFAULT_CONNECTIONS}).")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"Logins or pings in flight at once (default: {DEFAULT_CONCURRENCY}).")
+    parser.add_argument("--pings", type=int, default=DEFAULT_PINGS, help=f"Status pings to send after the logins (default: {DEFAULT_PINGS}).")
+    parser.add_argument("--hold", type=float, default=DEFAULT_HOLD, help=f"Seconds to hold the players before the pings (default: {DEFAULT_HOLD:g}).")
+    args = parser.parse_args()
+
+    raise_open_file_limit()
+    port = find_free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "main.py"), "--listen-host", "127.0.0.1", "--listen-port", str(port),
+         "--max-players", str(args.connections), "--welcome", WELCOME],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        result = asyncio.run(run(args, port, server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=5)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
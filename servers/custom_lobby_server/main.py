@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import time
+from quarry.data import packets
+from quarry.data.data_packs import data_packs
+from quarry.types.buffer import buff_types
+from quarry.types.chat import Message
+from quarry.types.uuid import UUID
+
+# Protocol versions players can join with (1.19 and 1.19.1/1.19.2)
+SUPPORTED_VERSIONS = (759, 760)
+# Version announced to clients we can't hold
+DEFAULT_VERSION = 760
+# Seconds between keep-alives; clients disconnect after 30 seconds without one
+KEEPALIVE_INTERVAL = 10
+# Keep-alive rounds without any data from a player before it is dropped
+IDLE_ROUNDS = 3
+# Seconds a pre-encoded status response is reused before the player count is refreshed
+STATUS_TTL = 1.0
+# Most bytes a client may send before it is in the lobby (handshake, status, login)
+MAX_PREPLAY_BYTES = 8192
+# Seconds a client may take to get into the lobby (or finish a status ping) before it is dropped
+PREPLAY_TIMEOUT = 10
+
+# Connection states
+HANDSHAKE, STATUS, LOGIN, PLAY = range(4)
+
+
+def get_buff_type(protocol_version):
+    for version, buff_type in reversed(buff_types):
+        if protocol_version >= version:
+            return buff_type
+
+
+def read_varint(data, pos):
+    """
+    Reads a VarInt from `data` at `pos`. Returns (value, position after it),
+    or (None, pos) if the VarInt is not complete yet.
+    """
+    value = 0
+    for shift in range(0, 35, 7):
+        if pos >= len(data):
+            return None, pos
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+    raise ValueError("VarInt is too big")
+
+
+def read_string(data, pos):
+    length, pos = read_varint(data, pos)
+    if length is None or pos + length > len(data):
+        raise ValueError("String is too short")
+    return bytes(data[pos:pos + length]).decode("utf-8"), pos + length
+
+
+def encode_packet(buff_type, protocol_version, mode, name, *data):
+    """Returns the complete frame of a packet the lobby sends (uncompressed, unencrypted)."""
+    ident = packets.packet_idents[(protocol_version, mode, "downstream", name)]
+    body = buff_type.pack_varint(ident) + b"".join(data)
+    return buff_type.pack_varint(len(body)) + body
+
+
+# The packets of one protocol version that are the same for every player,
+# encoded once at startup.
+class LobbyPackets:
+    __slots__ = ("buff_type", "version", "login_success_ident", "world", "keepalive")
+
+    def __init__(self, version, welcome):
+        buff_type = self.buff_type = get_buff_type(version)
+        self.version = version
+        self.login_success_ident = buff_type.pack_varint(
+            packets.packet_idents[(version, "login", "downstream", "login_success")])
+
+        join_game = encode_packet(
+            buff_type, version, "play", "join_game",
+            buff_type.pack("i?Bb", 0, False, 3, -1),  # entity id, hardcore, spectator, no previous game mode
+            buff_type.pack_varint(1),
+            buff_type.pack_string("lobby"),  # dimension names
+            buff_type.pack_nbt(data_packs[version]),
+            buff_type.pack_string("minecraft:overworld"),  # dimension type
+            buff_type.pack_string("lobby"),  # dimension name
+            buff_type.pack("q", 0),  # hashed seed
+            buff_type.pack_varint(0),  # max players (unused)
+            buff_type.pack_varint(2),  # view distance
+            buff_type.pack_varint(2),  # simulation distance
+            buff_type.pack("????", False, False, False, True),  # reduced debug info, respawn screen, debug, flat
+            buff_type.pack("?", False),  # no death location
+        )
+        # Above the build limit, so the client leaves the terrain screen without any chunks
+        position = encode_packet(
+            buff_type, version, "play", "player_position_and_look",
+            buff_type.pack("dddffb", 0, 500, 0, 0, 0, 0),
+            buff_type.pack_varint(0),  # teleport id
+            buff_type.pack("?", False),  # dismount vehicle
+        )
+        world = join_game + position
+        if welcome:
+            message = buff_type.pack_chat(Message.from_string(welcome))
+            if version >= 760:
+                message += buff_type.pack("?", False)  # not in the action bar
+            else:
+                message += buff_type.pack_varint(1)  # system message
+            world += encode_packet(buff_type, version, "play", "system_message", message)
+        self.world = world
+        self.keepalive = encode_packet(buff_type, version, "play", "keep_alive", buff_type.pack("q", 0))
+
+    def login_success(self, name):
+        buff_type = self.buff_type
+        body = (
+            self.login_success_ident
+            + buff_type.pack_uuid(UUID.from_offline_player(name))
+            + buff_type.pack_string(name)
+            + buff_type.pack_varint(0)  # no profile properties
+        )
+        return buff_type.pack_varint(len(body)) + body
+
+
+# Status responses, encoded once per protocol version and reused until the
+# player count is STATUS_TTL seconds old.
+class StatusCache:
+    def __init__(self, server):
+        self.server = server
+        self.frames = {}
+        self.built = 0.0
+
+    def frame(self, protocol_version):
+        now = time.monotonic()
+        if now - self.built > STATUS_TTL:
+            self.frames.clear()
+            self.built = now
+        frame = self.frames.get(protocol_version)
+        if frame is None:
+            version = protocol_version if protocol_version in SUPPORTED_VERSIONS else DEFAULT_VERSION
+            buff_type = get_buff_type(version)
+            status = {
+                "version": {"name": packets.minecraft_versions[version], "protocol": version},
+                "players": {"online": len(self.server.players), "max": self.server.max_players, "sample": []},
+                "description": {"text": self.server.motd},
+            }
+            body = buff_type.pack_varint(0) + buff_type.pack_json(status)
+            frame = self.frames[protocol_version] = buff_type.pack_varint(len(body)) + body
+        return frame
+
+
+# One client connection. Players in the lobby keep only these few slots; what
+# they send is not parsed.
+class LobbyConnection(asyncio.Protocol):
+    __slots__ = ("server", "transport", "buffer", "state", "version", "seen", "deadline")
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.state = HANDSHAKE
+        self.version = None
+        self.seen = server.rounds
+        self.deadline = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.deadline = asyncio.get_running_loop().call_later(PREPLAY_TIMEOUT, transport.close)
+
+    def connection_lost(self, exc):
+        if self.deadline is not None:
+            self.deadline.cancel()
+            self.deadline = None
+        self.server.players.discard(self)
+
+    def data_received(self, data):
+        if self.state == PLAY:
+            self.seen = self.server.rounds
+            return
+
+        buffer = self.buffer
+        buffer.extend(data)
+        if len(buffer) > MAX_PREPLAY_BYTES:
+            self.transport.close()
+            return
+        if self.state == HANDSHAKE and buffer[0] == 0xFE:
+            # Legacy (pre-1.7) server list ping
+            self.transport.close()
+            return
+
+        pos = 0
+        try:
+            while self.state != PLAY and not self.transport.is_closing():
+                length, body = read_varint(buffer, pos)
+                if length is None or body + length > len(buffer):
+                    break
+                ident, start = read_varint(buffer, body)
+                if ident is None:
+                    raise ValueError("Empty packet")
+                pos = body + length
+                self.packet_received(ident, buffer[start:pos])
+        except (ValueError, UnicodeDecodeError):
+            self.transport.close()
+            return
+        del buffer[:pos]
+        if self.state == PLAY:
+            self.buffer = None
+
+    def packet_received(self, ident, payload):
+        if self.state == HANDSHAKE:
+            if ident != 0:
+                raise ValueError("Expected a handshake")
+            self.version, pos = read_varint(payload, 0)
+            _, pos = read_string(payload, pos)  # server address
+            next_state, _ = read_varint(payload, pos + 2)  # after the port
+            if next_state == 1:
+                self.state = STATUS
+            elif next_state == 2:
+                self.state = LOGIN
+            else:
+                raise ValueError("Unknown next state")
+        elif self.state == STATUS:
+            if ident == 0:
+                self.transport.write(self.server.status.frame(self.version))
+            elif ident == 1:
+                # Ping: echo the payload back as the pong
+                self.transport.write(bytes((len(payload) + 1, 1)) + payload)
+                self.transport.close()
+        elif self.state == LOGIN and ident == 0:
+            name, _ = read_string(payload, 0)
+            self.login(name)
+
+    def login(self, name):
+        server = self.server
+        lobby_packets = server.packets.get(self.version)
+        if lobby_packets is None:
+            self.kick("Please join with Minecraft %s." % " or ".join(
+                packets.minecraft_versions[version] for version in SUPPORTED_VERSIONS))
+        elif len(server.players) >= server.max_players:
+            self.kick("The lobby is full.")
+        elif not 0 < len(name) <= 16:
+            self.kick("Invalid player name.")
+        else:
+            self.transport.write(lobby_packets.login_success(name) + lobby_packets.world)
+            self.state = PLAY
+            self.seen = server.rounds
+            self.deadline.cancel()
+            self.deadline = None
+            server.players.add(self)
+
+    def kick(self, reason):
+        buff_type = get_buff_type(DEFAULT_VERSION)
+        body = buff_type.pack_varint(0) + buff_type.pack_chat(Message.from_string(reason))
+        self.transport.write(buff_type.pack_varint(len(body)) + body)
+        self.transport.close()
+
+
+# The lobby: the players in it, the precomputed packets and the keep-alive loop.
+class LobbyServer:
+    def __init__(self, motd, max_players, welcome):
+        self.motd = motd
+        self.max_players = max_players
+        self.players = set()
+        self.packets = {version: LobbyPackets(version, welcome) for version in SUPPORTED_VERSIONS}
+        self.status = StatusCache(self)
+        # Keep-alive rounds so far; a player's `seen` is the round it last sent data in
+        self.rounds = 0
+
+    async def keepalive_loop(self):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            self.rounds += 1
+            idle_before = self.rounds - IDLE_ROUNDS
+            for player in self.players:
+                if player.seen < idle_before:
+                    player.transport.close()
+                else:
+                    player.transport.write(self.packets[player.version].keepalive)
+
+    async def serve(self, host, port, backlog):
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: LobbyConnection(self), host, port, backlog=backlog)
+        keepalive = asyncio.create_task(self.keepalive_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            keepalive.cancel()
+
+
+def raise_open_file_limit():
+    """Raises the soft limit on open files to the hard limit, so the lobby can hold more players."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+    return soft
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a", "--listen-host", default="0.0.0.0", help="Host to listen on (default: 0.0.0.0)")
+    parser.add_argument("-p", "--listen-port", default=25565, type=int, help="Port to listen on (default: 25565)")
+    parser.add_argument("--motd", default="Lobby", help="Description shown in the server list (default: Lobby)")
+    parser.add_argument("--max-players", default=10000, type=int, help="Players the lobby holds at most (default: 10000)")
+    parser.add_argument("--welcome", default="Welcome to the lobby!", help="Chat message sent to players when they join; empty for none")
+    parser.add_argument("--backlog", default=4096, type=int, help="Pending connections the listening socket queues (default: 4096)")
+    args = parser.parse_args()
+
+    lobby = LobbyServer(args.motd, args.max_players, args.welcome)
+    open_files = raise_open_file_limit()
+
+    print("Lobby server started!")
+    print(f" >> Listening for players on {args.listen_host}:{args.listen_port}")
+    print(f" >> Minecraft versions: {', '.join(packets.minecraft_versions[version] for version in SUPPORTED_VERSIONS)}")
+    if open_files is not None:
+        print(f" >> Open file limit: {open_files}")
+    print("Press Ctrl+C to stop.", flush=True)
+    try:
+        asyncio.run(lobby.serve(args.listen_host, args.listen_port, args.backlog))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
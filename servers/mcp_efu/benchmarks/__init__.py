@@ -0,0 +1,13 @@
+"""
+Benchmarks for mcp_efu.
+
+    python -m benchmarks.treegen DIR ...    create a synthetic directory tree
+    python -m benchmarks.run ...            scan, hash, JSON and CLI benchmarks,
+                                            with JSON output and baseline comparison
+    python -m benchmarks.loadtest ...       concurrent load test of the TCP and stdio
+                                            transports
+    python benchmarks/bench_startup.py      CLI startup time gate
+    python benchmarks/bench_snapshot.py     snapshot format size and load time
+
+Run them from servers/mcp_efu.
+"""
@@ -0,0 +1,133 @@
+"""
+Snapshot format benchmark for mcp_efu.
+
+Builds a synthetic listing (a deep tree of realistic paths, no files are
+created), saves it as a JSON listing (as written by the CLI), as NDJSON and
+as a binary snapshot, and compares the file sizes and the time to load each
+one: a full parse for JSON and NDJSON, and opening plus reading random rows
+and iterating everything for the snapshot.
+
+    python benchmarks/bench_snapshot.py --entries 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_ROOT))
+
+from mcp_efu.listing import iter_listing, path_sort_key, write_listing  # noqa: E402
+from mcp_efu.reader import SnapshotListing  # noqa: E402
+from mcp_efu.snapshot import write_snapshot  # noqa: E402
+
+DEFAULT_ENTRIES = 100_000
+DEFAULT_RANDOM_READS = 1000
+# 2024-05-01 as a Windows FILETIME
+BASE_FILETIME = 133589088000000000
+
+
+def synthetic_entries(count: int, seed: int = 0) -> list[dict]:
+    """Returns `count` file entries below /home/user/projects, sorted by path."""
+    rng = random.Random(seed)
+    entries = []
+    directory = 0
+    while len(entries) < count:
+        parent = f"/home/user/projects/project{directory // 100:03}/src/module{directory % 100:02}"
+        for index in range(rng.randint(5, 60)):
+            timestamp = BASE_FILETIME + rng.randrange(10 ** 14)
+            entries.append({
+                "filename": f"{parent}/file_{index:04}_{rng.choice(('core', 'util', 'test', 'data'))}.py",
+                "size": rng.randrange(1 << 20),
+                "date_modified": timestamp,
+                "date_created": timestamp - rng.randrange(10 ** 12),
+                "attributes": 32,
+            })
+        directory += 1
+    del entries[count:]
+    entries.sort(key=lambda entry: path_sort_key(entry["filename"]))
+    return entries
+
+
+def timed(func) -> tuple[float, object]:
+    start = time.perf_counter()
+    value = func()
+    return time.perf_counter() - start, value
+
+
+def run(entries: list[dict], random_reads: int, workdir: str) -> dict:
+    paths = {fmt: os.path.join(workdir, f"listing.{fmt}") for fmt in ("json", "ndjson")}
+    for fmt, path in paths.items():
+        with open(path, "w", encoding="utf-8") as handle:
+            write_listing(entries, fmt, handle)
+    paths["snapshot"] = os.path.join(workdir, "listing.efusnap")
+    with open(paths["snapshot"], "wb") as handle:
+        write_snapshot(entries, handle)
+
+    def load_json():
+        with open(paths["json"], encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def random_rows():
+        rng = random.Random(1)
+        with SnapshotListing(paths["snapshot"]) as snapshot:
+            return [snapshot[rng.randrange(len(snapshot))] for _ in range(random_reads)]
+
+    def iterate_snapshot():
+        with SnapshotListing(paths["snapshot"]) as snapshot:
+            return sum(1 for _ in snapshot)
+
+    open_seconds, snapshot = timed(lambda: SnapshotListing(paths["snapshot"]))
+    snapshot.close()
+    json_seconds, loaded = timed(load_json)
+    ndjson_seconds, _ = timed(lambda: list(iter_listing(paths["ndjson"])))
+    random_seconds, _ = timed(random_rows)
+    iterate_seconds, iterated = timed(iterate_snapshot)
+    assert len(loaded) == iterated == len(entries)
+
+    return {
+        "entries": len(entries),
+        "bytes": {fmt: os.path.getsize(path) for fmt, path in paths.items()},
+        "seconds": {
+            "json_load": json_seconds,
+            "ndjson_load": ndjson_seconds,
+            "snapshot_open": open_seconds,
+            f"snapshot_{random_reads}_random_rows": random_seconds,
+            "snapshot_iterate": iterate_seconds,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the snapshot format with JSON listings.")
+    parser.add_argument("--entries", type=int, default=DEFAULT_ENTRIES, help=f"Number of synthetic entries (default: {DEFAULT_ENTRIES}).")
+    parser.add_argument(
+        "--random-reads",
+        type=int,
+        default=DEFAULT_RANDOM_READS,
+        help=f"Number of random rows read from the snapshot (default: {DEFAULT_RANDOM_READS}).",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON.")
+    args = parser.parse_args()
+
+    entries = synthetic_entries(args.entries)
+    with tempfile.TemporaryDirectory() as workdir:
+        result = run(entries, args.random_reads, workdir)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    sizes = result["bytes"]
+    print(f"{result['entries']} entries")
+    for fmt, size in sizes.items():
+        print(f"  {fmt:<10} {size / 1e6:10.2f} MB  ({size / sizes['snapshot']:.1f}x snapshot)")
+    for name, seconds in result["seconds"].items():
+        print(f"  {name:<30} {seconds * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
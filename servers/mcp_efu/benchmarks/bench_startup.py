@@ -0,0 +1,95 @@
+"""
+Startup benchmark for the mcp_efu CLI.
+
+Measures the wall-clock time of one-off CLI scans of a tiny directory (so the
+result is dominated by interpreter start and imports) and checks that the CLI
+path does not import server-only modules. Exits with status 1 if the median
+exceeds --threshold, so it can be used as a regression gate.
+
+    python benchmarks/bench_startup.py --runs 10 --threshold 0.5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that must only be loaded in server mode
+SERVER_ONLY_MODULES = ("fastmcp", "mcp", "anyio", "pydantic", "asyncio")
+
+DEFAULT_RUNS = 10
+DEFAULT_THRESHOLD_SECONDS = 0.5
+
+
+def _env():
+    env = os.environ.copy()
+    env["PYTHONPATH"] = str(PACKAGE_ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def time_cli_scan(target: str, runs: int) -> list[float]:
+    command = [sys.executable, "-m", "mcp_efu", target]
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, capture_output=True, check=True, env=_env())
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def server_modules_loaded_by_cli() -> list[str]:
+    probe = (
+        "import sys, json, mcp_efu.main;"
+        f"print(json.dumps([m for m in {SERVER_ONLY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True, env=_env())
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mcp_efu CLI startup time.")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help=f"Number of timed runs (default: {DEFAULT_RUNS}).")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD_SECONDS,
+        help=f"Fail if the median startup time exceeds this many seconds (default: {DEFAULT_THRESHOLD_SECONDS}).",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as target:
+        Path(target, "file.txt").write_text("x")
+        timings = time_cli_scan(target, args.runs)
+    loaded = server_modules_loaded_by_cli()
+
+    result = {
+        "runs": args.runs,
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "max_seconds": max(timings),
+        "threshold_seconds": args.threshold,
+        "server_modules_loaded": loaded,
+    }
+    result["passed"] = result["median_seconds"] <= args.threshold and not loaded
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"CLI startup over {args.runs} runs: min {result['min_seconds']:.3f}s, "
+              f"median {result['median_seconds']:.3f}s, max {result['max_seconds']:.3f}s "
+              f"(threshold {args.threshold:.3f}s)")
+        if loaded:
+            print(f"Server-only modules imported by the CLI path: {', '.join(loaded)}")
+        print("PASS" if result["passed"] else "FAIL")
+    sys.exit(0 if result["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+"""
+Concurrent load test for the mcp_efu TCP and stdio transports.
+
+Opens --connections connections to an mcp_efu server and replays a weighted
+mix of requests for --duration seconds, then reports latency percentiles
+(p50/p95/p99) per request kind, throughput, errors and the server's resident
+memory sampled over the run.
+
+By default a TCP server is spawned locally on a free port and a small tree is
+generated for it to serve; --address targets a server that is already
+running instead (memory is then not sampled). With --transport stdio, one
+MCP server process is spawned per connection, as agents that launch their
+own stdio server would, tools are called through tools/call, and the memory
+of all of them is added up.
+
+With --rate, requests are started at that many per second in total (open
+loop); latency is measured from when a request was due, so time spent
+waiting for a free connection counts. Without it, every connection sends its
+next request as soon as the previous one is answered (closed loop).
+
+    python -m benchmarks.loadtest --connections 500 --duration 30 --rate 2000
+    python -m benchmarks.loadtest --mix list=1,hash=1,tools=8 --output load.json
+    python -m benchmarks.loadtest --address 127.0.0.1:8765 --connections 50
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shlex
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_ROOT))
+
+from benchmarks.treegen import generate_tree  # noqa: E402
+from mcp_efu.remote import parse_address  # noqa: E402
+
+DEFAULT_CONNECTIONS = 50
+DEFAULT_DURATION_SECONDS = 10.0
+DEFAULT_MIX = "list=1,summary=1,hash=1,tools=2"
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 0.5
+DEFAULT_SERVER_START_TIMEOUT_SECONDS = 15.0
+PERCENTILES = (50, 95, 99)
+# Responses such as large listings arrive as one line; allow lines of up to 256 MiB
+STREAM_LIMIT = 256 * 1024 * 1024
+MCP_PROTOCOL_VERSION = "2025-03-26"
+# Small tree served by a spawned server: 85 directories and 850 files
+TREE_DEPTH = 3
+TREE_FANOUT = 4
+TREE_FILES_PER_DIR = 10
+HASH_FILES = 8
+HASH_FILE_SIZE = 1024 * 1024
+
+
+def request_kinds(tree: str, hash_files: list[str]) -> dict:
+    """Maps each request kind of --mix to a function returning (method, params)."""
+    hash_cycle = itertools.cycle(hash_files)
+    return {
+        "tools": lambda: ("tools/list", None),
+        "list": lambda: ("get_file_list", {"path": tree}),
+        "summary": lambda: ("get_tree_summary", {"path": tree}),
+        "hash": lambda: ("get_md5_hash", {"path": next(hash_cycle)}),
+        "estimate": lambda: ("estimate_tree", {"path": tree, "time_budget": 0.05}),
+    }
+
+
+def parse_mix(mix: str, kinds: dict) -> tuple[list[str], list[float]]:
+    """Parses 'kind=weight,...' into parallel lists of kinds and weights."""
+    names, weights = [], []
+    for item in mix.split(","):
+        name, sep, weight = item.strip().partition("=")
+        if name not in kinds:
+            raise ValueError(f"Unknown request kind '{name}' in --mix. Expected one of {', '.join(kinds)}.")
+        try:
+            value = float(weight) if sep else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight '{weight}' for '{name}' in --mix.") from None
+        if value > 0:
+            names.append(name)
+            weights.append(value)
+    if not names:
+        raise ValueError("--mix must give at least one request kind a positive weight.")
+    return names, weights
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    values = sorted(latencies)
+    summary = {"count": len(values)}
+    for pct in PERCENTILES:
+        value = percentile(values, pct)
+        summary[f"p{pct}_ms"] = None if value is None else round(value * 1000, 3)
+    summary["max_ms"] = round(values[-1] * 1000, 3) if values else None
+    return summary
+
+
+def process_rss(pid: int) -> int | None:
+    """Returns the resident set size of a process in bytes (Linux), or None."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class Connection:
+    """One JSON-RPC connection; requests on it are sent one at a time."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._ids = itertools.count(1)
+
+    async def read_hello(self):
+        hello = json.loads(await self.reader.readline())
+        if hello.get("method") != "server/hello":
+            raise ConnectionError(f"Unexpected greeting from server: {hello}")
+
+    async def call(self, method: str, params) -> bool:
+        """Sends one request and waits for its response; returns False on a JSON-RPC error."""
+        req_id = next(self._ids)
+        request = {"jsonrpc": "2.0", "method": method, "id": req_id}
+        if params is not None:
+            request["params"] = params
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("Server closed the connection.")
+            response = json.loads(line)
+            if response.get("id") == req_id:
+                return self._succeeded(response)
+
+    def _succeeded(self, response: dict) -> bool:
+        return "error" not in response
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, BrokenPipeError):
+            pass
+
+
+class McpConnection(Connection):
+    """
+    A connection to a `--transport stdio` server, which speaks MCP: tools are
+    called through tools/call after an initialize handshake.
+    """
+
+    async def read_hello(self):
+        request = {
+            "jsonrpc": "2.0",
+            "method": "initialize",
+            "id": 0,
+            "params": {
+                "protocolVersion": MCP_PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "mcp_efu-loadtest", "version": "0.1.0"},
+            },
+        }
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("Server closed the connection during initialize.")
+            response = json.loads(line)
+            if response.get("id") == 0:
+                break
+        if "error" in response:
+            raise ConnectionError(f"initialize failed: {response['error']}")
+        self.writer.write(json.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"}).encode() + b"\n")
+        await self.writer.drain()
+
+    async def call(self, method: str, params) -> bool:
+        if method == "tools/list":
+            return await super().call(method, params)
+        return await super().call("tools/call", {"name": method, "arguments": params or {}})
+
+    def _succeeded(self, response: dict) -> bool:
+        return "error" not in response and not response.get("result", {}).get("isError", False)
+
+
+class LoadTest:
+    """Drives the connections and collects the measurements."""
+
+    def __init__(self, connections: list[Connection], kinds: dict, names: list[str], weights: list[float], seed: int):
+        self.connections = connections
+        self.kinds = kinds
+        self.names = names
+        self.weights = weights
+        self.rng = random.Random(seed)
+        self.latencies: dict[str, list[float]] = {name: [] for name in names}
+        self.errors: dict[str, int] = {name: 0 for name in names}
+        self.failures: list[str] = []
+        self.completed = 0
+
+    async def _request(self, connection: Connection, due: float):
+        name = self.rng.choices(self.names, self.weights)[0]
+        method, params = self.kinds[name]()
+        try:
+            ok = await connection.call(method, params)
+        except (ConnectionError, OSError, ValueError) as e:
+            ok = False
+            if len(self.failures) < 10:
+                self.failures.append(f"{name}: {e}")
+        self.latencies[name].append(time.perf_counter() - due)
+        self.completed += 1
+        if not ok:
+            self.errors[name] += 1
+
+    async def closed_loop(self, duration: float):
+        deadline = time.perf_counter() + duration
+
+        async def worker(connection: Connection):
+            while time.perf_counter() < deadline:
+                await self._request(connection, time.perf_counter())
+
+        await asyncio.gather(*(worker(connection) for connection in self.connections))
+
+    async def open_loop(self, duration: float, rate: float):
+        idle: asyncio.Queue[Connection] = asyncio.Queue()
+        for connection in self.connections:
+            idle.put_nowait(connection)
+        in_flight = set()
+
+        async def send(connection: Connection, due: float):
+            try:
+                await self._request(connection, due)
+            finally:
+                idle.put_nowait(connection)
+
+        start = time.perf_counter()
+        for index in itertools.count():
+            due = start + index / rate
+            if due - start >= duration:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            connection = await idle.get()
+            task = asyncio.create_task(send(connection, due))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+
+async def sample_rss(pids: list[int], interval: float, start: float, test: LoadTest, samples: list, stop: asyncio.Event):
+    while True:
+        sizes = [process_rss(pid) for pid in pids]
+        samples.append({
+            "t": round(time.perf_counter() - start, 3),
+            "rss_bytes": None if None in sizes else sum(sizes),
+            "completed": test.completed,
+        })
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+
+def _server_env() -> dict:
+    env = os.environ.copy()
+    env["PYTHONPATH"] = str(PACKAGE_ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def spawn_tcp_server(server_args: list[str], workdir: str):
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "mcp_efu", "--transport", "tcp", "--host", "127.0.0.1", "--port", str(port),
+        "--jobs-dir", os.path.join(workdir, "jobs"), *server_args,
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL, env=_server_env(),
+    )
+    deadline = time.monotonic() + DEFAULT_SERVER_START_TIMEOUT_SECONDS
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if process.returncode is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError(f"The spawned TCP server did not start listening on port {port}.")
+            await asyncio.sleep(0.05)
+            continue
+        writer.close()
+        return process, ("127.0.0.1", port)
+
+
+async def open_tcp_connections(address: tuple[str, int], count: int) -> tuple[list[Connection], list[float]]:
+    """Opens `count` connections at once; returns them with each one's time to hello."""
+
+    async def open_one():
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(*address, limit=STREAM_LIMIT)
+        connection = Connection(reader, writer)
+        await connection.read_hello()
+        return connection, time.perf_counter() - start
+
+    opened = await asyncio.gather(*(open_one() for _ in range(count)))
+    return [connection for connection, _ in opened], [seconds for _, seconds in opened]
+
+
+async def open_stdio_connections(server_args: list[str], workdir: str, count: int):
+    """Spawns one stdio server per connection; returns the connections, times to hello and processes."""
+
+    async def open_one(index: int):
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "mcp_efu", "--transport", "stdio",
+            "--jobs-dir", os.path.join(workdir, f"jobs_{index}"), *server_args,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            env=_server_env(), limit=STREAM_LIMIT,
+        )
+        connection = McpConnection(process.stdout, process.stdin)
+        await connection.read_hello()
+        return connection, time.perf_counter() - start, process
+
+    opened = await asyncio.gather(*(open_one(index) for index in range(count)))
+    return [item[0] for item in opened], [item[1] for item in opened], [item[2] for item in opened]
+
+
+def prepare_tree(workdir: str) -> tuple[str, list[str]]:
+    tree = os.path.join(workdir, "tree")
+    generate_tree(tree, TREE_DEPTH, TREE_FANOUT, TREE_FILES_PER_DIR)
+    hash_files = []
+    for index in range(HASH_FILES):
+        path = os.path.join(workdir, f"hash_{index}.bin")
+        with open(path, "wb") as handle:
+            handle.write(os.urandom(HASH_FILE_SIZE))
+        hash_files.append(path)
+    return tree, hash_files
+
+
+async def run(args, workdir: str) -> dict:
+    if args.tree is not None:
+        tree = str(Path(args.tree).resolve())
+        hash_files = [str(Path(path).resolve()) for path in args.hash_file] if args.hash_file else []
+    else:
+        tree, hash_files = prepare_tree(workdir)
+        hash_files += [str(Path(path).resolve()) for path in args.hash_file or []]
+    kinds = request_kinds(tree, hash_files)
+    names, weights = parse_mix(args.mix, kinds)
+    if "hash" in names and not hash_files:
+        raise ValueError("The 'hash' request kind needs --hash-file when --tree is given.")
+    server_args = shlex.split(args.server_args)
+
+    processes = []
+    if args.transport == "stdio":
+        connections, connect_times, processes = await open_stdio_connections(server_args, workdir, args.connections)
+        target = f"{args.connections} stdio server processes"
+    else:
+        if args.address:
+            address = parse_address(args.address)
+        else:
+            process, address = await spawn_tcp_server(server_args, workdir)
+            processes.append(process)
+        connections, connect_times = await open_tcp_connections(address, args.connections)
+        target = f"tcp {address[0]}:{address[1]}"
+
+    test = LoadTest(connections, kinds, names, weights, args.seed)
+    rss_samples = []
+    stop = asyncio.Event()
+    start = time.perf_counter()
+    sampler = None
+    if processes:
+        pids = [process.pid for process in processes]
+        sampler = asyncio.create_task(sample_rss(pids, args.sample_interval, start, test, rss_samples, stop))
+    try:
+        if args.rate:
+            await test.open_loop(args.duration, args.rate)
+        else:
+            await test.closed_loop(args.duration)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        if sampler is not None:
+            await sampler
+        await asyncio.gather(*(connection.close() for connection in connections), return_exceptions=True)
+        for process in processes:
+            if process.returncode is None:
+                process.terminate()
+        for process in processes:
+            await process.wait()
+
+    all_latencies = [value for values in test.latencies.values() for value in values]
+    rss_values = [sample["rss_bytes"] for sample in rss_samples if sample["rss_bytes"] is not None]
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "target": target,
+            "transport": args.transport,
+            "connections": args.connections,
+            "duration_seconds": args.duration,
+            "mode": "open" if args.rate else "closed",
+            "target_rate": args.rate,
+            "mix": dict(zip(names, weights)),
+            "server_args": server_args,
+            "tree": tree,
+        },
+        "requests": test.completed,
+        "errors": sum(test.errors.values()),
+        "failures": test.failures,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(test.completed / elapsed, 2) if elapsed else None,
+        "connect": latency_summary(connect_times),
+        "latency": latency_summary(all_latencies),
+        "by_kind": {
+            name: dict(latency_summary(test.latencies[name]), errors=test.errors[name]) for name in names
+        },
+        "rss": {
+            "peak_bytes": max(rss_values) if rss_values else None,
+            "samples": rss_samples,
+        },
+    }
+
+
+def print_report(result: dict):
+    out = sys.stderr
+    print(f"Target: {result['meta']['target']}, {result['meta']['connections']} connections, {result['meta']['mode']} loop", file=out)
+    print(f"Requests: {result['requests']} in {result['elapsed_seconds']} s ({result['throughput_rps']} req/s), errors: {result['errors']}", file=out)
+    print(f"{'kind':<10} {'count':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10} {'errors':>7}", file=out)
+    rows = list(result["by_kind"].items()) + [("connect", result["connect"]), ("all", result["latency"])]
+    for name, summary in rows:
+        cells = [summary[key] for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        cells = ["-" if value is None else f"{value:.2f}" for value in cells]
+        print(f"{name:<10} {summary['count']:>8} {cells[0]:>10} {cells[1]:>10} {cells[2]:>10} {cells[3]:>10} {summary.get('errors', ''):>7}", file=out)
+    if result["rss"]["peak_bytes"] is not None:
+        print(f"Peak server RSS: {result['rss']['peak_bytes'] / (1024 * 1024):.1f} MiB", file=out)
+    for failure in result["failures"]:
+        print(f"  failure: {failure}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the mcp_efu TCP and stdio transports.")
+    parser.add_argument("--transport", choices=["tcp", "stdio"], default="tcp", help="Transport to test (default: tcp).")
+    parser.add_argument("--address", metavar="HOST:PORT", default=None, help="Test a running TCP server instead of spawning one.")
+    parser.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS, help=f"Number of connections (default: {DEFAULT_CONNECTIONS}).")
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=DEFAULT_DURATION_SECONDS,
+        help=f"Seconds to send requests for (default: {DEFAULT_DURATION_SECONDS:g}).",
+    )
+    parser.add_argument("--rate", type=float, default=None, help="Total requests per second to start (default: closed loop, as fast as answered).")
+    parser.add_argument(
+        "--mix",
+        default=DEFAULT_MIX,
+        help=f"Weighted request kinds: tools, list, summary, hash, estimate (default: {DEFAULT_MIX}).",
+    )
+    parser.add_argument("--tree", default=None, help="Directory to list (default: a generated tree). Must be readable by the server.")
+    parser.add_argument("--hash-file", metavar="FILE", action="append", default=None, help="File to hash (repeatable; default: generated 1 MiB files).")
+    parser.add_argument("--server-args", default="", help="Extra arguments for spawned servers, e.g. \"--max-workers 16 --cache-ttl 0\".")
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=DEFAULT_SAMPLE_INTERVAL_SECONDS,
+        help=f"Seconds between server memory samples (default: {DEFAULT_SAMPLE_INTERVAL_SECONDS:g}).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the request mix (default: 0).")
+    parser.add_argument("--output", metavar="FILE", default=None, help="Write the result JSON to FILE instead of stdout.")
+    args = parser.parse_args()
+    if args.connections < 1 or args.duration <= 0 or (args.rate is not None and args.rate <= 0):
+        parser.error("--connections, --duration and --rate must be positive.")
+    if args.address and args.transport != "tcp":
+        parser.error("--address can only be used with --transport tcp.")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            result = asyncio.run(run(args, workdir))
+        except (ValueError, RuntimeError, ConnectionError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    print_report(result)
+    encoded = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(encoded + "\n", encoding="utf-8")
+    else:
+        print(encoded)
+
+
+if __name__ == "__main__":
+    main()
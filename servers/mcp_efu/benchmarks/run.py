@@ -0,0 +1,200 @@
+"""
+Scan, hash, JSON encoding and CLI benchmarks for mcp_efu.
+
+Builds a synthetic tree with benchmarks.treegen (or uses --tree), runs each
+benchmark --repeat times and keeps the best run, and writes the results as
+JSON. With --baseline, every metric is compared with a stored result and the
+run fails (exit status 1) if one got worse by more than --tolerance, so the
+suite can gate changes to EfuFileManager.
+
+    python -m benchmarks.run --output result.json
+    python -m benchmarks.run --baseline baseline.json --tolerance 0.15
+    python -m benchmarks.run --save-baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_ROOT))
+
+from benchmarks.treegen import generate_tree, count_entries  # noqa: E402
+from mcp_efu.core import EfuFileManager  # noqa: E402
+from mcp_efu.diff import HASH_METHODS  # noqa: E402
+
+BENCHMARKS = ("scan", "hash", "json", "cli")
+DEFAULT_REPEAT = 3
+DEFAULT_HASH_MB = 64
+DEFAULT_TOLERANCE = 0.2
+# Default tree: 585 directories and 11700 files
+DEFAULT_DEPTH = 3
+DEFAULT_FANOUT = 8
+DEFAULT_FILES_PER_DIR = 20
+
+
+def best_of(repeat: int, func) -> tuple[float, object]:
+    """Runs func `repeat` times; returns the shortest time and the last value."""
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def metric(value: float, unit: str, higher_is_better: bool) -> dict:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def bench_scan(tree: str, repeat: int) -> dict:
+    manager = EfuFileManager()
+    results = {}
+    for name, options in (("scan", {}), ("scan_name_order", {"name_order": True}), ("scan_dir_sizes", {"dir_sizes": True})):
+        seconds, entries = best_of(repeat, lambda: manager.get_file_list(tree, **options))
+        results[f"{name}.entries_per_second"] = metric(len(entries) / seconds, "entries/s", True)
+    return results
+
+
+def bench_hash(workdir: str, size_mb: int, repeat: int) -> dict:
+    path = Path(workdir, "hash_input.bin")
+    with open(path, "wb") as handle:
+        chunk = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            handle.write(chunk)
+    manager = EfuFileManager()
+    results = {}
+    for method in HASH_METHODS:
+        hash_file = getattr(manager, f"get_{method}_hash")
+        seconds, _ = best_of(repeat, lambda: hash_file(str(path)))
+        results[f"hash.{method}.mb_per_second"] = metric(size_mb / seconds, "MiB/s", True)
+    path.unlink()
+    return results
+
+
+def bench_json(tree: str, repeat: int) -> dict:
+    entries = EfuFileManager().get_file_list(tree)
+    seconds, encoded = best_of(repeat, lambda: json.dumps(entries))
+    return {
+        "json_encode.entries_per_second": metric(len(entries) / seconds, "entries/s", True),
+        "json_encode.mb_per_second": metric(len(encoded) / (1024 * 1024) / seconds, "MiB/s", True),
+    }
+
+
+def bench_cli(tree: str, workdir: str, repeat: int) -> dict:
+    env = os.environ.copy()
+    env["PYTHONPATH"] = str(PACKAGE_ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    output = os.path.join(workdir, "cli_output.ndjson")
+    command = [sys.executable, "-m", "mcp_efu", tree, "--format", "ndjson", "--output", output]
+    seconds, _ = best_of(repeat, lambda: subprocess.run(command, capture_output=True, check=True, env=env))
+    return {"cli_scan.seconds": metric(seconds, "s", False)}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> dict:
+    """Compares each metric with the baseline; a change beyond `tolerance` in the wrong direction is a regression."""
+    comparison = {}
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            continue
+        change = (current["value"] - base["value"]) / base["value"]
+        worse = -change if current["higher_is_better"] else change
+        comparison[name] = {
+            "baseline": base["value"],
+            "current": current["value"],
+            "change": change,
+            "regression": worse > tolerance,
+        }
+    return comparison
+
+
+def run(args, workdir: str) -> dict:
+    tree_info = None
+    tree = args.tree
+    if tree is None:
+        tree = os.path.join(workdir, "tree")
+        tree_info = generate_tree(tree, args.depth, args.fanout, args.files_per_dir)
+
+    results = {}
+    if "scan" in args.only:
+        results.update(bench_scan(tree, args.repeat))
+    if "hash" in args.only:
+        results.update(bench_hash(workdir, args.hash_mb, args.repeat))
+    if "json" in args.only:
+        results.update(bench_json(tree, args.repeat))
+    if "cli" in args.only:
+        results.update(bench_cli(tree, workdir, args.repeat))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+            "tree": tree_info or {"root": str(Path(tree).resolve())},
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mcp_efu benchmark suite.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS), help="Benchmarks to run (default: all).")
+    parser.add_argument("--tree", default=None, help="Scan this existing directory instead of a generated tree.")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help=f"Generated tree depth (default: {DEFAULT_DEPTH}).")
+    parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help=f"Generated tree fan-out (default: {DEFAULT_FANOUT}).")
+    parser.add_argument(
+        "--files-per-dir",
+        type=int,
+        default=DEFAULT_FILES_PER_DIR,
+        help=f"Files per generated directory (default: {DEFAULT_FILES_PER_DIR}).",
+    )
+    parser.add_argument("--hash-mb", type=int, default=DEFAULT_HASH_MB, help=f"Size of the hashed file in MiB (default: {DEFAULT_HASH_MB}).")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"Runs per benchmark; the best is kept (default: {DEFAULT_REPEAT}).")
+    parser.add_argument("--output", metavar="FILE", default=None, help="Write the result JSON to FILE instead of stdout.")
+    parser.add_argument("--baseline", metavar="FILE", default=None, help="Compare with a previous result and fail on regressions.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Relative slowdown allowed before a metric counts as a regression (default: {DEFAULT_TOLERANCE}).",
+    )
+    parser.add_argument("--save-baseline", metavar="FILE", default=None, help="Also write the result to FILE for later --baseline runs.")
+    args = parser.parse_args()
+
+    if args.tree is None:
+        planned = count_entries(args.depth, args.fanout, args.files_per_dir)
+        print(f"Generating a tree of {planned['dirs'] + planned['files']} entries", file=sys.stderr)
+    with tempfile.TemporaryDirectory() as workdir:
+        result = run(args, workdir)
+
+    passed = True
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        result["comparison"] = compare(result["results"], baseline["results"], args.tolerance)
+        regressions = [name for name, item in result["comparison"].items() if item["regression"]]
+        passed = not regressions
+        for name, item in result["comparison"].items():
+            flag = "REGRESSION" if item["regression"] else "ok"
+            print(f"  {name:<40} {item['baseline']:14.2f} -> {item['current']:14.2f} ({item['change']:+.1%}) {flag}", file=sys.stderr)
+
+    encoded = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(encoded + "\n", encoding="utf-8")
+    else:
+        print(encoded)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(encoded + "\n", encoding="utf-8")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Deterministic synthetic directory trees for benchmarks.
+
+A tree is `depth` levels of `fanout` subdirectories per directory, with
+`files_per_dir` files in every directory; the same arguments and seed
+always produce the same names and sizes. Files are sparse by default (sized
+with truncate, no data written), so trees with millions of entries take
+little disk space and little time to create; pass --content to write
+pseudo-random data instead, for benchmarks that read the files.
+
+    python -m benchmarks.treegen /tmp/tree --depth 4 --fanout 8 --files-per-dir 20
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+DEFAULT_DEPTH = 3
+DEFAULT_FANOUT = 4
+DEFAULT_FILES_PER_DIR = 10
+DEFAULT_MEAN_SIZE = 16 * 1024
+DEFAULT_SEED = 0
+
+_EXTENSIONS = (".txt", ".py", ".json", ".log", ".jpg", ".bin", ".md", "")
+# Sigma of the lognormal size distribution; gives a long tail of large files
+_LOGNORMAL_SIGMA = 1.5
+_CONTENT_CHUNK = 1024 * 1024
+
+
+def count_entries(depth: int, fanout: int, files_per_dir: int) -> dict:
+    """Returns the number of directories (including the root) and files a tree will have."""
+    dirs = sum(fanout ** level for level in range(depth + 1))
+    return {"dirs": dirs, "files": dirs * files_per_dir}
+
+
+def size_sampler(distribution: str, mean_size: int, rng: random.Random):
+    """Returns a function producing file sizes with the given distribution and mean."""
+    if distribution == "fixed":
+        return lambda: mean_size
+    if distribution == "uniform":
+        return lambda: rng.randint(0, 2 * mean_size)
+    if distribution == "lognormal":
+        mu = math.log(max(mean_size, 1)) - _LOGNORMAL_SIGMA ** 2 / 2
+        return lambda: int(rng.lognormvariate(mu, _LOGNORMAL_SIGMA))
+    raise ValueError(f"Unknown size distribution '{distribution}'. Expected one of {', '.join(SIZE_DISTRIBUTIONS)}.")
+
+
+def generate_tree(
+    root: str,
+    depth: int = DEFAULT_DEPTH,
+    fanout: int = DEFAULT_FANOUT,
+    files_per_dir: int = DEFAULT_FILES_PER_DIR,
+    size_distribution: str = "lognormal",
+    mean_size: int = DEFAULT_MEAN_SIZE,
+    seed: int = DEFAULT_SEED,
+    content: bool = False,
+) -> dict:
+    """
+    Creates the tree below `root` (which must not exist or be empty) and
+    returns its parameters with the number of directories, files and bytes.
+    """
+    root_path = Path(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+    if any(root_path.iterdir()):
+        raise ValueError(f"'{root}' is not empty.")
+    rng = random.Random(seed)
+    next_size = size_sampler(size_distribution, mean_size, rng)
+    data = random.Random(seed + 1).randbytes(_CONTENT_CHUNK) if content else None
+
+    dirs = files = total_bytes = 0
+    # Depth-first with an explicit stack; each item is (directory, level)
+    stack = [(root_path, 0)]
+    while stack:
+        directory, level = stack.pop()
+        dirs += 1
+        for index in range(files_per_dir):
+            size = next_size()
+            name = f"file_{index:04}{_EXTENSIONS[rng.randrange(len(_EXTENSIONS))]}"
+            _write_file(directory / name, size, data)
+            files += 1
+            total_bytes += size
+        if level < depth:
+            for index in range(fanout):
+                child = directory / f"dir_{index:03}"
+                child.mkdir()
+                stack.append((child, level + 1))
+
+    return {
+        "root": str(root_path.resolve()),
+        "depth": depth,
+        "fanout": fanout,
+        "files_per_dir": files_per_dir,
+        "size_distribution": size_distribution,
+        "mean_size": mean_size,
+        "seed": seed,
+        "content": content,
+        "dirs": dirs,
+        "files": files,
+        "bytes": total_bytes,
+    }
+
+
+def _write_file(path: Path, size: int, data: bytes | None):
+    with open(path, "wb") as handle:
+        if data is None:
+            handle.truncate(size)
+            return
+        remaining = size
+        while remaining > 0:
+            chunk = data[:min(remaining, len(data))]
+            handle.write(chunk)
+            remaining -= len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a deterministic synthetic directory tree.")
+    parser.add_argument("root", help="Directory to create the tree in (must not exist or be empty).")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help=f"Levels of subdirectories (default: {DEFAULT_DEPTH}).")
+    parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help=f"Subdirectories per directory (default: {DEFAULT_FANOUT}).")
+    parser.add_argument(
+        "--files-per-dir",
+        type=int,
+        default=DEFAULT_FILES_PER_DIR,
+        help=f"Files in every directory (default: {DEFAULT_FILES_PER_DIR}).",
+    )
+    parser.add_argument("--sizes", choices=SIZE_DISTRIBUTIONS, default="lognormal", help="File size distribution (default: lognormal).")
+    parser.add_argument("--mean-size", type=int, default=DEFAULT_MEAN_SIZE, help=f"Mean file size in bytes (default: {DEFAULT_MEAN_SIZE}).")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Random seed (default: {DEFAULT_SEED}).")
+    parser.add_argument("--content", action="store_true", help="Write pseudo-random data instead of sparse files.")
+    args = parser.parse_args()
+
+    planned = count_entries(args.depth, args.fanout, args.files_per_dir)
+    print(f"Creating {planned['dirs']} directories and {planned['files']} files in {args.root}", file=sys.stderr)
+    start = time.perf_counter()
+    try:
+        result = generate_tree(
+            args.root, args.depth, args.fanout, args.files_per_dir, args.sizes, args.mean_size, args.seed, args.content
+        )
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    result["seconds"] = time.perf_counter() - start
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
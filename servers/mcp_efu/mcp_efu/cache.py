@@ -0,0 +1,219 @@
+# mcp_efu/cache.py
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from .core import EfuFileManager, FILE_ATTRIBUTE_DIRECTORY, ScanProgress
+
+# Defaults for the server-side get_file_list response cache
+DEFAULT_CACHE_TTL_SECONDS = 30.0
+DEFAULT_CACHE_MAX_ENTRIES = 32
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class _CacheEntry:
+    __slots__ = ("payload", "file_list", "nbytes", "validators", "created")
+
+    def __init__(self, payload: bytes, validators: list[tuple[str, int]], created: float, file_list: list[dict] | None = None):
+        self.payload = payload
+        # The decoded result, kept once get_file_list() has asked for it
+        self.file_list = file_list
+        # Memory charged against max_bytes: the payload plus the decoded list
+        self.nbytes = len(payload)
+        self.validators = validators
+        self.created = created
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of encoded get_file_list responses.
+
+    Entries are keyed by the resolved root path plus the scan options and hold
+    the JSON-encoded result, so a hit can be written to the client as-is.
+    Entries read through get_file_list() also keep the decoded list, so
+    those hits are not decoded again; `max_bytes` bounds the encoded
+    results plus an estimate of the memory held by the decoded lists.
+    Before an entry is served it is validated by re-stating only the directory
+    nodes of the cached listing: adding, removing or renaming an entry changes
+    the modification time of its parent directory. In-place content changes
+    to existing files are only picked up once the TTL expires.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_CACHE_TTL_SECONDS,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, _CacheEntry] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidated = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0 and self.max_bytes > 0
+
+    def file_list_payload(
+        self,
+        efu_manager: EfuFileManager,
+        root_path_str: str,
+        progress: ScanProgress | None = None,
+        **options
+    ) -> bytes:
+        """
+        Returns the JSON-encoded get_file_list result for the given path,
+        serving it from the cache when a fresh entry exists. `progress` is
+        passed to the scan on a miss and is not part of the cache key.
+        """
+        return self._get(efu_manager, root_path_str, progress, options, decoded=False).payload
+
+    def get_file_list(
+        self,
+        efu_manager: EfuFileManager,
+        root_path_str: str,
+        progress: ScanProgress | None = None,
+        **options
+    ) -> list[dict]:
+        """
+        Decoded variant of file_list_payload() for callers that need objects.
+        The list is cached along with the payload and shared between callers,
+        so it must not be modified.
+        """
+        return self._get(efu_manager, root_path_str, progress, options, decoded=True).file_list
+
+    def _get(self, efu_manager: EfuFileManager, root_path_str: str, progress: ScanProgress | None, options: dict, decoded: bool) -> _CacheEntry:
+        key = self._make_key(root_path_str, options)
+        entry = self._lookup(key, efu_manager)
+        if entry is not None:
+            if decoded and entry.file_list is None:
+                # Decoded once; later hits return the same list
+                self._attach_file_list(key, entry, json.loads(entry.payload))
+            return entry
+
+        file_list = efu_manager.get_file_list(root_path_str, progress=progress, **options)
+        entry = _CacheEntry(json.dumps(file_list).encode(), [], time.monotonic(), file_list if decoded else None)
+        if self.enabled:
+            entry.validators = [
+                (item["filename"], item["date_modified"])
+                for item in file_list
+                if item["attributes"] & FILE_ATTRIBUTE_DIRECTORY
+            ]
+            if decoded:
+                entry.nbytes += _estimate_list_size(file_list)
+            self._store(key, entry)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current cache occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "expired": self.expired,
+                "invalidated": self.invalidated,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _make_key(self, root_path_str: str, options: dict) -> tuple:
+        root = str(Path(root_path_str).resolve())
+        return (root, tuple(sorted(options.items())))
+
+    def _lookup(self, key: tuple, efu_manager: EfuFileManager):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry.created > self.ttl:
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+        # Validate outside the lock; stat calls may block on slow volumes.
+        if not self._is_fresh(entry, efu_manager):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+                self.invalidated += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def _is_fresh(self, entry: _CacheEntry, efu_manager: EfuFileManager) -> bool:
+        for dir_path, date_modified in entry.validators:
+            try:
+                stat_info = os.stat(dir_path, follow_symlinks=False)
+            except OSError:
+                return False
+            if efu_manager._unix_to_filetime(stat_info.st_mtime) != date_modified:
+                return False
+        return True
+
+    def _store(self, key: tuple, entry: _CacheEntry):
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._total_bytes += entry.nbytes
+            self._evict()
+
+    def _attach_file_list(self, key: tuple, entry: _CacheEntry, file_list: list[dict]):
+        extra = _estimate_list_size(file_list)
+        with self._lock:
+            if entry.file_list is not None:
+                # Another caller decoded it first
+                return
+            entry.file_list = file_list
+            entry.nbytes += extra
+            if self._entries.get(key) is entry:
+                self._total_bytes += extra
+                self._evict()
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.nbytes
+
+
+def _estimate_list_size(file_list: list[dict]) -> int:
+    """Estimates the memory held by a decoded file list; keys are shared and not counted."""
+    return sys.getsizeof(file_list) + sum(
+        sys.getsizeof(item) + sum(sys.getsizeof(value) for value in item.values()) for item in file_list
+    )
@@ -1,98 +1,430 @@
 # mcp_efu/core.py
 import hashlib
+import heapq
 import os
 import stat
+import time
 from pathlib import Path
+from typing import Callable, Iterator
+
+from .iosched import IoScheduler
+from .sorting import SORT_KEYS, external_sort
+
+# Progress callbacks: (entries_scanned, dirs_pending) and (bytes_hashed, total_bytes)
+ScanProgress = Callable[[int, int], None]
+HashProgress = Callable[[int, int], None]
 
 # Constants for FILETIME conversion
 EPOCH_DIFFERENCE_SECONDS = 11644473600
 HUNDREDS_OF_NANOSECONDS = 10_000_000
 
+# Number of subtrees returned by get_tree_summary() by default
+DEFAULT_TREE_SUMMARY_TOP = 10
+
+# Boolean options of get_file_list() and iter_file_list(), shared by the CLI and the transports
+SCAN_FLAGS = ("dir_sizes", "one_file_system", "dedupe_dirs", "dedupe_hardlinks")
+
 # Basic Windows file attributes
 FILE_ATTRIBUTE_DIRECTORY = 0x10
 FILE_ATTRIBUTE_ARCHIVE = 0x20
 FILE_ATTRIBUTE_READONLY = 0x01
 FILE_ATTRIBUTE_HIDDEN = 0x02
 
+class _VisitFilter:
+    """
+    Tracks devices and inodes during one scan, for the one_file_system,
+    dedupe_dirs and dedupe_hardlinks options of iter_file_list().
+    """
+
+    def __init__(self, root_stat: os.stat_result, one_file_system: bool, dedupe_dirs: bool, dedupe_hardlinks: bool):
+        self.device = root_stat.st_dev if one_file_system else None
+        self.seen_dirs = {(root_stat.st_dev, root_stat.st_ino)} if dedupe_dirs else None
+        self.seen_files = set() if dedupe_hardlinks else None
+
+    def descend(self, stat_info: os.stat_result) -> bool:
+        """Whether to walk into a directory; records it as walked."""
+        if self.device is not None and stat_info.st_dev != self.device:
+            return False
+        if self.seen_dirs is not None:
+            key = (stat_info.st_dev, stat_info.st_ino)
+            if key in self.seen_dirs:
+                return False
+            self.seen_dirs.add(key)
+        return True
+
+    def report(self, stat_info: os.stat_result) -> bool:
+        """Whether to list a file; False for further links to an inode already listed."""
+        if self.seen_files is None or stat_info.st_nlink < 2:
+            return True
+        key = (stat_info.st_dev, stat_info.st_ino)
+        if key in self.seen_files:
+            return False
+        self.seen_files.add(key)
+        return True
+
+
 class EfuFileManager:
     """
     Scans a directory and generates a file list in the EFU format.
+
+    If an IoScheduler is given, every stat, directory listing and hashed
+    chunk is charged to it, so scans and hashes running as background work
+    are throttled to its I/O budgets. If a metrics registry (see
+    metrics.create_server_metrics()) is given, scanned entries and hashed
+    bytes and the time spent on them are counted in it.
     """
 
-    def get_file_list(self, root_path_str: str) -> list[dict]:
+    def __init__(self, io_scheduler: IoScheduler | None = None, metrics=None):
+        self.io_scheduler = io_scheduler
+        self.metrics = metrics
+
+    def get_file_list(
+        self,
+        root_path_str: str,
+        progress: ScanProgress | None = None,
+        name_order: bool = False,
+        sort: str | None = None,
+        dir_sizes: bool = False,
+        one_file_system: bool = False,
+        dedupe_dirs: bool = False,
+        dedupe_hardlinks: bool = False
+    ) -> list[dict]:
         """
         Recursively walks through the given path and collects file information
         in the EFU format.
+
+        If given, `progress` is called after each directory with the number of
+        entries collected so far and the number of directories still pending.
+        See iter_file_list() for the other options.
         """
+        return list(self.iter_file_list(
+            root_path_str, progress, name_order, sort, dir_sizes, one_file_system, dedupe_dirs, dedupe_hardlinks
+        ))
+
+    def iter_file_list(
+        self,
+        root_path_str: str,
+        progress: ScanProgress | None = None,
+        name_order: bool = False,
+        sort: str | None = None,
+        dir_sizes: bool = False,
+        one_file_system: bool = False,
+        dedupe_dirs: bool = False,
+        dedupe_hardlinks: bool = False
+    ) -> Iterator[dict]:
+        """
+        Like get_file_list(), but yields the entries one at a time.
+
+        By default entries come in os.walk order. With `name_order`, the tree
+        is walked depth first with children visited in name order, so entries
+        come out sorted by listing.path_sort_key() without buffering.
+        `sort` ("name", "size" or "mtime") returns the entries in that
+        ascending order; "name" is a name-order walk, the others go through
+        sorting.external_sort() and so need no more than its memory budget.
+
+        With `dir_sizes`, every directory entry carries the recursive totals
+        of its subtree: `size` (bytes of all files below it, each hardlinked
+        inode counted once), `file_count` and `dir_count`. The totals are
+        accumulated during the walk, so directories are yielded after their
+        contents (post-order, root last) unless a sort order is requested.
+
+        Three options avoid walking or reporting the same data twice, for
+        example through bind mounts or hardlink farms. `one_file_system`
+        does not descend into directories on another device than the root,
+        `dedupe_dirs` does not descend into a directory whose (device,
+        inode) was already walked, and `dedupe_hardlinks` reports a file
+        with several hardlinks only at the first path found. Directories
+        that are not descended into are still listed.
+        The root path is validated before this method returns.
+        """
+        if sort is not None and sort not in SORT_KEYS:
+            raise ValueError(f"Unsupported sort order '{sort}'. Expected one of {', '.join(SORT_KEYS)}.")
         root_path = Path(root_path_str).resolve()
         if not root_path.is_dir():
             raise ValueError(f"Path '{root_path_str}' is not a valid directory.")
 
-        file_list = []
-        # Add the root path itself to the list
+        # The root path itself is always the first entry
         try:
-            stat_info = root_path.stat(follow_symlinks=False)
-            file_list.append({
-                "filename": str(root_path),
-                "size": 0,
-                "date_modified": self._unix_to_filetime(stat_info.st_mtime),
-                "date_created": self._unix_to_filetime(stat_info.st_ctime),
-                "attributes": self._get_attributes(root_path, stat_info, True)
-            })
+            stat_info = self._lstat(root_path)
         except (FileNotFoundError, PermissionError) as e:
             raise ValueError(f"Cannot access root path '{root_path_str}': {e}")
+        root_entry = self._make_entry(root_path, stat_info, True)
+        visit = None
+        if one_file_system or dedupe_dirs or dedupe_hardlinks:
+            visit = _VisitFilter(stat_info, one_file_system, dedupe_dirs, dedupe_hardlinks)
 
+        if dir_sizes:
+            entries = self._walk_totals(root_path, root_entry, progress, visit)
+            if name_order and sort is None:
+                sort = "name"
+        elif name_order or sort == "name":
+            entries = self._walk_name_order(root_path, root_entry, progress, visit)
+            if sort == "name":
+                # Already in path order
+                sort = None
+        else:
+            entries = self._walk(root_path, root_entry, progress, visit)
+        if sort is not None:
+            entries = external_sort(entries, sort)
+        if self.metrics is not None:
+            entries = self._count_scanned(entries)
+        return entries
 
+    def _count_scanned(self, entries: Iterator[dict]) -> Iterator[dict]:
+        # The time includes the consumer's work between entries, which for
+        # the servers is only collecting or encoding them
+        start = time.perf_counter()
+        count = 0
+        try:
+            for entry in entries:
+                count += 1
+                yield entry
+        finally:
+            self.metrics.inc("mcp_efu_scanned_entries_total", count)
+            self.metrics.inc("mcp_efu_scan_seconds_total", time.perf_counter() - start)
+
+    def _walk(
+        self, root_path: Path, root_entry: dict, progress: ScanProgress | None, visit: "_VisitFilter | None" = None
+    ) -> Iterator[dict]:
+        yield root_entry
+        entries_scanned = 1
+        discovered_dirs = 1
+        visited_dirs = 0
         for dirpath, dirnames, filenames in os.walk(root_path):
+            self._charge_io(ops=1)
+            visited_dirs += 1
+            discovered_dirs += len(dirnames)
             entries = [(d, True) for d in dirnames] + [(f, False) for f in filenames]
+            pruned = set()
             for name, is_dir in entries:
                 full_path = Path(dirpath) / name
                 try:
-                    stat_info = full_path.stat(follow_symlinks=False)
-                    
-                    file_list.append({
-                        "filename": str(full_path),
-                        "size": stat_info.st_size if not is_dir else 0,
-                        "date_modified": self._unix_to_filetime(stat_info.st_mtime),
-                        "date_created": self._unix_to_filetime(stat_info.st_ctime),
-                        "attributes": self._get_attributes(full_path, stat_info, is_dir)
-                    })
+                    stat_info = self._lstat(full_path)
                 except (FileNotFoundError, PermissionError):
                     continue
-        return file_list
+                if visit is not None:
+                    if not is_dir and not visit.report(stat_info):
+                        continue
+                    # os.walk does not follow symlinks to directories anyway
+                    if is_dir and not stat.S_ISLNK(stat_info.st_mode) and not visit.descend(stat_info):
+                        pruned.add(name)
+                yield self._make_entry(full_path, stat_info, is_dir)
+                entries_scanned += 1
+            if pruned:
+                # Pruning dirnames in place stops os.walk from descending
+                dirnames[:] = [d for d in dirnames if d not in pruned]
+                discovered_dirs -= len(pruned)
+            if progress is not None:
+                progress(entries_scanned, discovered_dirs - visited_dirs)
+
+    def _walk_name_order(
+        self, root_path: Path, root_entry: dict, progress: ScanProgress | None, visit: "_VisitFilter | None" = None
+    ) -> Iterator[dict]:
+        yield root_entry
+        entries_scanned = 1
+        root_children = self._sorted_children(root_path)
+        pending_dirs = sum(1 for _, _, recurse in root_children if recurse)
+        # One iterator of (name, is_dir, recurse) per directory on the current path
+        stack = [(root_path, iter(root_children))]
+        if progress is not None:
+            progress(entries_scanned, pending_dirs)
+        while stack:
+            dir_path, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                continue
+            name, is_dir, recurse = child
+            if recurse:
+                pending_dirs -= 1
+            full_path = dir_path / name
+            try:
+                stat_info = self._lstat(full_path)
+            except (FileNotFoundError, PermissionError):
+                continue
+            if visit is not None:
+                if not is_dir and not visit.report(stat_info):
+                    continue
+                recurse = recurse and visit.descend(stat_info)
+            yield self._make_entry(full_path, stat_info, is_dir)
+            entries_scanned += 1
+            if recurse:
+                grandchildren = self._sorted_children(full_path)
+                pending_dirs += sum(1 for _, _, sub in grandchildren if sub)
+                stack.append((full_path, iter(grandchildren)))
+                if progress is not None:
+                    progress(entries_scanned, pending_dirs)
+        if progress is not None:
+            progress(entries_scanned, 0)
+
+    def _walk_totals(
+        self, root_path: Path, root_entry: dict, progress: ScanProgress | None, visit: "_VisitFilter | None" = None
+    ) -> Iterator[dict]:
+        entries_scanned = 1
+        # Hardlinked inodes already counted, as (st_dev, st_ino)
+        seen_inodes = set()
+        root_children = self._sorted_children(root_path)
+        pending_dirs = sum(1 for _, _, recurse in root_children if recurse)
+        # Per open directory: its entry, its remaining children and the
+        # running totals [size, file_count, dir_count] of its subtree
+        stack = [(root_path, root_entry, iter(root_children), [0, 0, 0])]
+        if progress is not None:
+            progress(entries_scanned, pending_dirs)
+        while stack:
+            dir_path, dir_entry, children, totals = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                dir_entry["size"], dir_entry["file_count"], dir_entry["dir_count"] = totals
+                if stack:
+                    parent_totals = stack[-1][3]
+                    parent_totals[0] += totals[0]
+                    parent_totals[1] += totals[1]
+                    parent_totals[2] += totals[2] + 1
+                yield dir_entry
+                continue
+            name, is_dir, recurse = child
+            if recurse:
+                pending_dirs -= 1
+            full_path = dir_path / name
+            try:
+                stat_info = self._lstat(full_path)
+            except (FileNotFoundError, PermissionError):
+                continue
+            if visit is not None:
+                if not is_dir and not visit.report(stat_info):
+                    continue
+                recurse = recurse and visit.descend(stat_info)
+            entry = self._make_entry(full_path, stat_info, is_dir)
+            entries_scanned += 1
+            if recurse:
+                grandchildren = self._sorted_children(full_path)
+                pending_dirs += sum(1 for _, _, sub in grandchildren if sub)
+                stack.append((full_path, entry, iter(grandchildren), [0, 0, 0]))
+                if progress is not None:
+                    progress(entries_scanned, pending_dirs)
+                continue
+            if is_dir:
+                # A symlink to a directory, or a directory skipped by the
+                # scan options; not descended into
+                entry["file_count"] = entry["dir_count"] = 0
+                totals[2] += 1
+            else:
+                totals[1] += 1
+                if stat_info.st_nlink > 1:
+                    inode = (stat_info.st_dev, stat_info.st_ino)
+                    if inode in seen_inodes:
+                        yield entry
+                        continue
+                    seen_inodes.add(inode)
+                totals[0] += entry["size"]
+            yield entry
+        if progress is not None:
+            progress(entries_scanned, 0)
+
+    def get_tree_summary(
+        self,
+        root_path_str: str,
+        top: int = DEFAULT_TREE_SUMMARY_TOP,
+        max_depth: int | None = None,
+        progress: ScanProgress | None = None
+    ) -> dict:
+        """
+        Returns the recursive totals of the given directory and its `top`
+        largest subdirectories, optionally only those at most `max_depth`
+        levels below it. Only the current top entries are kept in memory.
+        """
+        if top < 1:
+            raise ValueError("top must be a positive integer.")
+        if max_depth is not None and max_depth < 1:
+            raise ValueError("max_depth must be a positive integer.")
+        entries = self.iter_file_list(root_path_str, progress, dir_sizes=True)
+        root_filename = str(Path(root_path_str).resolve())
+        root_depth = len(Path(root_filename).parts)
+        root = None
+
+        def subdirectories():
+            nonlocal root
+            for entry in entries:
+                if not entry["attributes"] & FILE_ATTRIBUTE_DIRECTORY:
+                    continue
+                if entry["filename"] == root_filename:
+                    root = entry
+                elif max_depth is None or len(Path(entry["filename"]).parts) - root_depth <= max_depth:
+                    yield entry
+
+        # On equal sizes the enclosing directory (shorter path) ranks first
+        largest = heapq.nlargest(top, subdirectories(), key=lambda entry: (entry["size"], -len(entry["filename"])))
+        return {"root": root, "largest": largest}
 
-    def get_md5_hash(self, file_path_str: str) -> dict:
+    def _sorted_children(self, dir_path: Path) -> list[tuple[str, bool, bool]]:
+        """
+        Lists a directory as (name, is_dir, recurse) tuples sorted by name.
+        Like os.walk, symlinks to directories count as directories but are
+        not descended into.
+        """
+        children = []
+        self._charge_io(ops=1)
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                        recurse = is_dir and not entry.is_symlink()
+                    except OSError:
+                        is_dir = recurse = False
+                    children.append((entry.name, is_dir, recurse))
+        except OSError:
+            return []
+        children.sort()
+        return children
+
+    def _lstat(self, path: Path) -> os.stat_result:
+        self._charge_io(ops=1)
+        return path.stat(follow_symlinks=False)
+
+    def _charge_io(self, nbytes: int = 0, ops: int = 0):
+        if self.io_scheduler is not None:
+            self.io_scheduler.charge(nbytes, ops)
+
+    def _make_entry(self, path: Path, stat_info, is_dir: bool) -> dict:
+        return {
+            "filename": str(path),
+            "size": stat_info.st_size if not is_dir else 0,
+            "date_modified": self._unix_to_filetime(stat_info.st_mtime),
+            "date_created": self._unix_to_filetime(stat_info.st_ctime),
+            "attributes": self._get_attributes(path, stat_info, is_dir)
+        }
+
+    def get_md5_hash(self, file_path_str: str, progress: HashProgress | None = None) -> dict:
         """Returns the MD5 hash for the given file path."""
         file_path, real_path = self._resolve_file_path(file_path_str)
         return {
             "path": str(file_path),
             "realpath": str(real_path),
-            "hash": self._hash_file(file_path, hashlib.md5()),
+            "hash": self._hash_file(file_path, hashlib.md5(), progress),
         }
 
-    def get_sha1_hash(self, file_path_str: str) -> dict:
+    def get_sha1_hash(self, file_path_str: str, progress: HashProgress | None = None) -> dict:
         """Returns the SHA1 hash for the given file path."""
         file_path, real_path = self._resolve_file_path(file_path_str)
         return {
             "path": str(file_path),
             "realpath": str(real_path),
-            "hash": self._hash_file(file_path, hashlib.sha1()),
+            "hash": self._hash_file(file_path, hashlib.sha1(), progress),
         }
 
-    def get_git_blob_hash(self, file_path_str: str) -> dict:
+    def get_git_blob_hash(self, file_path_str: str, progress: HashProgress | None = None) -> dict:
         """Returns the Git blob SHA1 hash for the given file path."""
         file_path, real_path = self._resolve_file_path(file_path_str)
         hasher = hashlib.sha1()
         size = file_path.stat().st_size
         header = f"blob {size}\0".encode()
         hasher.update(header)
-        with file_path.open("rb") as handle:
-            for chunk in iter(lambda: handle.read(8192), b""):
-                hasher.update(chunk)
         return {
             "path": str(file_path),
             "realpath": str(real_path),
-            "hash": hasher.hexdigest(),
+            "hash": self._hash_file(file_path, hasher, progress),
         }
 
     def _unix_to_filetime(self, unix_timestamp: float) -> int:
@@ -109,10 +441,24 @@ class EfuFileManager:
             raise ValueError(f"Path '{file_path_str}' is not a valid file.")
         return file_path, real_path
 
-    def _hash_file(self, file_path: Path, hasher: "hashlib._Hash") -> str:
+    def _hash_file(self, file_path: Path, hasher: "hashlib._Hash", progress: HashProgress | None = None) -> str:
+        start = time.perf_counter()
         with file_path.open("rb") as handle:
-            for chunk in iter(lambda: handle.read(8192), b""):
-                hasher.update(chunk)
+            if progress is None and self.io_scheduler is None:
+                for chunk in iter(lambda: handle.read(8192), b""):
+                    hasher.update(chunk)
+            else:
+                total_bytes = os.fstat(handle.fileno()).st_size
+                bytes_hashed = 0
+                for chunk in iter(lambda: handle.read(8192), b""):
+                    self._charge_io(len(chunk), 1)
+                    hasher.update(chunk)
+                    bytes_hashed += len(chunk)
+                    if progress is not None:
+                        progress(bytes_hashed, total_bytes)
+            if self.metrics is not None:
+                self.metrics.inc("mcp_efu_hashed_bytes_total", handle.tell(), algorithm=hasher.name)
+                self.metrics.inc("mcp_efu_hash_seconds_total", time.perf_counter() - start, algorithm=hasher.name)
         return hasher.hexdigest()
 
     def _get_attributes(self, path: Path, stat_info, is_dir: bool) -> int:
@@ -0,0 +1,193 @@
+# mcp_efu/diff.py
+from pathlib import Path
+from typing import Iterator
+
+from .core import EfuFileManager, FILE_ATTRIBUTE_DIRECTORY
+from .listing import detect_format, iter_listing, path_sort_key
+from .reader import MAPPED_FORMATS, open_mapped_listing
+from .sorting import external_sort
+
+HASH_METHODS = ("md5", "sha1", "git_blob")
+
+
+def open_sorted_source(efu_manager: EfuFileManager, source: str) -> tuple[Iterator[dict], bool]:
+    """
+    Opens one side of a diff as a stream of entries in path_sort_key order.
+
+    A directory is scanned live in name order. A file is read as a saved
+    listing; if it turns out not to be sorted (for example plain os.walk
+    output), it goes through an external merge sort. Binary snapshots are
+    always sorted. Returns the stream and whether it comes from a live scan.
+    """
+    path = Path(source).expanduser()
+    if path.is_dir():
+        return efu_manager.iter_file_list(str(path), name_order=True), True
+    if not path.is_file():
+        raise ValueError(f"'{source}' is neither a directory nor a saved listing file.")
+    if detect_format(str(path)) in MAPPED_FORMATS:
+        return _iter_mapped_sorted(str(path)), False
+
+    previous = None
+    for entry in iter_listing(str(path)):
+        key = path_sort_key(entry["filename"])
+        if previous is not None and key < previous:
+            break
+        previous = key
+    else:
+        return iter_listing(str(path)), False
+    return external_sort(iter_listing(str(path)), "name"), False
+
+
+def _iter_mapped_sorted(path: str) -> Iterator[dict]:
+    with open_mapped_listing(path) as listing:
+        yield from listing.iter_sorted()
+
+
+def diff_file_lists(
+    efu_manager: EfuFileManager,
+    old_source: str,
+    new_source: str,
+    hash_method: str | None = None
+) -> dict:
+    """
+    Compares two listings by a streaming sorted merge.
+
+    Each source is either a directory (scanned live) or a saved listing in
+    JSON, NDJSON, EFU or snapshot format. Files present on both sides are
+    reported as modified when their size or modification time differ. With
+    `hash_method`, a file whose size is unchanged is also compared by
+    content when both sides can provide a hash: a live file, or a saved
+    entry carrying a "hash" field with a matching "hash_method", as written
+    by iter_with_hashes() (`mcp_efu PATH --hash METHOD`). A changed
+    timestamp with an identical hash is then not reported. At least one
+    side must be a directory when `hash_method` is given. Only the
+    differences are kept in memory.
+    """
+    if hash_method is not None and hash_method not in HASH_METHODS:
+        raise ValueError(f"Unsupported hash method '{hash_method}'. Expected one of {', '.join(HASH_METHODS)}.")
+
+    old_entries, old_live = open_sorted_source(efu_manager, old_source)
+    new_entries, new_live = open_sorted_source(efu_manager, new_source)
+    if hash_method is not None and not (old_live or new_live):
+        raise ValueError("Comparing by hash needs at least one directory side; saved listings are not hashed.")
+
+    added = []
+    removed = []
+    modified = []
+    unchanged = 0
+
+    old_entry = next(old_entries, None)
+    new_entry = next(new_entries, None)
+    while old_entry is not None or new_entry is not None:
+        if new_entry is None:
+            order = -1
+        elif old_entry is None:
+            order = 1
+        else:
+            old_key = path_sort_key(old_entry["filename"])
+            new_key = path_sort_key(new_entry["filename"])
+            order = (old_key > new_key) - (old_key < new_key)
+
+        if order < 0:
+            removed.append(old_entry)
+            old_entry = next(old_entries, None)
+        elif order > 0:
+            added.append(new_entry)
+            new_entry = next(new_entries, None)
+        else:
+            changes = _compare_entries(efu_manager, old_entry, new_entry, hash_method, old_live, new_live)
+            if changes:
+                modified.append({
+                    "filename": new_entry["filename"],
+                    "changes": changes,
+                    "old": old_entry,
+                    "new": new_entry,
+                })
+            else:
+                unchanged += 1
+            old_entry = next(old_entries, None)
+            new_entry = next(new_entries, None)
+
+    return {
+        "old": old_source,
+        "new": new_source,
+        "added": added,
+        "removed": removed,
+        "modified": modified,
+        "summary": {
+            "added": len(added),
+            "removed": len(removed),
+            "modified": len(modified),
+            "unchanged": unchanged,
+        },
+    }
+
+
+def _compare_entries(
+    efu_manager: EfuFileManager,
+    old_entry: dict,
+    new_entry: dict,
+    hash_method: str | None,
+    old_live: bool,
+    new_live: bool
+) -> list[str]:
+    old_is_dir = bool(old_entry.get("attributes", 0) & FILE_ATTRIBUTE_DIRECTORY)
+    new_is_dir = bool(new_entry.get("attributes", 0) & FILE_ATTRIBUTE_DIRECTORY)
+    if old_is_dir != new_is_dir:
+        return ["type"]
+    if new_is_dir:
+        # A directory's timestamp changes whenever its children do; those
+        # children are reported on their own.
+        return []
+
+    changes = []
+    if old_entry.get("size") != new_entry.get("size"):
+        changes.append("size")
+    if old_entry.get("date_modified") != new_entry.get("date_modified"):
+        changes.append("date_modified")
+    if hash_method is None or "size" in changes:
+        return changes
+
+    # The saved side goes first: without a recorded hash, the live file is not read
+    sides = sorted(((old_entry, old_live), (new_entry, new_live)), key=lambda side: side[1])
+    hashes = []
+    for entry, live in sides:
+        value = _entry_hash(efu_manager, entry, hash_method, live)
+        if value is None:
+            return changes
+        hashes.append(value)
+    if hashes[0] != hashes[1]:
+        changes.append("hash")
+    elif changes == ["date_modified"]:
+        # Touched but identical content
+        return []
+    return changes
+
+
+def iter_with_hashes(efu_manager: EfuFileManager, entries: Iterator[dict], hash_method: str) -> Iterator[dict]:
+    """
+    Adds "hash" and "hash_method" to the file entries of a listing, which is
+    how diff_file_lists() finds content hashes in a saved listing. Files
+    that cannot be read are passed through without them.
+    """
+    if hash_method not in HASH_METHODS:
+        raise ValueError(f"Unsupported hash method '{hash_method}'. Expected one of {', '.join(HASH_METHODS)}.")
+    for entry in entries:
+        if not entry.get("attributes", 0) & FILE_ATTRIBUTE_DIRECTORY:
+            value = _entry_hash(efu_manager, entry, hash_method, True)
+            if value is not None:
+                entry = dict(entry, hash=value, hash_method=hash_method)
+        yield entry
+
+
+def _entry_hash(efu_manager: EfuFileManager, entry: dict, hash_method: str, live: bool) -> str | None:
+    if not live:
+        # Only a hash recorded with the same method can be compared
+        if entry.get("hash") and entry.get("hash_method") == hash_method:
+            return entry["hash"]
+        return None
+    hash_file = getattr(efu_manager, f"get_{hash_method}_hash")
+    try:
+        return hash_file(entry["filename"])["hash"]
+    except (ValueError, OSError):
+        return None
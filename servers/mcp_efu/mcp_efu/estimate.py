@@ -0,0 +1,225 @@
+# mcp_efu/estimate.py
+#
+# Approximate tree statistics from random directory descents (Knuth's
+# estimator for the size of a search tree). A probe walks from the root to a
+# leaf directory, picking one subdirectory uniformly at random at each step.
+# A directory reached with probability p contributes its own counts divided
+# by p, so every probe is an unbiased estimate of the tree totals; averaging
+# many probes narrows the confidence interval.
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+from .core import EfuFileManager
+
+DEFAULT_TIME_BUDGET_SECONDS = 0.2
+MAX_TIME_BUDGET_SECONDS = 60.0
+DEFAULT_CONFIDENCE = 0.95
+# Number of extensions returned in the histogram
+DEFAULT_TOP_EXTENSIONS = 20
+# Files of a directory stat'ed even after the time budget has run out, so
+# that a directory read late still gets a size estimate
+MIN_SIZE_SAMPLE = 32
+
+_TOTALS = ("files", "dirs", "bytes")
+
+
+class _Directory:
+    """The counts of one directory's own children, read once per estimate."""
+    __slots__ = ("files", "dirs", "bytes", "bytes_seen", "sampled", "extensions", "subdirs")
+
+    def __init__(self):
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
+        # Sizes of the files actually stat'ed; less than `bytes` when sampled
+        self.bytes_seen = 0
+        self.sampled = False
+        self.extensions: dict[str, int] = {}
+        self.subdirs: list[str] = []
+
+
+def estimate_tree(
+    efu_manager: EfuFileManager,
+    root: str,
+    time_budget: float = DEFAULT_TIME_BUDGET_SECONDS,
+    max_probes: int | None = None,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: int | None = None,
+) -> dict:
+    """
+    Estimates the number of files and directories, the total file size and
+    the extension histogram below `root` within about `time_budget` seconds.
+
+    Probes are run until the budget (or `max_probes`) is used up; at least
+    one probe always runs. A larger budget gives more probes and a narrower
+    interval. Each directory is read at most once per call, so later probes
+    get cheaper, and once every directory of the tree has been read the
+    exact totals are returned with `exact` set.
+
+    The budget is also checked while a directory's files are stat'ed: once
+    it has run out, the remaining files of that directory are counted by
+    name, and their sizes are estimated from the files stat'ed so far (at
+    least MIN_SIZE_SAMPLE, in random order). `partial` is then set and the
+    result is not exact. Listing a directory's names is not interrupted.
+
+    Each total is returned as {"estimate", "low", "high"}, the bounds being
+    a normal-approximation `confidence` interval over the probes (None
+    after a single probe), raised where needed to what the directories
+    already read are known to contain. Like get_file_list(), symlinks to
+    directories count as directories but are not descended into; hardlinks
+    are not deduplicated.
+    """
+    if not 0 < time_budget <= MAX_TIME_BUDGET_SECONDS:
+        raise ValueError(f"time_budget must be greater than 0 and at most {MAX_TIME_BUDGET_SECONDS:g} seconds.")
+    if max_probes is not None and max_probes < 1:
+        raise ValueError("max_probes must be at least 1.")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1.")
+    root_path = Path(root).resolve()
+    if not root_path.is_dir():
+        raise ValueError(f"Path '{root}' is not a valid directory.")
+
+    start = time.monotonic()
+    deadline = start + time_budget
+    sampler = _Sampler(efu_manager, str(root_path), random.Random(seed), deadline)
+    samples = {key: [] for key in _TOTALS}
+    while True:
+        totals = sampler.probe()
+        for key in _TOTALS:
+            samples[key].append(totals[key])
+        if sampler.unread == 0:
+            break
+        if (max_probes is not None and sampler.probes >= max_probes) or time.monotonic() >= deadline:
+            break
+
+    result = {
+        "root": str(root_path),
+        "probes": sampler.probes,
+        "directories_read": len(sampler.listings),
+        "elapsed_seconds": round(time.monotonic() - start, 6),
+        "exact": sampler.unread == 0 and not sampler.sampled,
+        "partial": sampler.sampled > 0,
+        "confidence": confidence,
+    }
+    # What the directories read so far contain is a lower bound, and the
+    # exact answer once the whole tree has been read
+    known = sampler.known_totals()
+    if sampler.unread == 0:
+        for key in _TOTALS:
+            result[key] = {"estimate": known[key], "low": known[key], "high": known[key]}
+        if sampler.sampled:
+            result["bytes"] = {"estimate": known["bytes"], "low": known["bytes_seen"], "high": None}
+        histogram = known["extensions"]
+    else:
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        for key in _TOTALS:
+            result[key] = _interval(samples[key], z, known["bytes_seen" if key == "bytes" else key])
+        histogram = {ext: round(total / sampler.probes) for ext, total in sampler.extension_sums.items()}
+    top = sorted(histogram.items(), key=lambda item: (-item[1], item[0]))[:DEFAULT_TOP_EXTENSIONS]
+    result["extensions"] = dict(top)
+    return result
+
+
+class _Sampler:
+    """Runs random descents, reading each directory at most once."""
+
+    def __init__(self, efu_manager: EfuFileManager, root: str, rng: random.Random, deadline: float):
+        self.efu_manager = efu_manager
+        self.root = root
+        self.rng = rng
+        self.deadline = deadline
+        self.listings: dict[str, _Directory] = {}
+        # Directories known to exist but not read yet; 0 means the whole tree is known
+        self.unread = 1
+        self.extension_sums: dict[str, float] = {}
+        self.probes = 0
+        # Directories whose file sizes were only sampled
+        self.sampled = 0
+
+    def probe(self) -> dict:
+        """Runs one random descent and returns its estimate of the tree totals."""
+        # The root itself counts as a directory, as in get_file_list()
+        totals = {"files": 0, "dirs": 1, "bytes": 0}
+        weight = 1
+        path = self.root
+        self.probes += 1
+        while True:
+            directory = self.listings.get(path)
+            if directory is None:
+                directory = self.listings[path] = self._read_directory(path)
+                self.unread += len(directory.subdirs) - 1
+                self.sampled += directory.sampled
+            totals["files"] += weight * directory.files
+            totals["dirs"] += weight * directory.dirs
+            totals["bytes"] += weight * directory.bytes
+            for ext, count in directory.extensions.items():
+                self.extension_sums[ext] = self.extension_sums.get(ext, 0) + weight * count
+            if not directory.subdirs:
+                return totals
+            weight *= len(directory.subdirs)
+            path = os.path.join(path, self.rng.choice(directory.subdirs))
+
+    def known_totals(self) -> dict:
+        """
+        Adds up the contents of the directories read; exact once `unread` is
+        0, except for `bytes` in sampled directories (`bytes_seen` is exact).
+        """
+        totals = {"files": 0, "dirs": 1, "bytes": 0, "bytes_seen": 0, "extensions": {}}
+        for directory in self.listings.values():
+            totals["files"] += directory.files
+            totals["dirs"] += directory.dirs
+            totals["bytes"] += directory.bytes
+            totals["bytes_seen"] += directory.bytes_seen
+            for ext, count in directory.extensions.items():
+                totals["extensions"][ext] = totals["extensions"].get(ext, 0) + count
+        return totals
+
+    def _read_directory(self, path: str) -> _Directory:
+        directory = _Directory()
+        dir_path = Path(path)
+        files = []
+        for name, is_dir, recurse in self.efu_manager._sorted_children(dir_path):
+            if is_dir:
+                directory.dirs += 1
+                if recurse:
+                    directory.subdirs.append(name)
+            else:
+                files.append(name)
+        if len(files) > MIN_SIZE_SAMPLE:
+            # Random order, so that the files stat'ed before the deadline are a fair sample
+            self.rng.shuffle(files)
+        names = []
+        for index, name in enumerate(files):
+            if index >= MIN_SIZE_SAMPLE and time.monotonic() >= self.deadline:
+                directory.sampled = True
+                break
+            try:
+                stat_info = self.efu_manager._lstat(dir_path / name)
+            except OSError:
+                continue
+            directory.bytes_seen += stat_info.st_size
+            names.append(name)
+        directory.bytes = directory.bytes_seen
+        if directory.sampled:
+            # Files not stat'ed are assumed to exist and to have the sample's mean size
+            stat_count = len(names)
+            names.extend(files[index:])
+            if stat_count:
+                directory.bytes = round(directory.bytes_seen * len(names) / stat_count)
+        directory.files = len(names)
+        for name in names:
+            ext = os.path.splitext(name)[1].lower()
+            directory.extensions[ext] = directory.extensions.get(ext, 0) + 1
+        return directory
+
+
+def _interval(samples: list[float], z: float, lower_bound: int) -> dict:
+    mean = statistics.fmean(samples)
+    estimate = max(round(mean), lower_bound)
+    if len(samples) < 2:
+        return {"estimate": estimate, "low": None, "high": None}
+    margin = z * statistics.stdev(samples) / len(samples) ** 0.5
+    return {"estimate": estimate, "low": max(lower_bound, round(mean - margin)), "high": max(estimate, round(mean + margin))}
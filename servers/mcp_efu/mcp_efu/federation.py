@@ -0,0 +1,364 @@
+# mcp_efu/federation.py
+#
+# Aggregator mode: one TCP endpoint in front of several `mcp_efu --transport
+# tcp` nodes. Every node owns one or more root paths; a request for a path is
+# forwarded, unchanged, to the node owning the longest matching root over a
+# pool of persistent connections, and its response is passed back as-is.
+# get_file_list also accepts `paths`, a list of roots that may live on
+# different nodes: the scans run in parallel and the listings are merged,
+# keeping the requested sort order, with failures reported per node.
+import asyncio
+import copy
+import heapq
+import json
+import posixpath
+import sys
+import time
+
+from .remote import DEFAULT_CONNECT_TIMEOUT_SECONDS, parse_address
+from .sorting import SORT_KEYS, sort_key_function
+
+DEFAULT_POOL_SIZE = 4
+# Responses are read as single lines; listings of large trees can be big
+_STREAM_LIMIT = 1024 * 1024 * 1024
+
+# Parameters holding the path a request is routed by; list-form params use the same positions
+ROUTED_METHODS = {
+    "get_file_list": ("path",),
+    "get_tree_summary": ("path",),
+    "estimate_tree": ("path",),
+    "grep_files": ("path",),
+    "get_md5_hash": ("path",),
+    "get_sha1_hash": ("path",),
+    "get_git_blob_hash": ("path",),
+    "read_file_list": ("listing",),
+    "diff_file_lists": ("old", "new"),
+}
+
+
+class NodeError(Exception):
+    """A node could not be reached or answered a request with a JSON-RPC error."""
+
+    def __init__(self, node: str, code: int, message: str):
+        super().__init__(message)
+        self.node = node
+        self.code = code
+
+
+def parse_backend(spec: str) -> tuple[str, list[str]]:
+    """Parses 'HOST:PORT=ROOT[,ROOT...]' into the address and its normalized roots."""
+    address, sep, roots = spec.partition("=")
+    parse_address(address)
+    root_list = [normalize_path(root) for root in roots.split(",") if root.strip()] if sep else []
+    if not root_list:
+        raise ValueError(f"Invalid backend '{spec}'. Expected HOST:PORT=ROOT[,ROOT...].")
+    for root in root_list:
+        if not posixpath.isabs(root):
+            raise ValueError(f"Backend root '{root}' must be an absolute path.")
+    return address, root_list
+
+
+def normalize_path(path: str) -> str:
+    path = path.strip()
+    return posixpath.normpath(path) if path else path
+
+
+def _owns(root: str, path: str) -> bool:
+    return path == root or path.startswith(root if root.endswith("/") else root + "/")
+
+
+class Backend:
+    """One node and its pool of at most `pool_size` persistent connections."""
+
+    def __init__(self, address: str, roots: list[str], pool_size: int = DEFAULT_POOL_SIZE):
+        self.name = address
+        self.host, self.port = parse_address(address)
+        self.roots = roots
+        self.tools: list[dict] | None = None
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self.pool_size = pool_size
+        self.connections = 0
+        self.requests = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+        self.last_error: str | None = None
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=_STREAM_LIMIT), DEFAULT_CONNECT_TIMEOUT_SECONDS
+        )
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), DEFAULT_CONNECT_TIMEOUT_SECONDS))
+        except (asyncio.TimeoutError, ValueError):
+            writer.close()
+            raise ConnectionError("no server/hello received")
+        if hello.get("method") != "server/hello":
+            writer.close()
+            raise ConnectionError(f"unexpected greeting {hello}")
+        self.tools = hello.get("params", {}).get("tools", self.tools)
+        self.connections += 1
+        return reader, writer
+
+    async def request(self, request: dict) -> bytes:
+        """
+        Sends one request on a pooled connection and returns the raw
+        response line. Raises NodeError if the node cannot be reached or the
+        connection fails; the broken connection is dropped.
+        """
+        async with self._slots:
+            start = time.perf_counter()
+            self.requests += 1
+            connection = None
+            try:
+                connection = self._idle.pop() if self._idle else await self._connect()
+                reader, writer = connection
+                writer.write(json.dumps(request).encode() + b"\n")
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("connection closed")
+            except asyncio.CancelledError:
+                # The response may still arrive; the connection cannot be reused
+                if connection is not None:
+                    self.connections -= 1
+                    connection[1].close()
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError) as e:
+                self.failures += 1
+                self.last_error = str(e) or type(e).__name__
+                if connection is not None:
+                    self.connections -= 1
+                    connection[1].close()
+                raise NodeError(self.name, -32000, f"Node {self.name} is unavailable: {self.last_error}") from e
+            finally:
+                self.busy_seconds += time.perf_counter() - start
+            self._idle.append(connection)
+            return line
+
+    async def call(self, method: str, params) -> object:
+        """Sends one request and returns its result, raising NodeError on failure."""
+        response = json.loads(await self.request({"jsonrpc": "2.0", "method": method, "params": params, "id": 1}))
+        if "error" in response:
+            error = response["error"]
+            raise NodeError(self.name, error.get("code", -32000), error.get("message", "Unknown error"))
+        return response.get("result")
+
+    def stats(self) -> dict:
+        return {
+            "node": self.name,
+            "roots": self.roots,
+            "pool_size": self.pool_size,
+            "open_connections": self.connections,
+            "idle_connections": len(self._idle),
+            "requests": self.requests,
+            "failures": self.failures,
+            "busy_seconds": round(self.busy_seconds, 6),
+            "last_error": self.last_error,
+        }
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+            self.connections -= 1
+
+
+class Federation:
+    """Routes requests to the nodes owning their paths and merges many-root listings."""
+
+    def __init__(self, backends: list[Backend]):
+        if not backends:
+            raise ValueError("At least one backend is required.")
+        self.backends = backends
+
+    def route(self, path: str) -> Backend:
+        """Returns the node owning the longest root that contains `path`."""
+        path = normalize_path(path)
+        best, best_length = None, -1
+        for backend in self.backends:
+            for root in backend.roots:
+                if len(root) > best_length and _owns(root, path):
+                    best, best_length = backend, len(root)
+        if best is None:
+            raise ValueError(f"No backend owns path '{path}'.")
+        return best
+
+    async def connect_all(self):
+        """Opens one connection to every node, to learn the tools and fail early on typos; errors are only logged."""
+
+        async def probe(backend: Backend):
+            try:
+                await backend.call("tools/list", None)
+            except NodeError as e:
+                print(f"Warning: {e}", file=sys.stderr)
+
+        await asyncio.gather(*(probe(backend) for backend in self.backends))
+
+    def tools(self) -> list[dict]:
+        """The tools of the first reachable node, with get_file_list extended by `paths`."""
+        tools = next((backend.tools for backend in self.backends if backend.tools), [])
+        result = []
+        for tool in tools:
+            if tool.get("name") not in ROUTED_METHODS:
+                continue
+            if tool["name"] == "get_file_list":
+                tool = copy.deepcopy(tool)
+                schema = tool.setdefault("inputSchema", {"type": "object", "properties": {}})
+                schema.setdefault("properties", {})["paths"] = {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "複数のルートパス。各パスを所有するノードへ並列に振り分け、結果を1つの一覧にまとめます",
+                }
+                schema.pop("required", None)
+                tool["description"] = tool.get("description", "") + "pathsに複数のルートを指定すると、各ノードで並列にスキャンした結果をentriesにまとめて返し、失敗したルートはerrorsに返します。"
+            result.append(tool)
+        return result
+
+    async def forward(self, request: dict) -> bytes:
+        """Forwards a single-path request to its node and returns the raw response line."""
+        method = request.get("method")
+        params = request.get("params")
+        keys = ROUTED_METHODS[method]
+        if isinstance(params, list):
+            paths = params[:len(keys)]
+        elif isinstance(params, dict):
+            paths = [params.get(key) for key in keys]
+        else:
+            paths = []
+        if len(paths) != len(keys) or not all(isinstance(path, str) for path in paths):
+            raise TypeError(f"Invalid params: {method} needs {', '.join(keys)} to route the request.")
+        nodes = {self.route(path) for path in paths}
+        if len(nodes) > 1:
+            raise ValueError(f"The paths of {method} are owned by different nodes: {', '.join(sorted(n.name for n in nodes))}.")
+        return await nodes.pop().request(request)
+
+    async def file_list(self, paths: list[str], options: dict) -> dict:
+        """
+        Lists several roots in parallel on their nodes. With a sort order the
+        per-node listings (already sorted by the nodes) are k-way merged;
+        otherwise they are concatenated in the order of `paths`. Roots that
+        fail are reported in `errors` and the others are still returned.
+        """
+        sort = options.get("sort")
+        if sort is not None and sort not in SORT_KEYS:
+            raise ValueError(f"Unsupported sort order '{sort}'. Expected one of {', '.join(SORT_KEYS)}.")
+
+        async def scan(path: str):
+            backend = self.route(path)
+            return await backend.call("get_file_list", dict(options, path=path))
+
+        results = await asyncio.gather(*(scan(path) for path in paths), return_exceptions=True)
+        listings, errors = [], []
+        for path, result in zip(paths, results):
+            if isinstance(result, NodeError):
+                errors.append({"path": path, "node": result.node, "code": result.code, "message": str(result)})
+            elif isinstance(result, ValueError):
+                errors.append({"path": path, "node": None, "code": -32000, "message": str(result)})
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                listings.append(result)
+        if sort is not None:
+            entries = list(heapq.merge(*listings, key=sort_key_function(sort)))
+        else:
+            entries = [entry for listing in listings for entry in listing]
+        return {"entries": entries, "errors": errors}
+
+    def stats(self) -> dict:
+        return {"nodes": [backend.stats() for backend in self.backends]}
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
+
+
+def _error_line(req_id, code: int, message: str) -> bytes:
+    return json.dumps({"id": req_id, "error": {"code": code, "message": message}, "jsonrpc": "2.0"}).encode() + b"\n"
+
+
+def _result_line(req_id, result) -> bytes:
+    return json.dumps({"id": req_id, "result": result, "jsonrpc": "2.0"}).encode() + b"\n"
+
+
+async def handle_federated_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, federation: Federation, peer_name: str):
+    """Serves one client of the aggregator with the line-delimited JSON-RPC protocol of transport.py."""
+    print(f"[{time.time()}] Connection established from {peer_name}", file=sys.stderr)
+    try:
+        hello = {
+            "jsonrpc": "2.0",
+            "method": "server/hello",
+            "params": {"version": "0.1.0", "displayName": "EFU File Lister", "tools": federation.tools()},
+        }
+        writer.write((json.dumps(hello) + "\n").encode())
+        await writer.drain()
+
+        while not reader.at_eof():
+            request_line = await reader.readline()
+            if not request_line.strip():
+                continue
+            req_id = None
+            try:
+                request = json.loads(request_line)
+                req_id = request.get("id")
+                method = request.get("method")
+                params = request.get("params")
+                if method == "tools/list":
+                    response = _result_line(req_id, {"tools": federation.tools()})
+                elif method == "federation/nodes":
+                    response = _result_line(req_id, federation.stats())
+                elif method == "get_file_list" and isinstance(params, dict) and params.get("paths") is not None:
+                    paths = params["paths"]
+                    if not (isinstance(paths, list) and paths and all(isinstance(p, str) for p in paths)):
+                        response = _error_line(req_id, -32602, "Invalid params: 'paths' must be a non-empty list of strings.")
+                    else:
+                        options = {key: value for key, value in params.items() if key not in ("path", "paths")}
+                        response = _result_line(req_id, await federation.file_list(paths, options))
+                elif method in ROUTED_METHODS:
+                    response = await federation.forward(request)
+                else:
+                    response = _error_line(req_id, -32601, f"Method not found: {method}")
+            except json.JSONDecodeError:
+                response = _error_line(req_id, -32700, "Parse error: Invalid JSON.")
+            except TypeError as e:
+                response = _error_line(req_id, -32602, str(e))
+            except NodeError as e:
+                response = _error_line(req_id, e.code, str(e))
+            except ValueError as e:
+                response = _error_line(req_id, -32000, f"Server error: {e}")
+            except Exception as e:
+                response = _error_line(req_id, -32603, f"Internal error: {e}")
+            writer.write(response)
+            await writer.drain()
+    except (asyncio.CancelledError, ConnectionResetError):
+        pass
+    except Exception as e:
+        print(f"An unexpected error occurred with {peer_name}: {e}", file=sys.stderr)
+    finally:
+        print(f"Closing connection with {peer_name}", file=sys.stderr)
+        if not writer.is_closing():
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+async def start_federated_server(host: str, port: int, backend_specs: list[str], pool_size: int = DEFAULT_POOL_SIZE):
+    """Starts the aggregator on host:port in front of the given 'HOST:PORT=ROOT,...' backends."""
+    federation = Federation([Backend(address, roots, pool_size) for address, roots in map(parse_backend, backend_specs)])
+    await federation.connect_all()
+    try:
+        server = await asyncio.start_server(
+            lambda r, w: handle_federated_connection(r, w, federation, f"TCP client {w.get_extra_info('peername')}"),
+            host,
+            port,
+        )
+        addr = server.sockets[0].getsockname()
+        print(f"Federated TCP server listening on {addr} for {len(federation.backends)} nodes", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+    except Exception as e:
+        print(f"Failed to start federated TCP server: {e}", file=sys.stderr)
+    finally:
+        await federation.close()
@@ -0,0 +1,312 @@
+# mcp_efu/grep.py
+#
+# Content search over the files below a directory. Files are memory-mapped
+# and searched with a compiled bytes regex; only the matching lines are
+# returned, never whole file contents. Large searches fan out to a process
+# pool, because the re module holds the GIL while matching. Servers keep one
+# GrepPool for all requests; one-off searches start and stop their own pool.
+import collections
+import fnmatch
+import itertools
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from .core import EfuFileManager, FILE_ATTRIBUTE_DIRECTORY
+
+DEFAULT_MAX_MATCHES_PER_FILE = 20
+DEFAULT_MAX_MATCHES = 1000
+# Matched lines longer than this are cut, so minified files stay cheap to return
+MAX_LINE_CHARS = 500
+# A NUL byte in the first block marks a file as binary, like grep and git do
+BINARY_SNIFF_BYTES = 8192
+
+# Searches over fewer candidate files than this run in the calling thread
+_PARALLEL_MIN_FILES = 256
+# Files per task sent to a worker process
+_BATCH_FILES = 32
+
+# Progress callback: (files_searched, matches_found)
+GrepProgress = Callable[[int, int], None]
+
+
+class GrepPool:
+    """
+    Worker processes shared by the searches of a long-running server.
+
+    The processes are spawned by the first search large enough to need them
+    and then kept, so later searches do not pay for starting them. Searches
+    running at the same time share them. shutdown() stops them.
+    """
+
+    def __init__(self, workers: int | None = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: ProcessPoolExecutor | None = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The grep pool has been shut down.")
+            if self._executor is None:
+                self._executor = _new_executor(self.workers)
+            return self._executor
+
+    def shutdown(self, wait: bool = True):
+        """Stops the worker processes; searches still queued are cancelled."""
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def make_path_filter(root: str, include: list[str] | None = None, exclude: list[str] | None = None) -> Callable[[str], bool]:
+    """
+    Returns a predicate for file paths below `root`. A glob without a "/"
+    is matched against the file name ("*.py"), any other glob against the
+    path relative to root with "/" separators ("src/*/test_*.py"). A path
+    is accepted if it matches some include glob (or none are given) and no
+    exclude glob.
+    """
+    root_path = Path(root)
+
+    def matches(path: str, patterns: list[str]) -> bool:
+        name = os.path.basename(path)
+        relative = None
+        for pattern in patterns:
+            if "/" not in pattern:
+                if fnmatch.fnmatchcase(name, pattern):
+                    return True
+                continue
+            if relative is None:
+                relative = Path(path).relative_to(root_path).as_posix()
+            if fnmatch.fnmatchcase(relative, pattern.strip("/")):
+                return True
+        return False
+
+    def accept(path: str) -> bool:
+        if include and not matches(path, include):
+            return False
+        return not (exclude and matches(path, exclude))
+
+    return accept
+
+
+def iter_grep(
+    efu_manager: EfuFileManager,
+    root: str,
+    pattern: str,
+    include: list[str] | None = None,
+    exclude: list[str] | None = None,
+    ignore_case: bool = False,
+    max_matches_per_file: int = DEFAULT_MAX_MATCHES_PER_FILE,
+    max_matches: int = DEFAULT_MAX_MATCHES,
+    workers: int | None = None,
+    pool: GrepPool | None = None,
+) -> Iterator[dict]:
+    """
+    Searches the contents of the files below `root` and yields one result
+    per searched file, in path order, as soon as it is available:
+
+        {"filename": ..., "status": "matched" | "no_match" | "binary" | "error",
+         "matches": [{"line": 1-based line number, "text": ...}],
+         "truncated": True if more lines matched than max_matches_per_file,
+         "bytes": bytes searched}
+
+    `pattern` is a Python regular expression, matched per line (^ and $
+    match at line boundaries) against the raw bytes of each file; it is
+    encoded as UTF-8 and matched lines are decoded with replacement
+    characters. Each line is reported once, however often it matches.
+    Files with a NUL byte in their first 8 KiB are skipped as binary.
+
+    The search stops after `max_matches` matching lines in total. Up to
+    `workers` processes (default: the number of CPUs) search in parallel,
+    taken from `pool` if one is given and started for this search
+    otherwise. The regex is validated before any file is read and a
+    ValueError is raised if it does not compile.
+    """
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    try:
+        re.compile(pattern.encode("utf-8"), flags)
+    except re.error as e:
+        raise ValueError(f"Invalid pattern '{pattern}': {e}")
+    if max_matches_per_file < 1 or max_matches < 1:
+        raise ValueError("max_matches_per_file and max_matches must be at least 1.")
+    workers = workers or (pool.workers if pool is not None else os.cpu_count()) or 1
+
+    accept = make_path_filter(str(Path(root).resolve()), include, exclude)
+    paths = (
+        entry["filename"]
+        for entry in efu_manager.iter_file_list(root, name_order=True)
+        if not entry["attributes"] & FILE_ATTRIBUTE_DIRECTORY and entry["size"] > 0 and accept(entry["filename"])
+    )
+    search = (pattern, flags, max_matches_per_file)
+
+    remaining = max_matches
+    for result in _search_paths(paths, search, workers, pool):
+        efu_manager._charge_io(result["bytes"], 1)
+        if len(result["matches"]) > remaining:
+            del result["matches"][remaining:]
+            result["truncated"] = True
+        remaining -= len(result["matches"])
+        yield result
+        if remaining == 0:
+            return
+
+
+def grep_files(
+    efu_manager: EfuFileManager,
+    root: str,
+    pattern: str,
+    include: list[str] | None = None,
+    exclude: list[str] | None = None,
+    ignore_case: bool = False,
+    max_matches_per_file: int = DEFAULT_MAX_MATCHES_PER_FILE,
+    max_matches: int = DEFAULT_MAX_MATCHES,
+    progress: GrepProgress | None = None,
+    workers: int | None = None,
+    pool: GrepPool | None = None,
+) -> dict:
+    """
+    Runs iter_grep() and collects the files with matches, together with
+    counts of the files searched and skipped. `truncated` is set when a
+    match cap cut the result short.
+    """
+    result = {
+        "root": str(Path(root).resolve()),
+        "pattern": pattern,
+        "files": [],
+        "matches": 0,
+        "files_searched": 0,
+        "binary_files_skipped": 0,
+        "unreadable_files": 0,
+        "truncated": False,
+    }
+    for file_result in iter_grep(
+        efu_manager, root, pattern, include, exclude, ignore_case, max_matches_per_file, max_matches, workers, pool
+    ):
+        status = file_result.pop("status")
+        file_result.pop("bytes")
+        if status == "binary":
+            result["binary_files_skipped"] += 1
+        elif status == "error":
+            result["unreadable_files"] += 1
+        else:
+            result["files_searched"] += 1
+        if file_result["matches"]:
+            result["files"].append(file_result)
+            result["matches"] += len(file_result["matches"])
+            result["truncated"] = result["truncated"] or file_result["truncated"]
+        if progress is not None:
+            progress(result["files_searched"], result["matches"])
+    if result["matches"] >= max_matches:
+        result["truncated"] = True
+    return result
+
+
+def _search_paths(paths: Iterable[str], search: tuple, workers: int, pool: GrepPool | None) -> Iterator[dict]:
+    paths = iter(paths)
+    first = []
+    for path in paths:
+        first.append(path)
+        if len(first) >= _PARALLEL_MIN_FILES:
+            break
+    if workers == 1 or len(first) < _PARALLEL_MIN_FILES:
+        for path in itertools.chain(first, paths):
+            yield _search_file(path, *search)
+        return
+
+    paths = itertools.chain(first, paths)
+    if pool is not None:
+        yield from _search_batches(pool.executor(), paths, search, min(workers, pool.workers))
+        return
+    with _new_executor(workers) as executor:
+        yield from _search_batches(executor, paths, search, workers)
+
+
+def _new_executor(workers: int) -> ProcessPoolExecutor:
+    # Spawned rather than forked workers: the server process runs threads.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _search_batches(executor: ProcessPoolExecutor, paths: Iterator[str], search: tuple, workers: int) -> Iterator[dict]:
+    # Batches are submitted ahead only a few per worker, so memory stays
+    # bounded and a search that hits its cap stops reading the tree early.
+    pending = collections.deque()
+    try:
+        for batch in _batched(paths):
+            pending.append(executor.submit(_search_batch, batch, *search))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _batched(paths: Iterator[str]) -> Iterator[list[str]]:
+    while batch := list(itertools.islice(paths, _BATCH_FILES)):
+        yield batch
+
+
+def _search_batch(paths: list[str], pattern: str, flags: int, max_matches_per_file: int) -> list[dict]:
+    return [_search_file(path, pattern, flags, max_matches_per_file) for path in paths]
+
+
+@lru_cache(maxsize=16)
+def _compile(pattern: str, flags: int) -> re.Pattern:
+    return re.compile(pattern.encode("utf-8"), flags)
+
+
+def _search_file(path: str, pattern: str, flags: int, max_matches_per_file: int) -> dict:
+    result = {"filename": path, "status": "no_match", "matches": [], "truncated": False, "bytes": 0}
+    try:
+        with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b"\0", 0, BINARY_SNIFF_BYTES) != -1:
+                result["status"] = "binary"
+                result["bytes"] = min(len(mm), BINARY_SNIFF_BYTES)
+                return result
+            regex = _compile(pattern, flags)
+            matches = result["matches"]
+            line_number = 1
+            counted_to = 0
+            pos = 0
+            size = len(mm)
+            while pos < size:
+                match = regex.search(mm, pos)
+                if match is None:
+                    break
+                if len(matches) == max_matches_per_file:
+                    result["truncated"] = True
+                    break
+                start = mm.rfind(b"\n", 0, match.start()) + 1
+                end = mm.find(b"\n", match.start())
+                if end == -1:
+                    end = size
+                # Count the line breaks since the previous match in place; slicing would copy the span
+                newline = mm.find(b"\n", counted_to, start)
+                while newline != -1:
+                    line_number += 1
+                    newline = mm.find(b"\n", newline + 1, start)
+                counted_to = start
+                text = mm[start:end].rstrip(b"\r").decode("utf-8", "replace")
+                matches.append({"line": line_number, "text": text[:MAX_LINE_CHARS]})
+                # One result per line; continue after its line break
+                pos = end + 1
+            result["bytes"] = min(pos, size) if result["truncated"] else size
+    except (OSError, ValueError):
+        # Unreadable, vanished or empty (mmap of length 0) files
+        result["status"] = "error"
+        return result
+    if result["matches"]:
+        result["status"] = "matched"
+    return result
@@ -0,0 +1,275 @@
+# mcp_efu/iosched.py
+#
+# Central scheduler for scan and hash work. Interactive requests (tool calls)
+# and background work (jobs) run on separate worker threads, so a short
+# interactive request never waits behind a long batch job. Background work
+# is throttled to configurable bytes/sec and IOPS budgets, which interactive
+# I/O also draws from, and its threads can be given a lower CPU and I/O
+# priority.
+import collections
+import contextvars
+import ctypes
+import ctypes.util
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITY_CLASSES = (INTERACTIVE, BACKGROUND)
+
+DEFAULT_INTERACTIVE_WORKERS = 8
+DEFAULT_BACKGROUND_WORKERS = 2
+
+# ioprio_set(2) syscall numbers and constants (Linux only)
+_SYS_IOPRIO_SET = {"x86_64": 251, "amd64": 251, "aarch64": 30, "arm64": 30, "i386": 289, "i686": 289}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second, holding at
+    most `burst` tokens (one second's worth by default).
+
+    consume() takes the tokens at once and, if that leaves the bucket in
+    debt, sleeps until the debt is paid back; several threads sharing a
+    bucket therefore get the configured rate in total.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: float, wait: bool = True) -> float:
+        """Takes `amount` tokens. Returns the time slept, which is 0 unless `wait`."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            delay = -self._tokens / self.rate
+        if not wait or delay <= 0:
+            return 0.0
+        time.sleep(delay)
+        return delay
+
+
+class _Task:
+    __slots__ = ("future", "func", "args", "kwargs", "context")
+
+    def __init__(self, future: Future, func, args, kwargs):
+        self.future = future
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        # Like asyncio.to_thread, run in the submitter's context variables
+        self.context = contextvars.copy_context()
+
+
+class _WorkerPool:
+    def __init__(self, name: str, size: int, initializer=None):
+        self.name = name
+        self.size = size
+        self.initializer = initializer
+        self.queue: collections.deque[_Task] = collections.deque()
+        self.running = 0
+        self.completed = 0
+        self.threads: list[threading.Thread] = []
+
+
+class IoScheduler:
+    """
+    Runs scan and hash work in priority classes with I/O budgets.
+
+    submit() queues a call in the interactive or background class and returns
+    a concurrent.futures.Future. Each class has its own worker threads. The
+    code doing the I/O reports it with charge(): background work then sleeps
+    as needed to stay within `max_bytes_per_second` and `max_iops`, while
+    interactive work is never delayed but its I/O is taken from the same
+    budgets, so background work backs off while interactive requests run.
+
+    `background_nice` raises the nice value of the background threads, and
+    `background_idle_io` puts them in the idle I/O class (Linux ioprio_set);
+    both are best effort. All worker threads are daemon threads; shutdown()
+    stops them once the queued work is done.
+    """
+
+    def __init__(
+        self,
+        interactive_workers: int = DEFAULT_INTERACTIVE_WORKERS,
+        background_workers: int = DEFAULT_BACKGROUND_WORKERS,
+        max_bytes_per_second: float | None = None,
+        max_iops: float | None = None,
+        background_nice: int | None = None,
+        background_idle_io: bool = False,
+    ):
+        if interactive_workers < 1 or background_workers < 1:
+            raise ValueError("Each priority class needs at least one worker.")
+        self.max_bytes_per_second = max_bytes_per_second
+        self.max_iops = max_iops
+        self.background_nice = background_nice
+        self.background_idle_io = background_idle_io
+        self._byte_bucket = TokenBucket(max_bytes_per_second) if max_bytes_per_second else None
+        self._iop_bucket = TokenBucket(max_iops) if max_iops else None
+        self._pools = {
+            INTERACTIVE: _WorkerPool(INTERACTIVE, interactive_workers),
+            BACKGROUND: _WorkerPool(BACKGROUND, background_workers, self._lower_thread_priority),
+        }
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._counters_lock = threading.Lock()
+        self.bytes_charged = 0
+        self.ops_charged = 0
+        self.throttled_seconds = 0.0
+        self.priority_applied = None
+        self._shutdown = False
+
+    def submit(self, func, *args, priority: str = INTERACTIVE, **kwargs) -> Future:
+        """Queues func(*args, **kwargs) in the given priority class."""
+        pool = self._pools.get(priority)
+        if pool is None:
+            raise ValueError(f"Unknown priority class '{priority}'. Expected one of {', '.join(PRIORITY_CLASSES)}.")
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit work after the scheduler has been shut down.")
+            pool.queue.append(_Task(future, func, args, kwargs))
+            # Threads are started on demand, up to the pool size
+            if len(pool.threads) < pool.size and len(pool.queue) > len(pool.threads) - pool.running:
+                thread = threading.Thread(
+                    target=self._worker, args=(pool,), name=f"mcp_efu-{pool.name}-{len(pool.threads)}", daemon=True
+                )
+                pool.threads.append(thread)
+                thread.start()
+            self._condition.notify_all()
+        return future
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        """
+        Stops accepting work and lets the worker threads exit once the queues
+        are empty. Like Executor.shutdown(), `cancel_futures` cancels the work
+        still queued, and `wait` waits for the threads to exit.
+        """
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                for pool in self._pools.values():
+                    while pool.queue:
+                        pool.queue.popleft().future.cancel()
+            self._condition.notify_all()
+            threads = [thread for pool in self._pools.values() for thread in pool.threads]
+        if wait:
+            for thread in threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    def current_priority(self) -> str:
+        """The priority class of the calling thread; threads outside the scheduler count as interactive."""
+        return getattr(self._local, "priority", INTERACTIVE)
+
+    def charge(self, nbytes: int = 0, ops: int = 0):
+        """
+        Accounts for I/O done by the calling thread. Background threads sleep
+        here when a budget is exhausted; other threads only use up budget.
+        """
+        wait = self.current_priority() == BACKGROUND
+        slept = 0.0
+        if self._byte_bucket is not None and nbytes:
+            slept += self._byte_bucket.consume(nbytes, wait)
+        if self._iop_bucket is not None and ops:
+            slept += self._iop_bucket.consume(ops, wait)
+        with self._counters_lock:
+            self.bytes_charged += nbytes
+            self.ops_charged += ops
+            self.throttled_seconds += slept
+
+    def queue_depth(self) -> int:
+        with self._condition:
+            return sum(len(pool.queue) for pool in self._pools.values())
+
+    def stats(self) -> dict:
+        """Returns the queue depth and activity per priority class, and the I/O accounting."""
+        with self._condition:
+            classes = {
+                name: {"queued": len(pool.queue), "running": pool.running, "completed": pool.completed, "workers": pool.size}
+                for name, pool in self._pools.items()
+            }
+        with self._counters_lock:
+            return {
+                "queue_depth": sum(item["queued"] for item in classes.values()),
+                "classes": classes,
+                "bytes": self.bytes_charged,
+                "ops": self.ops_charged,
+                "throttled_seconds": self.throttled_seconds,
+                "max_bytes_per_second": self.max_bytes_per_second,
+                "max_iops": self.max_iops,
+                "background_priority_applied": self.priority_applied,
+            }
+
+    def _worker(self, pool: _WorkerPool):
+        self._local.priority = pool.name
+        if pool.initializer is not None:
+            pool.initializer()
+        while True:
+            with self._condition:
+                while not pool.queue and not self._shutdown:
+                    self._condition.wait()
+                if not pool.queue:
+                    return
+                task = pool.queue.popleft()
+                pool.running += 1
+            started = False
+            result = error = None
+            try:
+                started = task.future.set_running_or_notify_cancel()
+                if started:
+                    try:
+                        result = task.context.run(task.func, *task.args, **task.kwargs)
+                    except BaseException as e:
+                        error = e
+            finally:
+                # Counted before the future resolves, so a caller's stats() sees its task as completed
+                with self._condition:
+                    pool.running -= 1
+                    pool.completed += 1
+            if started:
+                if error is not None:
+                    task.future.set_exception(error)
+                else:
+                    task.future.set_result(result)
+
+    def _lower_thread_priority(self):
+        applied = []
+        if self.background_nice:
+            try:
+                # On Linux, PRIO_PROCESS with a thread id affects only that thread.
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.background_nice)
+                applied.append("nice")
+            except (AttributeError, OSError):
+                pass
+        if self.background_idle_io and _set_thread_idle_io():
+            applied.append("ioprio")
+        self.priority_applied = applied
+
+
+def _set_thread_idle_io() -> bool:
+    """Puts the calling thread in the idle I/O scheduling class. Returns whether it worked."""
+    number = _SYS_IOPRIO_SET.get(platform.machine().lower())
+    if not sys.platform.startswith("linux") or number is None:
+        return False
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        result = libc.syscall(number, _IOPRIO_WHO_PROCESS, threading.get_native_id(), _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT)
+    except (OSError, AttributeError):
+        return False
+    return result == 0
@@ -0,0 +1,408 @@
+# mcp_efu/jobs.py
+#
+# Long-running scan and hash jobs that survive restarts. Each job has its own
+# directory below the jobs directory:
+#   job.json         metadata, status and progress
+#   checkpoint.json  the state needed to resume, as of the last checkpoint
+#   results.ndjson   output rows; only the rows counted in the checkpoint are
+#                    committed, anything after them is redone on resume
+import itertools
+import json
+import os
+import secrets
+import shutil
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from .core import EfuFileManager, FILE_ATTRIBUTE_DIRECTORY
+from .diff import HASH_METHODS
+from .iosched import BACKGROUND, IoScheduler
+from .listing import iter_listing
+from .reader import DEFAULT_READ_LIMIT, MAX_READ_LIMIT
+
+DEFAULT_JOBS_DIR = os.path.join("~", ".cache", "mcp_efu", "jobs")
+DEFAULT_MAX_RUNNING_JOBS = 2
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 5.0
+DEFAULT_JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+JOB_FILE = "job.json"
+CHECKPOINT_FILE = "checkpoint.json"
+RESULTS_FILE = "results.ndjson"
+
+# A job is queued, then running, and ends completed, failed or cancelled.
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _write_json_atomic(path: Path, data: dict):
+    temp_path = path.with_suffix(".tmp")
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temp_path, path)
+
+
+def _encode_row(row: dict) -> bytes:
+    return json.dumps(row).encode() + b"\n"
+
+
+def _index_rows(path: Path, offsets: array, end: int):
+    """Appends the start offsets of the rows between offsets[-1] and byte `end` of a results file."""
+    if offsets[-1] >= end:
+        return
+    with open(path, "rb") as handle:
+        handle.seek(offsets[-1])
+        while offsets[-1] < end:
+            line = handle.readline()
+            if not line:
+                break
+            offsets.append(offsets[-1] + len(line))
+
+
+class _Job:
+    def __init__(self, job_id: str, kind: str, params: dict, directory: Path):
+        self.job_id = job_id
+        self.kind = kind
+        self.params = params
+        self.directory = directory
+        self.status = "queued"
+        self.error = None
+        self.created = self.updated = time.time()
+        # Number of committed result rows
+        self.results = 0
+        # Byte offsets of the committed rows in the results file plus its
+        # committed length; built on first read and extended at checkpoints
+        self.offsets = None
+        self.progress = {}
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "updated": self.updated,
+            "results": self.results,
+            "progress": dict(self.progress),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, directory: Path) -> "_Job":
+        job = cls(data["job_id"], data["kind"], data["params"], directory)
+        job.status = data["status"]
+        job.error = data.get("error")
+        job.created = data["created"]
+        job.updated = data["updated"]
+        job.results = data.get("results", 0)
+        job.progress = data.get("progress", {})
+        return job
+
+
+class JobManager:
+    """
+    Runs scan and hash jobs in background threads and persists their state.
+
+    Jobs run as background work on an IoScheduler: the given `scheduler`,
+    else the one of `efu_manager`, else a new one with `max_running`
+    background workers. Their I/O is throttled to the scheduler's budgets
+    when `efu_manager` charges the same scheduler.
+
+    Every `checkpoint_interval` seconds a running job flushes its results and
+    records what remains to be done: for a scan, the stack of directories not
+    yet listed; for a hash job, the number of input files already hashed.
+    Jobs that were queued or running when the process stopped are resumed
+    from their last checkpoint when a JobManager is created on the same jobs
+    directory, so finished directories and files are not read again.
+    Finished jobs are deleted after `retention` seconds.
+    """
+
+    def __init__(
+        self,
+        jobs_dir: str = DEFAULT_JOBS_DIR,
+        efu_manager: EfuFileManager | None = None,
+        max_running: int = DEFAULT_MAX_RUNNING_JOBS,
+        checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL_SECONDS,
+        retention: float = DEFAULT_JOB_RETENTION_SECONDS,
+        scheduler: IoScheduler | None = None,
+    ):
+        self.jobs_dir = Path(jobs_dir).expanduser()
+        self.efu_manager = efu_manager or EfuFileManager()
+        self.max_running = max_running
+        self.scheduler = scheduler or self.efu_manager.io_scheduler or IoScheduler(background_workers=max_running)
+        self.checkpoint_interval = checkpoint_interval
+        self.retention = retention
+        self._jobs: dict[str, _Job] = {}
+        self._lock = threading.Lock()
+        self._load_jobs()
+
+    def start_scan_job(self, path: str) -> dict:
+        """Starts scanning a directory tree; the results are get_file_list entries."""
+        root_path = Path(path).resolve()
+        if not root_path.is_dir():
+            raise ValueError(f"Path '{path}' is not a valid directory.")
+        return self._submit(self._create("scan", {"path": str(root_path)}))
+
+    def start_hash_job(self, paths: list[str] | None = None, listing: str | None = None, hash_method: str = "sha1") -> dict:
+        """
+        Starts hashing the given files, or every file of a saved listing.
+        Each result row is a hash tool result, or {"path", "error"} for a file
+        that could not be hashed.
+        """
+        if hash_method not in HASH_METHODS:
+            raise ValueError(f"Unsupported hash method '{hash_method}'. Expected one of {', '.join(HASH_METHODS)}.")
+        if (paths is None) == (listing is None):
+            raise ValueError("Specify either 'paths' or 'listing'.")
+        if listing is not None:
+            listing = str(Path(listing).resolve())
+            if not os.path.isfile(listing):
+                raise ValueError(f"Listing '{listing}' is not a valid file.")
+        params = {"hash_method": hash_method, "paths": list(paths) if paths is not None else None, "listing": listing}
+        return self._submit(self._create("hash", params))
+
+    def job_status(self, job_id: str) -> dict:
+        job = self._get(job_id)
+        with job.lock:
+            return job.to_dict()
+
+    def list_jobs(self) -> list[dict]:
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: job.created)
+        return [self.job_status(job.job_id) for job in jobs]
+
+    def job_results(self, job_id: str, offset: int = 0, limit: int = DEFAULT_READ_LIMIT) -> dict:
+        """
+        Returns up to `limit` committed result rows starting at `offset`.
+        While the job is active, more rows may follow after each checkpoint;
+        `next_offset` is None only once the job has ended and all rows have
+        been read.
+        """
+        if offset < 0:
+            raise ValueError("offset must not be negative.")
+        if limit < 1:
+            raise ValueError("limit must be a positive integer.")
+        job = self._get(job_id)
+        with job.lock:
+            committed = job.results
+            status = job.status
+            if job.offsets is None:
+                job.offsets = self._index_results(job)
+            offsets = job.offsets
+        end = min(committed, len(offsets) - 1, offset + min(limit, MAX_READ_LIMIT))
+        entries = []
+        if offset < end:
+            # Committed rows are never rewritten, so they are read outside the lock
+            with open(job.directory / RESULTS_FILE, "rb") as handle:
+                handle.seek(offsets[offset])
+                data = handle.read(offsets[end] - offsets[offset])
+            entries = [json.loads(line) for line in data.splitlines()]
+        end = max(end, offset)
+        return {
+            "job_id": job_id,
+            "status": status,
+            "entries": entries,
+            "offset": offset,
+            "total": committed,
+            "next_offset": end if end < committed or status in ACTIVE_STATUSES else None,
+        }
+
+    def cancel_job(self, job_id: str) -> dict:
+        """Asks a job to stop. A running job stops at the next directory or file."""
+        job = self._get(job_id)
+        job.cancel_event.set()
+        with job.lock:
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.updated = time.time()
+                self._save_job(job)
+            return job.to_dict()
+
+    def _create(self, kind: str, params: dict) -> _Job:
+        job_id = secrets.token_hex(8)
+        job = _Job(job_id, kind, params, self.jobs_dir / job_id)
+        job.directory.mkdir(parents=True)
+        with job.lock:
+            self._save_job(job)
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    def _get(self, job_id: str) -> _Job:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Unknown job '{job_id}'.")
+        return job
+
+    def _submit(self, job: _Job) -> dict:
+        # Scheduler threads are daemon threads: stopping the server does not
+        # wait for jobs, they are resumed from their checkpoints instead.
+        self.scheduler.submit(self._run, job, priority=BACKGROUND)
+        return self.job_status(job.job_id)
+
+    def _load_jobs(self):
+        if not self.jobs_dir.is_dir():
+            return
+        now = time.time()
+        resumed = []
+        for job_file in self.jobs_dir.glob(f"*/{JOB_FILE}"):
+            try:
+                job = _Job.from_dict(json.loads(job_file.read_text(encoding="utf-8")), job_file.parent)
+            except (OSError, ValueError, KeyError):
+                continue
+            if job.status not in ACTIVE_STATUSES:
+                if now - job.updated > self.retention:
+                    shutil.rmtree(job.directory, ignore_errors=True)
+                    continue
+            else:
+                checkpoint = self._load_checkpoint(job)
+                job.results = checkpoint["results"] if checkpoint else 0
+                job.status = "queued"
+                resumed.append(job)
+            self._jobs[job.job_id] = job
+        for job in sorted(resumed, key=lambda job: job.created):
+            self._submit(job)
+
+    def _index_results(self, job: _Job) -> array:
+        """Indexes the rows committed by the last checkpoint; the caller holds job.lock."""
+        offsets = array("Q", [0])
+        checkpoint = self._load_checkpoint(job)
+        if checkpoint is not None:
+            _index_rows(job.directory / RESULTS_FILE, offsets, checkpoint["results_bytes"])
+        return offsets
+
+    def _save_job(self, job: _Job):
+        """Persists job.json; the caller holds job.lock."""
+        _write_json_atomic(job.directory / JOB_FILE, job.to_dict())
+
+    def _load_checkpoint(self, job: _Job) -> dict | None:
+        try:
+            return json.loads((job.directory / CHECKPOINT_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _run(self, job: _Job):
+        with job.lock:
+            if job.cancel_event.is_set() or job.status != "queued":
+                return
+            job.status = "running"
+            job.updated = time.time()
+            self._save_job(job)
+        try:
+            checkpoint = self._load_checkpoint(job)
+            run = self._run_scan if job.kind == "scan" else self._run_hash
+            status = "completed" if run(job, checkpoint) else "cancelled"
+            error = None
+        except Exception as e:
+            status = "failed"
+            error = str(e)
+        with job.lock:
+            job.status = status
+            job.error = error
+            job.updated = time.time()
+            self._save_job(job)
+
+    def _open_results(self, job: _Job, checkpoint: dict | None) -> BinaryIO:
+        """Opens the results file, dropping rows written after the checkpoint."""
+        path = job.directory / RESULTS_FILE
+        handle = open(path, "r+b" if path.exists() else "wb")
+        handle.truncate(checkpoint["results_bytes"] if checkpoint else 0)
+        handle.seek(0, os.SEEK_END)
+        return handle
+
+    def _checkpoint(self, job: _Job, out: BinaryIO, state: dict, rows: int):
+        out.flush()
+        os.fsync(out.fileno())
+        state["results_bytes"] = out.tell()
+        state["results"] = rows
+        _write_json_atomic(job.directory / CHECKPOINT_FILE, state)
+        with job.lock:
+            if job.offsets is not None:
+                _index_rows(job.directory / RESULTS_FILE, job.offsets, state["results_bytes"])
+            job.results = rows
+            job.updated = time.time()
+            self._save_job(job)
+
+    def _run_scan(self, job: _Job, checkpoint: dict | None) -> bool:
+        root_path = Path(job.params["path"])
+        with self._open_results(job, checkpoint) as out:
+            if checkpoint is None:
+                if not root_path.is_dir():
+                    raise ValueError(f"Path '{root_path}' is not a valid directory.")
+                stat_info = self.efu_manager._lstat(root_path)
+                out.write(_encode_row(self.efu_manager._make_entry(root_path, stat_info, True)))
+                state = {"frontier": [str(root_path)], "dirs_scanned": 0}
+                rows = 1
+            else:
+                state = checkpoint
+                rows = checkpoint["results"]
+            # Directories still to be listed, popped depth first
+            frontier = state["frontier"]
+            last_checkpoint = time.monotonic()
+            while frontier:
+                if job.cancel_event.is_set():
+                    self._checkpoint(job, out, state, rows)
+                    return False
+                dir_path = Path(frontier.pop())
+                subdirs = []
+                for name, is_dir, recurse in self.efu_manager._sorted_children(dir_path):
+                    full_path = dir_path / name
+                    try:
+                        stat_info = self.efu_manager._lstat(full_path)
+                    except (FileNotFoundError, PermissionError):
+                        continue
+                    out.write(_encode_row(self.efu_manager._make_entry(full_path, stat_info, is_dir)))
+                    rows += 1
+                    if recurse:
+                        subdirs.append(str(full_path))
+                frontier.extend(reversed(subdirs))
+                state["dirs_scanned"] += 1
+                with job.lock:
+                    job.progress = {"entries": rows, "dirs_scanned": state["dirs_scanned"], "dirs_pending": len(frontier)}
+                if time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                    self._checkpoint(job, out, state, rows)
+                    last_checkpoint = time.monotonic()
+            self._checkpoint(job, out, state, rows)
+        return True
+
+    def _hash_inputs(self, job: _Job) -> Iterator[str]:
+        if job.params["paths"] is not None:
+            yield from job.params["paths"]
+            return
+        for entry in iter_listing(job.params["listing"]):
+            if not entry.get("attributes", 0) & FILE_ATTRIBUTE_DIRECTORY:
+                yield entry["filename"]
+
+    def _run_hash(self, job: _Job, checkpoint: dict | None) -> bool:
+        hash_file = getattr(self.efu_manager, f"get_{job.params['hash_method']}_hash")
+        total = len(job.params["paths"]) if job.params["paths"] is not None else None
+        state = checkpoint or {"next_index": 0, "errors": 0}
+        rows = checkpoint["results"] if checkpoint else 0
+        with self._open_results(job, checkpoint) as out:
+            last_checkpoint = time.monotonic()
+            # Files hashed before the checkpoint are skipped, not re-read
+            for path in itertools.islice(self._hash_inputs(job), state["next_index"], None):
+                if job.cancel_event.is_set():
+                    self._checkpoint(job, out, state, rows)
+                    return False
+                try:
+                    row = hash_file(path)
+                except (ValueError, OSError) as e:
+                    row = {"path": path, "error": str(e)}
+                    state["errors"] += 1
+                out.write(_encode_row(row))
+                rows += 1
+                state["next_index"] += 1
+                with job.lock:
+                    job.progress = {"files_hashed": state["next_index"], "files_total": total, "errors": state["errors"]}
+                if time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                    self._checkpoint(job, out, state, rows)
+                    last_checkpoint = time.monotonic()
+            self._checkpoint(job, out, state, rows)
+        return True
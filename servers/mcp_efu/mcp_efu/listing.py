@@ -0,0 +1,210 @@
+# mcp_efu/listing.py
+#
+# Reading and writing saved file listings. Three formats are supported:
+#   json   - a JSON array of entry objects (the CLI's default output)
+#   ndjson - one compact JSON entry object per line
+#   efu    - the CSV flavour used by Everything's EFU file lists
+# Listings can also be saved as binary snapshots; see snapshot.py.
+import csv
+import io
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, TextIO
+
+LISTING_FORMATS = ("json", "ndjson", "efu")
+SNAPSHOT_FORMAT = "snapshot"
+SNAPSHOT_MAGIC = b"EFUSNAP\0"
+
+# Column headers of an EFU file, mapped to the keys used in entry dicts
+EFU_COLUMNS = (
+    ("Filename", "filename"),
+    ("Size", "size"),
+    ("Date Modified", "date_modified"),
+    ("Date Created", "date_created"),
+    ("Attributes", "attributes"),
+)
+
+_EXTENSION_FORMATS = {
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".efu": "efu",
+    ".csv": "efu",
+    ".efusnap": SNAPSHOT_FORMAT,
+}
+
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def path_sort_key(filename: str) -> str:
+    """
+    Sort key that orders paths component by component.
+
+    Replacing the separator with NUL makes '/a/b' sort before '/a-b', so a
+    depth-first walk that visits children in name order produces entries in
+    ascending key order.
+    """
+    key = filename.replace(os.sep, "\0")
+    if os.altsep:
+        key = key.replace(os.altsep, "\0")
+    return key
+
+
+def detect_format(path: str) -> str:
+    """Guesses the listing format from the file extension, then from the first bytes."""
+    fmt = _EXTENSION_FORMATS.get(Path(path).suffix.lower())
+    if fmt is not None:
+        return fmt
+    with open(path, "rb") as handle:
+        head = handle.read(4096)
+    if head.startswith(SNAPSHOT_MAGIC):
+        return SNAPSHOT_FORMAT
+    head = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if head.startswith(b"["):
+        return "json"
+    if head.startswith(b"{"):
+        return "ndjson"
+    return "efu"
+
+
+def iter_listing(path: str, fmt: str | None = None) -> Iterator[dict]:
+    """Streams the entries of a saved listing without loading the whole file."""
+    fmt = fmt or detect_format(path)
+    if fmt == "json":
+        with open(path, "r", encoding="utf-8") as handle:
+            yield from _iter_json_array(handle)
+    elif fmt == "ndjson":
+        with open(path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == "efu":
+        with open(path, "r", encoding="utf-8-sig", newline="") as handle:
+            yield from iter_efu_rows(csv.reader(handle))
+    elif fmt == SNAPSHOT_FORMAT:
+        from .reader import SnapshotListing
+        with SnapshotListing(path) as snapshot:
+            yield from snapshot
+    else:
+        raise ValueError(f"Unsupported listing format '{fmt}'.")
+
+
+def iter_efu_rows(rows: Iterable[list[str]]) -> Iterator[dict]:
+    """Converts parsed EFU CSV rows (including the header row) into entry dicts."""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    keys = efu_column_keys(header)
+    for row in rows:
+        if row:
+            yield efu_row_to_entry(keys, row)
+
+
+def efu_column_keys(header: list[str]) -> list[str | None]:
+    """Maps the columns of an EFU header row to entry keys (None for unknown columns)."""
+    column_keys = dict(EFU_COLUMNS)
+    keys = [column_keys.get(name.strip()) for name in header]
+    if "filename" not in keys:
+        raise ValueError("EFU listing has no 'Filename' column.")
+    return keys
+
+
+def efu_row_to_entry(keys: list[str | None], row: list[str]) -> dict:
+    entry = {}
+    for key, value in zip(keys, row):
+        if key is None:
+            continue
+        if key == "filename":
+            entry[key] = value
+        else:
+            entry[key] = int(value) if value else 0
+    return entry
+
+
+def write_listing(entries: Iterable[dict], fmt: str, handle: TextIO):
+    """Writes entries to a text stream in the given listing format."""
+    if fmt == "json":
+        # Matches json.dumps(list, indent=2) without materialising the list.
+        handle.write("[")
+        first = True
+        for entry in entries:
+            handle.write("\n  " if first else ",\n  ")
+            handle.write(json.dumps(entry, indent=2).replace("\n", "\n  "))
+            first = False
+        handle.write("]" if first else "\n]")
+    elif fmt == "ndjson":
+        for entry in entries:
+            handle.write(json.dumps(entry))
+            handle.write("\n")
+    elif fmt == "efu":
+        writer = csv.writer(handle, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\r\n")
+        writer.writerow([name for name, _ in EFU_COLUMNS])
+        for entry in entries:
+            writer.writerow([entry.get(key, 0) for _, key in EFU_COLUMNS])
+    else:
+        raise ValueError(f"Unsupported listing format '{fmt}'.")
+
+
+def dumps_listing(entries: Iterable[dict], fmt: str) -> str:
+    """Returns the listing serialised to a string."""
+    buffer = io.StringIO()
+    write_listing(entries, fmt, buffer)
+    return buffer.getvalue()
+
+
+def _iter_json_array(handle: TextIO) -> Iterator[dict]:
+    """Incrementally decodes the elements of a top-level JSON array."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = handle.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip_whitespace()
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("JSON listing is not an array.")
+    pos += 1
+    skip_whitespace()
+    if buffer[pos:pos + 1] == "]":
+        return
+    while True:
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A value ending exactly at the buffer edge may continue in the next chunk.
+                if end < len(buffer) or eof:
+                    break
+                fill()
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Truncated or malformed JSON listing.")
+                fill()
+        yield value
+        pos = end
+        skip_whitespace()
+        separator = buffer[pos:pos + 1]
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError("Malformed JSON listing: expected ',' or ']'.")
+        pos += 1
+        skip_whitespace()
@@ -3,8 +3,23 @@ import argparse
 import sys
 import json
 import os
-from .core import EfuFileManager
-from fastmcp import FastMCP
+from pathlib import Path
+from .core import EfuFileManager, SCAN_FLAGS
+from .diff import HASH_METHODS, iter_with_hashes
+from .listing import LISTING_FORMATS, SNAPSHOT_FORMAT, write_listing
+from .cache import DEFAULT_CACHE_TTL_SECONDS, DEFAULT_CACHE_MAX_ENTRIES
+from .pagination import DEFAULT_SNAPSHOT_TTL_SECONDS, DEFAULT_SNAPSHOT_MAX_BYTES
+from .remote import DEFAULT_TCP_HOST, DEFAULT_TCP_PORT
+from .jobs import DEFAULT_JOBS_DIR, DEFAULT_MAX_RUNNING_JOBS
+from .sorting import SORT_KEYS, DEFAULT_SORT_MEMORY_BYTES, external_sort
+# Server-only modules (fastmcp, anyio, asyncio transport) are imported lazily
+# in the branch that needs them, so one-off CLI scans start quickly.
+
+# Default number of worker threads for scans and hashes in server mode
+DEFAULT_MAX_WORKERS = 8
+
+# Persistent connections per daemon in aggregator mode (--backend)
+DEFAULT_BACKEND_POOL_SIZE = 4
 
 def main():
     """
@@ -14,6 +29,18 @@ def main():
     # Print current working directory at the beginning
     print(f"Current working directory: {os.getcwd()}", file=sys.stderr)
 
+    # Subcommands are dispatched before the main parser, whose optional
+    # positional 'path' would otherwise swallow them.
+    if len(sys.argv) > 1 and sys.argv[1] == "diff":
+        diff_command(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "convert":
+        convert_command(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "grep":
+        grep_command(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="mcp_efu: A tool to generate EFU file lists. Can run as a server or a single-command CLI.",
         formatter_class=argparse.RawTextHelpFormatter,
@@ -27,6 +54,29 @@ Examples:
 
   # Scan a directory and write the output to a file
   python -m mcp_efu ./my_directory --output my_file_list.json
+
+  # Write the listing as NDJSON or as an Everything EFU file
+  python -m mcp_efu ./my_directory --format efu --output my_file_list.efu
+
+  # List the largest files last, sorting with at most 64 MiB of memory
+  python -m mcp_efu ./my_directory --format ndjson --sort size --sort-memory 64
+
+  # Save a compact binary snapshot and convert it back to JSON later
+  python -m mcp_efu ./my_directory --format snapshot --output my_file_list.efusnap
+  python -m mcp_efu convert my_file_list.efusnap --format json --output my_file_list.json
+
+  # Compare a saved listing with the current state of the directory
+  python -m mcp_efu diff my_file_list.efu ./my_directory
+
+  # Find the Python files under a tree that mention a function
+  python -m mcp_efu grep "def main\\b" ./my_directory --include "*.py"
+
+  # Run a long-lived daemon and let CLI calls use its warm caches
+  python -m mcp_efu --transport tcp --port 8765
+  python -m mcp_efu ./my_directory --connect 127.0.0.1:8765
+
+  # Serve several daemons through one endpoint, routing each path to the node that owns it
+  python -m mcp_efu --transport tcp --port 8765 --backend fs1:8765=/srv/a --backend fs2:8765=/srv/b,/home
 """
     )
 
@@ -34,9 +84,121 @@ Examples:
     server_group = parser.add_argument_group('Server Mode Arguments')
     server_group.add_argument(
         "--transport",
-        choices=["stdio", "sse", "streamable-http"],
+        choices=["stdio", "sse", "streamable-http", "tcp"],
         default=None,
-        help="Run as an MCP server with the specified transport.\nstdio: Use standard input/output.\nsse: Use Server-Sent Events.\nstreamable-http: Use streamable HTTP."
+        help="Run as an MCP server with the specified transport.\nstdio: Use standard input/output.\nsse: Use Server-Sent Events.\nstreamable-http: Use streamable HTTP.\ntcp: Run as a daemon speaking line-delimited JSON-RPC over TCP (see --connect)."
+    )
+    server_group.add_argument(
+        "--host",
+        default=None,
+        help=f"Address to listen on for the tcp, sse and streamable-http transports (tcp default: {DEFAULT_TCP_HOST})."
+    )
+    server_group.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help=f"Port to listen on for the tcp, sse and streamable-http transports (tcp default: {DEFAULT_TCP_PORT})."
+    )
+    server_group.add_argument(
+        "--max-workers",
+        metavar="N",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help=f"Maximum number of scans and hashes from tool calls running in parallel (default: {DEFAULT_MAX_WORKERS}).\nThese interactive requests never wait for background jobs."
+    )
+    server_group.add_argument(
+        "--cache-ttl",
+        metavar="SECONDS",
+        type=float,
+        default=DEFAULT_CACHE_TTL_SECONDS,
+        help=f"Lifetime of cached get_file_list responses (default: {DEFAULT_CACHE_TTL_SECONDS:g}). 0 disables the cache."
+    )
+    server_group.add_argument(
+        "--cache-size",
+        metavar="N",
+        type=int,
+        default=DEFAULT_CACHE_MAX_ENTRIES,
+        help=f"Maximum number of cached get_file_list responses (default: {DEFAULT_CACHE_MAX_ENTRIES})."
+    )
+    server_group.add_argument(
+        "--snapshot-ttl",
+        metavar="SECONDS",
+        type=float,
+        default=DEFAULT_SNAPSHOT_TTL_SECONDS,
+        help=f"How long a paged get_file_list snapshot stays valid (default: {DEFAULT_SNAPSHOT_TTL_SECONDS:g})."
+    )
+    server_group.add_argument(
+        "--snapshot-memory",
+        metavar="MB",
+        type=int,
+        default=DEFAULT_SNAPSHOT_MAX_BYTES // (1024 * 1024),
+        help=f"Memory budget for open paged snapshots in MiB (default: {DEFAULT_SNAPSHOT_MAX_BYTES // (1024 * 1024)}).\nA snapshot larger than this is kept in a temporary file instead."
+    )
+
+    server_group.add_argument(
+        "--jobs-dir",
+        metavar="DIR",
+        default=DEFAULT_JOBS_DIR,
+        help=f"Directory where background jobs keep their state and results (default: {DEFAULT_JOBS_DIR}).\nUnfinished jobs found there are resumed when the server starts."
+    )
+    server_group.add_argument(
+        "--max-jobs",
+        metavar="N",
+        type=int,
+        default=DEFAULT_MAX_RUNNING_JOBS,
+        help=f"Maximum number of background jobs running at once (default: {DEFAULT_MAX_RUNNING_JOBS})."
+    )
+    server_group.add_argument(
+        "--io-bandwidth",
+        metavar="MB",
+        type=float,
+        default=None,
+        help="Limit background jobs to this many MiB read per second (default: unlimited).\nTool calls are never throttled, but their reads count against the limit."
+    )
+    server_group.add_argument(
+        "--io-iops",
+        metavar="N",
+        type=float,
+        default=None,
+        help="Limit background jobs to this many I/O operations (stats, directory listings, reads) per second (default: unlimited)."
+    )
+    server_group.add_argument(
+        "--background-nice",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Raise the nice value of background job threads by N (Linux)."
+    )
+    server_group.add_argument(
+        "--background-idle-io",
+        action="store_true",
+        help="Run background job threads in the idle I/O scheduling class (Linux), so they only use the disk when nothing else does."
+    )
+    server_group.add_argument(
+        "--metrics-port",
+        metavar="PORT",
+        type=int,
+        default=None,
+        help="Serve metrics over HTTP on this port: /metrics in the Prometheus text format, /metrics.json as JSON (default: off)."
+    )
+    server_group.add_argument(
+        "--metrics-host",
+        default=None,
+        help="Address for the --metrics-port endpoint (default: 127.0.0.1)."
+    )
+    server_group.add_argument(
+        "--backend",
+        metavar="HOST:PORT=ROOT[,ROOT...]",
+        action="append",
+        default=None,
+        help="Run the tcp transport as an aggregator in front of other mcp_efu tcp daemons (repeatable).\nEach request is forwarded to the daemon owning the longest root that contains its path;\nget_file_list with 'paths' scans several roots on their daemons in parallel and merges the results."
+    )
+    server_group.add_argument(
+        "--backend-pool",
+        metavar="N",
+        type=int,
+        default=DEFAULT_BACKEND_POOL_SIZE,
+        help=f"Persistent connections per --backend daemon (default: {DEFAULT_BACKEND_POOL_SIZE})."
     )
 
     # CLI mode arguments
@@ -55,9 +217,55 @@ Examples:
     )
     cli_group.add_argument(
         "--format",
-        choices=["json"],  # Add more formats like 'csv' in the future
+        choices=LISTING_FORMATS + (SNAPSHOT_FORMAT,),
         default="json",
-        help="Output format (default: json)."
+        help="Output format (default: json).\njson: A JSON array.\nndjson: One JSON object per line.\nefu: Everything EFU file list (CSV).\nsnapshot: Compact binary snapshot, sorted by path (see 'convert')."
+    )
+    cli_group.add_argument(
+        "--sort",
+        choices=SORT_KEYS,
+        default=None,
+        help="Sort the output in ascending order (default: filesystem order).\nname: By path, component by component.\nsize: By file size.\nmtime: By modification time.\nSize and mtime use an external merge sort bounded by --sort-memory."
+    )
+    cli_group.add_argument(
+        "--sort-memory",
+        metavar="MB",
+        type=int,
+        default=DEFAULT_SORT_MEMORY_BYTES // (1024 * 1024),
+        help=f"Memory budget for sorting in MiB before sorted runs spill to temporary files (default: {DEFAULT_SORT_MEMORY_BYTES // (1024 * 1024)})."
+    )
+    cli_group.add_argument(
+        "--dir-sizes",
+        action="store_true",
+        help="Fill in the recursive size of each directory, and add file_count and dir_count.\nDirectories are then listed after their contents unless --sort is given."
+    )
+    cli_group.add_argument(
+        "-x", "--one-file-system",
+        action="store_true",
+        help="Do not descend into directories on other file systems (mount points are still listed)."
+    )
+    cli_group.add_argument(
+        "--dedupe-dirs",
+        action="store_true",
+        help="Walk each directory (device and inode) only once, so bind mounts and snapshot\ndirectories that expose the same tree again are not re-walked."
+    )
+    cli_group.add_argument(
+        "--dedupe-hardlinks",
+        action="store_true",
+        help="List a file with several hardlinks only at the first path found."
+    )
+    cli_group.add_argument(
+        "--hash",
+        dest="hash_method",
+        choices=HASH_METHODS,
+        default=None,
+        help="Add the hash and hash_method of each file's contents (json and ndjson only),\nso that 'diff --hash' can compare the saved listing by content."
+    )
+    cli_group.add_argument(
+        "--connect",
+        metavar="HOST:PORT",
+        default=None,
+        help="Send the scan to a running 'mcp_efu --transport tcp' daemon instead of scanning in-process,\nso repeated calls benefit from the daemon's warm caches."
     )
 
 
@@ -69,58 +277,122 @@ Examples:
         if args.path:
             parser.error("Positional argument 'path' cannot be used with --transport. For server mode, path is provided in the JSONRPC request.")
 
-        efu_manager = EfuFileManager()
-        server = FastMCP(name="EFU File Lister", version="0.1.0")
+        if args.connect:
+            parser.error("--connect cannot be used with --transport.")
 
-        @server.tool(description="指定されたパス内のファイルとディレクトリの一覧を取得します。日時は常にWindowsのFILETIME 64ビット整数で返します。")
-        def get_file_list(path: str) -> list[dict]:
-            return efu_manager.get_file_list(path)
+        if args.backend and args.transport != "tcp":
+            parser.error("--backend can only be used with --transport tcp.")
 
-        @server.tool(description="指定されたフルパスのファイルのMD5ハッシュを取得します。戻り値のpathは絶対パス、realpathは実体パスです。")
-        def get_md5_hash(path: str) -> dict:
-            return efu_manager.get_md5_hash(path)
+        if args.backend:
+            import asyncio
+            from .federation import start_federated_server, parse_backend
 
-        @server.tool(description="指定されたフルパスのファイルのSHA1ハッシュを取得します。戻り値のpathは絶対パス、realpathは実体パスです。")
-        def get_sha1_hash(path: str) -> dict:
-            return efu_manager.get_sha1_hash(path)
+            try:
+                for spec in args.backend:
+                    parse_backend(spec)
+            except ValueError as e:
+                parser.error(str(e))
+            try:
+                asyncio.run(start_federated_server(
+                    args.host or DEFAULT_TCP_HOST,
+                    args.port or DEFAULT_TCP_PORT,
+                    args.backend,
+                    args.backend_pool,
+                ))
+            except KeyboardInterrupt:
+                print("\nServer shutting down gracefully.", file=sys.stderr)
+        elif args.transport == "tcp":
+            import asyncio
+            from .cache import ResponseCache
+            from .transport import start_tcp_server
 
-        @server.tool(description="指定されたフルパスのファイルのGit Blob SHA1ハッシュを取得します。戻り値のpathは絶対パス、realpathは実体パスです。")
-        def get_git_blob_hash(path: str) -> dict:
-            return efu_manager.get_git_blob_hash(path)
+            from .jobs import JobManager
+            from .iosched import IoScheduler
+            from .metrics import create_server_metrics, start_metrics_http_server, DEFAULT_METRICS_HOST
+
+            scheduler = IoScheduler(
+                interactive_workers=args.max_workers,
+                background_workers=args.max_jobs,
+                max_bytes_per_second=args.io_bandwidth * 1024 * 1024 if args.io_bandwidth else None,
+                max_iops=args.io_iops,
+                background_nice=args.background_nice,
+                background_idle_io=args.background_idle_io,
+            )
+            metrics = create_server_metrics()
+            efu_manager = EfuFileManager(scheduler, metrics)
+            response_cache = ResponseCache(ttl=args.cache_ttl, max_entries=args.cache_size)
+            job_manager = JobManager(args.jobs_dir, efu_manager, max_running=args.max_jobs, scheduler=scheduler)
+            if args.metrics_port is not None:
+                start_metrics_http_server(metrics, args.metrics_host or DEFAULT_METRICS_HOST, args.metrics_port)
+            try:
+                asyncio.run(start_tcp_server(
+                    args.host or DEFAULT_TCP_HOST,
+                    args.port or DEFAULT_TCP_PORT,
+                    efu_manager,
+                    response_cache,
+                    job_manager,
+                    metrics,
+                ))
+            except KeyboardInterrupt:
+                print("\nServer shutting down gracefully.", file=sys.stderr)
+            finally:
+                # Queued jobs resume from their checkpoints on the next start
+                scheduler.shutdown(wait=False, cancel_futures=True)
+        else:
+            from .server import run_server
+            run_server(args)
 
-        print(f"Starting MCP server with transport: {args.transport}", file=sys.stderr)
-        try:
-            server.run(transport=args.transport)
-        except KeyboardInterrupt:
-            print("\nServer shutting down gracefully.", file=sys.stderr)
-        except Exception as e:
-            print(f"\nAn unexpected server error occurred: {e}", file=sys.stderr)
-    
     elif args.path:
         # --- CLI Mode ---
-        efu_manager = EfuFileManager()
+        if args.format == SNAPSHOT_FORMAT and args.sort not in (None, "name"):
+            parser.error("Snapshots are always sorted by name; --sort cannot be used with --format snapshot.")
+        if args.format == SNAPSHOT_FORMAT and args.dir_sizes:
+            parser.error("Snapshots cannot store file_count and dir_count; --dir-sizes cannot be used with --format snapshot.")
+        if args.hash_method and args.format not in ("json", "ndjson"):
+            parser.error(f"--hash can only be used with --format json or ndjson; {args.format} listings cannot store hashes.")
         print(f"Running in CLI mode to scan path: {args.path}", file=sys.stderr)
         try:
-            file_list = efu_manager.get_file_list(args.path)
-            
-            # Handle output format
-            if args.format == "json":
-                output_data = json.dumps(file_list, indent=2)
-            else:
-                # This part is for future formats
-                print(f"Error: Unsupported format '{args.format}'", file=sys.stderr)
-                sys.exit(1)
-
-            # Handle output destination
-            if args.output:
-                with open(args.output, 'w', encoding='utf-8') as f:
-                    f.write(output_data)
-                    f.write('\n')
-                print(f"Output successfully written to {args.output}", file=sys.stderr)
+            if args.connect:
+                from .remote import DaemonClient, RemoteError
+
+                # The daemon resolves relative paths against its own working directory.
+                root_path = str(Path(args.path).resolve())
+                params = {"path": root_path}
+                # Snapshots need path order
+                sort = "name" if args.format == SNAPSHOT_FORMAT else args.sort
+                if sort is not None:
+                    params["sort"] = sort
+                for flag in SCAN_FLAGS:
+                    if getattr(args, flag):
+                        params[flag] = True
+                try:
+                    with DaemonClient(args.connect) as client:
+                        file_list = client.call("get_file_list", params)
+                except (RemoteError, ConnectionError) as e:
+                    raise ValueError(str(e)) from e
             else:
-                # Write to stdout
-                sys.stdout.write(output_data)
-                sys.stdout.write('\n')
+                efu_manager = EfuFileManager()
+                # Entries are streamed straight into the writer. The output
+                # file may be created inside the scanned tree; leave it out.
+                # Snapshots and --sort name need path order, which a
+                # name-order walk yields without sorting. With --dir-sizes
+                # the walk is post-order, so it is sorted here instead.
+                sort = "name" if args.format == SNAPSHOT_FORMAT else args.sort
+                name_order = sort == "name" and not args.dir_sizes
+                file_list = efu_manager.iter_file_list(
+                    args.path,
+                    name_order=name_order,
+                    **{flag: getattr(args, flag) for flag in SCAN_FLAGS}
+                )
+                if args.output:
+                    output_path = str(Path(args.output).resolve())
+                    file_list = (entry for entry in file_list if entry["filename"] != output_path)
+                if sort in ("size", "mtime") or (sort == "name" and args.dir_sizes):
+                    file_list = external_sort(file_list, sort, args.sort_memory * 1024 * 1024)
+
+            if args.hash_method:
+                file_list = iter_with_hashes(EfuFileManager(), file_list, args.hash_method)
+            write_output(lambda f: write_entries(file_list, args.format, f), args.output, args.format)
 
         except ValueError as e:
             print(f"Error: {e}", file=sys.stderr)
@@ -136,5 +408,169 @@ Examples:
         sys.exit(1)
 
 
+def diff_command(argv: list[str]):
+    """The 'diff' subcommand: compares two listings and prints the differences as JSON."""
+    from .diff import diff_file_lists
+
+    parser = argparse.ArgumentParser(
+        prog="mcp_efu diff",
+        description="Compare two file listings. Each side is a directory (scanned live) or a saved listing in JSON, NDJSON, EFU or snapshot format.",
+    )
+    parser.add_argument("old", help="The earlier listing file or directory.")
+    parser.add_argument("new", help="The later listing file or directory.")
+    parser.add_argument(
+        "--hash",
+        dest="hash_method",
+        choices=HASH_METHODS,
+        default=None,
+        help="Also compare file contents by hash where both sides can provide one. At least one side must be a directory.",
+    )
+    parser.add_argument("-o", "--output", metavar="FILE", default=None, help="Write output to a file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    print(f"Comparing {args.old} with {args.new}", file=sys.stderr)
+    try:
+        result = diff_file_lists(EfuFileManager(), args.old, args.new, args.hash_method)
+        write_output(lambda f: f.write(json.dumps(result, indent=2)), args.output, "json")
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def convert_command(argv: list[str]):
+    """The 'convert' subcommand: rewrites a saved listing in another format."""
+    from .diff import open_sorted_source
+    from .listing import iter_listing
+
+    formats = LISTING_FORMATS + (SNAPSHOT_FORMAT,)
+    parser = argparse.ArgumentParser(
+        prog="mcp_efu convert",
+        description="Convert a saved listing (JSON, NDJSON, EFU or snapshot) to another format.",
+    )
+    parser.add_argument("source", help="The saved listing file.")
+    parser.add_argument("--format", choices=formats, default="json", help="Output format (default: json).")
+    parser.add_argument("--sort", choices=SORT_KEYS, default=None, help="Sort the output in ascending order (default: the source's order).")
+    parser.add_argument(
+        "--sort-memory",
+        metavar="MB",
+        type=int,
+        default=DEFAULT_SORT_MEMORY_BYTES // (1024 * 1024),
+        help=f"Memory budget for sorting in MiB (default: {DEFAULT_SORT_MEMORY_BYTES // (1024 * 1024)}).",
+    )
+    parser.add_argument("-o", "--output", metavar="FILE", default=None, help="Write output to a file instead of stdout.")
+    args = parser.parse_args(argv)
+    if args.format == SNAPSHOT_FORMAT and args.sort not in (None, "name"):
+        parser.error("Snapshots are always sorted by name; --sort cannot be used with --format snapshot.")
+
+    print(f"Converting {args.source} to {args.format}", file=sys.stderr)
+    try:
+        if not Path(args.source).is_file():
+            raise ValueError(f"'{args.source}' is not a saved listing file.")
+        if args.format == SNAPSHOT_FORMAT:
+            entries, _ = open_sorted_source(EfuFileManager(), args.source)
+        elif args.sort is not None:
+            entries = external_sort(iter_listing(args.source), args.sort, args.sort_memory * 1024 * 1024)
+        else:
+            entries = iter_listing(args.source)
+        write_output(lambda f: write_entries(entries, args.format, f), args.output, args.format)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def grep_command(argv: list[str]):
+    """The 'grep' subcommand: searches file contents and streams matching files as NDJSON."""
+    from .grep import iter_grep, DEFAULT_MAX_MATCHES_PER_FILE, DEFAULT_MAX_MATCHES
+
+    parser = argparse.ArgumentParser(
+        prog="mcp_efu grep",
+        description="Search the contents of the files below a directory with a regular expression. "
+        "Each file with matching lines is printed as one JSON object per line as soon as it is searched.",
+    )
+    parser.add_argument("pattern", help="Python regular expression, matched line by line.")
+    parser.add_argument("path", help="The directory to search.")
+    parser.add_argument("--include", metavar="GLOB", action="append", default=None, help="Only search files matching GLOB (repeatable). Globs without '/' match the file name.")
+    parser.add_argument("--exclude", metavar="GLOB", action="append", default=None, help="Skip files matching GLOB (repeatable).")
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="Match ASCII letters case-insensitively.")
+    parser.add_argument(
+        "--max-count",
+        metavar="N",
+        type=int,
+        default=DEFAULT_MAX_MATCHES_PER_FILE,
+        help=f"Maximum number of matching lines per file (default: {DEFAULT_MAX_MATCHES_PER_FILE}).",
+    )
+    parser.add_argument(
+        "--max-total",
+        metavar="N",
+        type=int,
+        default=DEFAULT_MAX_MATCHES,
+        help=f"Stop after this many matching lines in total (default: {DEFAULT_MAX_MATCHES}).",
+    )
+    parser.add_argument("--workers", metavar="N", type=int, default=None, help="Number of search processes (default: one per CPU).")
+    parser.add_argument("-o", "--output", metavar="FILE", default=None, help="Write output to a file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    def write(stream):
+        for result in iter_grep(
+            EfuFileManager(), args.path, args.pattern, args.include, args.exclude, args.ignore_case,
+            args.max_count, args.max_total, args.workers
+        ):
+            if result["matches"]:
+                stream.write(json.dumps({key: result[key] for key in ("filename", "matches", "truncated")}))
+                stream.write("\n")
+                stream.flush()
+
+    print(f"Searching {args.path} for {args.pattern}", file=sys.stderr)
+    try:
+        write_output(write, args.output, "ndjson")
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def write_entries(entries, fmt: str, stream):
+    """Writes entries in any output format; snapshots go to a binary stream."""
+    if fmt == SNAPSHOT_FORMAT:
+        from .snapshot import write_snapshot
+        write_snapshot(entries, stream)
+    else:
+        write_listing(entries, fmt, stream)
+
+
+def write_output(write, output: str | None, fmt: str):
+    """Calls write(stream) on the output file, or on stdout if no file is given."""
+    if fmt == SNAPSHOT_FORMAT:
+        # Binary output
+        if output:
+            with open(output, 'wb') as f:
+                write(f)
+            print(f"Output successfully written to {output}", file=sys.stderr)
+        else:
+            write(sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        return
+    if output:
+        # EFU files use CRLF line endings written by the csv module itself.
+        with open(output, 'w', encoding='utf-8', newline='' if fmt == "efu" else None) as f:
+            write(f)
+            if fmt == "json":
+                f.write('\n')
+        print(f"Output successfully written to {output}", file=sys.stderr)
+    else:
+        # Write to stdout
+        write(sys.stdout)
+        if fmt == "json":
+            sys.stdout.write('\n')
+
+
 if __name__ == "__main__":
     main()
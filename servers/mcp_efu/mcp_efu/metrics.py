@@ -0,0 +1,315 @@
+# mcp_efu/metrics.py
+#
+# In-process metrics for server mode: counters, gauges and histograms with
+# labels, readable as JSON (server/metrics) or in the Prometheus text
+# exposition format (optional local HTTP endpoint). Values that other
+# components already keep, such as the response cache and scheduler
+# counters, are read through collectors when the metrics are exported
+# instead of being updated twice.
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_METRICS_HOST = "127.0.0.1"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# A collector returns (name, type, help, labels, value) samples
+Sample = tuple[str, str, str, dict, float]
+Collector = Callable[[], list[Sample]]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf bucket; not cumulative
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            result.append(("+Inf" if bound == math.inf else repr(bound), total))
+        return result
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile; None when empty or above the last bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return None
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of labelled counters, gauges and histograms.
+
+    Metrics are declared once with their type and help text; inc(), set(),
+    add() and observe() then take the label values as keyword arguments.
+    Updating a metric that was not declared raises KeyError.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, tuple[str, str, tuple | None]] = {}
+        self._values: dict[str, dict[tuple, object]] = {}
+        self._collectors: list[Collector] = []
+        self.started = time.time()
+
+    def counter(self, name: str, help_text: str):
+        self._declare(name, COUNTER, help_text)
+
+    def gauge(self, name: str, help_text: str):
+        self._declare(name, GAUGE, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self._declare(name, HISTOGRAM, help_text, tuple(sorted(buckets)))
+
+    def _declare(self, name: str, kind: str, help_text: str, buckets: tuple | None = None):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = (kind, help_text, buckets)
+                self._values[name] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Adds `amount` to a counter (or gauge)."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + amount
+
+    add = inc
+
+    def set(self, name: str, value: float, **labels):
+        """Sets a gauge."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[name][key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Records one observation in a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values[name]
+            histogram = values.get(key)
+            if histogram is None:
+                histogram = values[key] = _Histogram(self._metrics[name][2])
+            histogram.observe(value)
+
+    def register_collector(self, collector: Collector):
+        """Adds a function whose samples are included every time the metrics are exported."""
+        self._collectors.append(collector)
+
+    def _collect(self) -> list[tuple[str, str, str, list]]:
+        """Returns (name, type, help, [(labels, value)]) for every metric, collectors included."""
+        samples: dict[str, tuple[str, str, list]] = {}
+        with self._lock:
+            for name, (kind, help_text, _) in self._metrics.items():
+                items = []
+                for key, value in self._values[name].items():
+                    if isinstance(value, _Histogram):
+                        value = {
+                            "count": value.count,
+                            "sum": value.sum,
+                            "buckets": value.cumulative(),
+                            "quantiles": {q: value.quantile(q) for q in (0.5, 0.95, 0.99)},
+                        }
+                    items.append((dict(key), value))
+                samples[name] = (kind, help_text, items)
+        for collector in self._collectors:
+            for name, kind, help_text, labels, value in collector():
+                samples.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+        return [(name, kind, help_text, items) for name, (kind, help_text, items) in samples.items()]
+
+    def snapshot(self) -> dict:
+        """Returns all metrics as a JSON-serializable dict."""
+        metrics = {}
+        for name, kind, help_text, items in self._collect():
+            entries = []
+            for labels, value in items:
+                if kind == HISTOGRAM:
+                    entries.append({
+                        "labels": labels,
+                        "count": value["count"],
+                        "sum": value["sum"],
+                        "buckets": dict(value["buckets"]),
+                        "p50": value["quantiles"][0.5],
+                        "p95": value["quantiles"][0.95],
+                        "p99": value["quantiles"][0.99],
+                    })
+                else:
+                    entries.append({"labels": labels, "value": value})
+            metrics[name] = {"type": kind, "help": help_text, "samples": entries}
+        return {"uptime_seconds": round(time.time() - self.started, 3), "metrics": metrics}
+
+    def prometheus_text(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, kind, help_text, items in self._collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in items:
+                if kind == HISTOGRAM:
+                    for bound, count in value["buckets"]:
+                        lines.append(f"{name}_bucket{_format_labels(dict(labels, le=bound))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def create_server_metrics() -> MetricsRegistry:
+    """Returns a registry with the metrics recorded by the transports and EfuFileManager declared."""
+    metrics = MetricsRegistry()
+    metrics.counter("mcp_efu_requests_total", "JSON-RPC requests handled, by method.")
+    metrics.counter("mcp_efu_request_errors_total", "JSON-RPC requests answered with an error, by method and error code.")
+    metrics.histogram("mcp_efu_request_duration_seconds", "Time from reading a request to writing its response, by method.")
+    metrics.counter("mcp_efu_received_bytes_total", "Bytes of JSON-RPC requests received.")
+    metrics.counter("mcp_efu_sent_bytes_total", "Bytes of JSON-RPC responses sent.")
+    metrics.gauge("mcp_efu_requests_in_flight", "Requests being handled.")
+    metrics.gauge("mcp_efu_connections", "Open client connections.")
+    metrics.counter("mcp_efu_scanned_entries_total", "Entries returned by directory scans.")
+    metrics.counter("mcp_efu_scan_seconds_total", "Time spent in directory scans; scanned entries divided by this is the scan rate.")
+    metrics.counter("mcp_efu_hashed_bytes_total", "Bytes read by file hashes, by algorithm.")
+    metrics.counter("mcp_efu_hash_seconds_total", "Time spent hashing files, by algorithm.")
+    metrics.histogram(
+        "mcp_efu_event_loop_lag_seconds",
+        "How late the event loop ran a timer; high values mean requests block the loop.",
+    )
+    metrics.register_collector(_process_samples)
+    return metrics
+
+
+def _process_samples() -> list[Sample]:
+    samples = []
+    try:
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            resident_pages = int(handle.read().split()[1])
+        samples.append((
+            "mcp_efu_process_resident_memory_bytes", GAUGE, "Resident memory of the server process.", {},
+            resident_pages * os.sysconf("SC_PAGE_SIZE"),
+        ))
+    except (OSError, ValueError, IndexError):
+        pass
+    samples.append(("mcp_efu_process_threads", GAUGE, "Threads of the server process.", {}, threading.active_count()))
+    return samples
+
+
+def cache_collector(response_cache) -> Collector:
+    """Exports the hit/miss counters and occupancy of a ResponseCache."""
+
+    def collect() -> list[Sample]:
+        stats = response_cache.stats()
+        return [
+            ("mcp_efu_cache_hits_total", COUNTER, "get_file_list responses served from the cache.", {}, stats["hits"]),
+            ("mcp_efu_cache_misses_total", COUNTER, "get_file_list requests that had to scan.", {}, stats["misses"]),
+            ("mcp_efu_cache_hit_ratio", GAUGE, "Cache hits divided by lookups since start.", {}, stats["hit_rate"]),
+            ("mcp_efu_cache_evictions_total", COUNTER, "Cached responses evicted to stay within the size limits.", {}, stats["evictions"]),
+            ("mcp_efu_cache_entries", GAUGE, "Cached get_file_list responses.", {}, stats["entries"]),
+            ("mcp_efu_cache_bytes", GAUGE, "Size of the cached responses.", {}, stats["bytes"]),
+        ]
+
+    return collect
+
+
+def scheduler_collector(scheduler) -> Collector:
+    """Exports the queue depths, I/O totals and throttling time of an IoScheduler."""
+
+    def collect() -> list[Sample]:
+        stats = scheduler.stats()
+        samples = [
+            ("mcp_efu_io_bytes_total", COUNTER, "Bytes read by scans and hashes.", {}, stats["bytes"]),
+            ("mcp_efu_io_operations_total", COUNTER, "I/O operations (stats, directory listings, reads).", {}, stats["ops"]),
+            ("mcp_efu_io_throttled_seconds_total", COUNTER, "Time background work slept to stay within the I/O budgets.", {}, stats["throttled_seconds"]),
+        ]
+        for priority, counts in stats["classes"].items():
+            samples.append(("mcp_efu_scheduler_queued", GAUGE, "Tasks waiting for a worker, by priority class.", {"priority": priority}, counts["queued"]))
+            samples.append(("mcp_efu_scheduler_running", GAUGE, "Tasks running, by priority class.", {"priority": priority}, counts["running"]))
+            samples.append(("mcp_efu_scheduler_completed_total", COUNTER, "Tasks finished, by priority class.", {"priority": priority}, counts["completed"]))
+        return samples
+
+    return collect
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body = self.registry.prometheus_text().encode()
+            content_type = PROMETHEUS_CONTENT_TYPE
+        elif path == "/metrics.json":
+            body = json.dumps(self.registry.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_http_server(registry: MetricsRegistry, host: str, port: int) -> ThreadingHTTPServer:
+    """
+    Serves /metrics (Prometheus text format) and /metrics.json on a daemon
+    thread, independent of the event loop, so the endpoint stays responsive
+    while requests block the loop. Returns the server; call shutdown() to stop it.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="mcp_efu-metrics", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,210 @@
+# mcp_efu/pagination.py
+import json
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+# Defaults for server-held get_file_list snapshots
+DEFAULT_SNAPSHOT_TTL_SECONDS = 300.0
+DEFAULT_SNAPSHOT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10_000
+
+# Order of the fields in a compact snapshot row
+ROW_FIELDS = ("filename", "size", "date_modified", "date_created", "attributes")
+# Fields set on some entries only (directories of a dir_sizes scan); they get
+# a column when any entry has them and are left out of entries without them
+OPTIONAL_ROW_FIELDS = ("file_count", "dir_count")
+
+
+class _Snapshot:
+    """Rows held in memory, or in a temporary file once spill() has been called."""
+    __slots__ = ("root", "fields", "rows", "spill_file", "offsets", "nbytes", "expires", "lock")
+
+    def __init__(self, root: str, fields: tuple[str, ...], rows: list[tuple], nbytes: int, expires: float):
+        self.root = root
+        self.fields = fields
+        self.rows = rows
+        # A spilled snapshot keeps one JSON array per row in spill_file, and
+        # the file offset of each row (plus the end of the file) in offsets
+        self.spill_file = None
+        self.offsets = None
+        self.nbytes = nbytes
+        self.expires = expires
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows) if self.rows is not None else len(self.offsets) - 1
+
+    def spill(self):
+        """Moves the rows to a temporary file, keeping only their offsets in memory."""
+        spill_file = tempfile.TemporaryFile()
+        offsets = array("Q", [0])
+        position = 0
+        for row in self.rows:
+            line = json.dumps(row, separators=(",", ":")).encode() + b"\n"
+            spill_file.write(line)
+            position += len(line)
+            offsets.append(position)
+        spill_file.flush()
+        self.spill_file = spill_file
+        self.offsets = offsets
+        self.rows = None
+        self.nbytes = sys.getsizeof(offsets)
+
+    def slice(self, start: int, end: int) -> list[tuple]:
+        if self.rows is not None:
+            return self.rows[start:end]
+        with self.lock:
+            if self.spill_file.closed:
+                raise ValueError("Cursor has expired or is unknown. Start again without a cursor.")
+            self.spill_file.seek(self.offsets[start])
+            data = self.spill_file.read(self.offsets[end] - self.offsets[start])
+        return [tuple(json.loads(line)) for line in data.splitlines()]
+
+    def close(self):
+        if self.spill_file is not None:
+            with self.lock:
+                self.spill_file.close()
+
+
+class SnapshotStore:
+    """
+    Holds get_file_list results on the server so clients can page through them.
+
+    The first page request takes a snapshot of the listing and stores it as
+    plain tuples rather than dicts. Later requests address the snapshot with
+    an opaque cursor and are answered by slicing, without rescanning.
+    Snapshots expire after `ttl` seconds and the least recently used ones
+    are evicted once their estimated size exceeds `max_bytes`. A snapshot
+    larger than `max_bytes` on its own is spilled to a temporary file, and
+    only the file offsets of its rows count against `max_bytes`.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_SNAPSHOT_TTL_SECONDS, max_bytes: int = DEFAULT_SNAPSHOT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._snapshots: OrderedDict[str, _Snapshot] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.spills = 0
+
+    def first_page(self, root_path_str: str, file_list: list[dict], page_size: int) -> dict:
+        """Stores a snapshot of file_list and returns its first page."""
+        page_size = self._check_page_size(page_size)
+        fields = ROW_FIELDS + tuple(
+            field for field in OPTIONAL_ROW_FIELDS if any(field in item for item in file_list)
+        )
+        rows = [tuple(item.get(field) for field in fields) for item in file_list]
+        snapshot = _Snapshot(
+            str(Path(root_path_str).resolve()),
+            fields,
+            rows,
+            self._estimate_size(rows),
+            time.monotonic() + self.ttl,
+        )
+        if len(rows) <= page_size:
+            # Everything fits on one page; there is nothing to hold on to.
+            return self._page(None, snapshot, 0, page_size)
+        if snapshot.nbytes > self.max_bytes:
+            snapshot.spill()
+            with self._lock:
+                self.spills += 1
+
+        snapshot_id = secrets.token_urlsafe(12)
+        with self._lock:
+            self._purge_expired()
+            self._snapshots[snapshot_id] = snapshot
+            self._total_bytes += snapshot.nbytes
+            while self._total_bytes > self.max_bytes and len(self._snapshots) > 1:
+                oldest = next(iter(self._snapshots))
+                self._remove(oldest)
+                self.evictions += 1
+        return self._page(snapshot_id, snapshot, 0, page_size)
+
+    def next_page(self, cursor: str, page_size: int, root_path_str: str | None = None) -> dict:
+        """Returns the page addressed by a cursor from a previous response."""
+        page_size = self._check_page_size(page_size)
+        snapshot_id, offset = self._parse_cursor(cursor)
+        with self._lock:
+            self._purge_expired()
+            snapshot = self._snapshots.get(snapshot_id)
+            if snapshot is None:
+                raise ValueError("Cursor has expired or is unknown. Start again without a cursor.")
+            self._snapshots.move_to_end(snapshot_id)
+        if root_path_str is not None and str(Path(root_path_str).resolve()) != snapshot.root:
+            raise ValueError(f"Cursor does not belong to path '{root_path_str}'.")
+        if offset > len(snapshot):
+            raise ValueError("Cursor offset is out of range.")
+        page = self._page(snapshot_id, snapshot, offset, page_size)
+        if page["next_cursor"] is None:
+            # The client has reached the end; release the snapshot right away.
+            with self._lock:
+                if snapshot_id in self._snapshots:
+                    self._remove(snapshot_id)
+        return page
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "snapshots": len(self._snapshots),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "spills": self.spills,
+            }
+
+    def _page(self, snapshot_id: str | None, snapshot: _Snapshot, offset: int, page_size: int) -> dict:
+        total = len(snapshot)
+        end = min(offset + page_size, total)
+        entries = [self._entry(snapshot.fields, row) for row in snapshot.slice(offset, end)]
+        next_cursor = None
+        if snapshot_id is not None and end < total:
+            next_cursor = f"{snapshot_id}.{end}"
+        return {
+            "entries": entries,
+            "offset": offset,
+            "total": total,
+            "next_cursor": next_cursor,
+        }
+
+    def _entry(self, fields: tuple[str, ...], row: tuple) -> dict:
+        entry = dict(zip(fields, row))
+        for field in fields[len(ROW_FIELDS):]:
+            if entry[field] is None:
+                del entry[field]
+        return entry
+
+    def _check_page_size(self, page_size: int) -> int:
+        if not isinstance(page_size, int) or page_size < 1:
+            raise ValueError("page_size must be a positive integer.")
+        return min(page_size, MAX_PAGE_SIZE)
+
+    def _parse_cursor(self, cursor: str) -> tuple[str, int]:
+        snapshot_id, _, offset = cursor.rpartition(".")
+        if not snapshot_id or not offset.isdigit():
+            raise ValueError(f"Malformed cursor '{cursor}'.")
+        return snapshot_id, int(offset)
+
+    def _estimate_size(self, rows: list[tuple]) -> int:
+        if not rows:
+            return 0
+        # Every row has the same shape: a tuple holding one str and ints (or None).
+        fixed = sys.getsizeof(rows[0]) + sum(sys.getsizeof(value) for value in rows[0][1:])
+        return sys.getsizeof(rows) + sum(fixed + sys.getsizeof(row[0]) for row in rows)
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        for snapshot_id in [key for key, snap in self._snapshots.items() if snap.expires <= now]:
+            self._remove(snapshot_id)
+
+    def _remove(self, snapshot_id: str):
+        snapshot = self._snapshots.pop(snapshot_id)
+        self._total_bytes -= snapshot.nbytes
+        snapshot.close()
@@ -0,0 +1,127 @@
+# mcp_efu/profiling.py
+#
+# On-demand profiles of a running server. "cprofile" traces every function
+# call on the thread it is enabled on (the event loop thread for the TCP
+# transport); "sampling" periodically records the stacks of all threads,
+# including the scan and hash workers, at a much lower overhead. Only one
+# profile runs at a time.
+import cProfile
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_MODES = ("cprofile", "sampling")
+DEFAULT_PROFILE_SECONDS = 5.0
+MAX_PROFILE_SECONDS = 60.0
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 0.005
+DEFAULT_PROFILE_LIMIT = 30
+
+_profile_lock = threading.Lock()
+
+
+def check_profile_params(seconds: float, mode: str, interval: float, limit: int):
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise ValueError(f"seconds must be greater than 0 and at most {MAX_PROFILE_SECONDS:g}.")
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unsupported profile mode '{mode}'. Expected one of {', '.join(PROFILE_MODES)}.")
+    if not 0 < interval <= 1:
+        raise ValueError("interval must be greater than 0 and at most 1 second.")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer.")
+
+
+@contextmanager
+def exclusive_profile():
+    """Holds the profile slot; raises ValueError if another profile is running."""
+    if not _profile_lock.acquire(blocking=False):
+        raise ValueError("A profile is already running. Try again when it has finished.")
+    try:
+        yield
+    finally:
+        _profile_lock.release()
+
+
+def _function_name(filename: str, lineno: int, name: str) -> str:
+    if filename == "~":
+        # Built-in functions
+        return name
+    return f"{filename}:{lineno}({name})"
+
+
+def cprofile_result(profiler: cProfile.Profile, seconds: float, limit: int) -> dict:
+    """Returns the `limit` functions with the most cumulative time of a finished cProfile run."""
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return {
+        "mode": "cprofile",
+        "seconds": seconds,
+        "total_calls": sum(value[1] for value in stats.values()),
+        "functions": [
+            {
+                "function": _function_name(*func),
+                "calls": calls,
+                "primitive_calls": primitive_calls,
+                "total_seconds": round(total, 6),
+                "cumulative_seconds": round(cumulative, 6),
+            }
+            for func, (primitive_calls, calls, total, cumulative, _) in rows
+        ],
+    }
+
+
+def sample_stacks(seconds: float, interval: float = DEFAULT_SAMPLE_INTERVAL_SECONDS, limit: int = DEFAULT_PROFILE_LIMIT) -> dict:
+    """
+    Records the Python stack of every other thread each `interval` seconds
+    for `seconds`, and returns the functions most often on top of a stack
+    (self) or anywhere in it (cumulative), plus the most frequent stacks in
+    collapsed "outer;...;inner" form for flame graphs. Threads that are
+    waiting (for a lock, a socket or work) are sampled too.
+    """
+    own_thread = threading.get_ident()
+    self_counts: dict[str, int] = {}
+    cumulative_counts: dict[str, int] = {}
+    stack_counts: dict[str, int] = {}
+    thread_counts: dict[str, int] = {}
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_function_name(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if not stack:
+                continue
+            samples += 1
+            self_counts[stack[0]] = self_counts.get(stack[0], 0) + 1
+            for name in set(stack):
+                cumulative_counts[name] = cumulative_counts.get(name, 0) + 1
+            collapsed = ";".join(reversed(stack))
+            stack_counts[collapsed] = stack_counts.get(collapsed, 0) + 1
+            thread_name = names.get(ident, str(ident))
+            thread_counts[thread_name] = thread_counts.get(thread_name, 0) + 1
+        time.sleep(interval)
+
+    def top(counts: dict[str, int], key: str) -> list[dict]:
+        rows = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            {key: name, "samples": count, "percent": round(100 * count / samples, 2) if samples else 0.0}
+            for name, count in rows
+        ]
+
+    return {
+        "mode": "sampling",
+        "seconds": seconds,
+        "interval": interval,
+        "samples": samples,
+        "threads": thread_counts,
+        "self": top(self_counts, "function"),
+        "cumulative": top(cumulative_counts, "function"),
+        "stacks": top(stack_counts, "stack"),
+    }
@@ -0,0 +1,61 @@
+# mcp_efu/progress.py
+import time
+
+import anyio.from_thread
+import anyio.lowlevel
+
+# Minimum delay between two progress notifications for one request
+DEFAULT_PROGRESS_INTERVAL_SECONDS = 0.25
+
+
+class ProgressReporter:
+    """
+    Relays progress callbacks from EfuFileManager to an MCP request context.
+
+    The callbacks are invoked from the worker thread that runs the scan or
+    hash, so each notification is handed back to the event loop with
+    anyio.from_thread. The reporter must be created on the event loop; it
+    keeps the loop's token, so this also works from threads that anyio did
+    not start, such as the IoScheduler workers. Notifications are
+    rate-limited to one per `interval` seconds; the context drops them if
+    the client sent no progress token.
+    """
+
+    def __init__(self, ctx, interval: float = DEFAULT_PROGRESS_INTERVAL_SECONDS):
+        self.ctx = ctx
+        self.interval = interval
+        self._last = 0.0
+        self._token = anyio.lowlevel.current_token()
+
+    def scan(self, entries_scanned: int, dirs_pending: int):
+        """Progress callback for get_file_list()."""
+        self._emit(
+            entries_scanned,
+            None,
+            f"{entries_scanned} entries scanned, {dirs_pending} directories pending",
+            final=dirs_pending == 0,
+        )
+
+    def hash(self, bytes_hashed: int, total_bytes: int):
+        """Progress callback for the hash methods."""
+        self._emit(
+            bytes_hashed,
+            total_bytes,
+            f"{bytes_hashed} of {total_bytes} bytes hashed",
+            final=bytes_hashed >= total_bytes,
+        )
+
+    def grep(self, files_searched: int, matches: int):
+        """Progress callback for grep_files()."""
+        self._emit(files_searched, None, f"{files_searched} files searched, {matches} matching lines")
+
+    def _emit(self, progress: int, total: int | None, message: str, final: bool = False):
+        now = time.monotonic()
+        if not final and now - self._last < self.interval:
+            return
+        self._last = now
+        try:
+            anyio.from_thread.run(self.ctx.report_progress, progress, total, message, token=self._token)
+        except Exception:
+            # Progress is best effort; never fail the actual work because of it.
+            pass
@@ -0,0 +1,337 @@
+# mcp_efu/reader.py
+import csv
+import fnmatch
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Iterator
+
+from .listing import SNAPSHOT_FORMAT, SNAPSHOT_MAGIC, detect_format, efu_column_keys, efu_row_to_entry, path_sort_key
+from .sorting import external_sort
+from .snapshot import PREAMBLE, TRAILER, SNAPSHOT_COLUMNS, SNAPSHOT_VERSION, decode_varint
+
+# Line-delimited formats; each row is one line
+LINE_FORMATS = ("ndjson", "efu")
+# Formats that can be memory-mapped
+MAPPED_FORMATS = LINE_FORMATS + (SNAPSHOT_FORMAT,)
+DEFAULT_MAX_OPEN_LISTINGS = 8
+DEFAULT_READ_LIMIT = 1000
+MAX_READ_LIMIT = 10_000
+
+
+def search_rows(listing, pattern: str | None = None, offset: int = 0, limit: int = DEFAULT_READ_LIMIT) -> dict:
+    """
+    Returns up to `limit` rows of a mapped listing starting at row `offset`,
+    optionally only those whose filename matches the glob `pattern`.
+    `next_offset` is the row to continue from, or None when the end has
+    been reached.
+    """
+    if offset < 0:
+        raise ValueError("offset must not be negative.")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer.")
+    limit = min(limit, MAX_READ_LIMIT)
+    matcher = re.compile(fnmatch.translate(pattern)).match if pattern else None
+
+    entries = []
+    index = offset
+    total = len(listing)
+    while index < total and len(entries) < limit:
+        entry = listing[index]
+        index += 1
+        if matcher is None or matcher(entry["filename"]):
+            entries.append(entry)
+    return {
+        "entries": entries,
+        "offset": offset,
+        "total": total,
+        "next_offset": index if index < total else None,
+    }
+
+
+def open_mapped_listing(path: str):
+    """Opens a saved NDJSON, EFU or snapshot listing as a MappedListing or SnapshotListing."""
+    if detect_format(path) == SNAPSHOT_FORMAT:
+        return SnapshotListing(path)
+    return MappedListing(path)
+
+
+class MappedListing:
+    """
+    Read-only view of a saved NDJSON or EFU listing backed by mmap.
+
+    Opening the listing builds an index of line offsets (8 bytes per row);
+    rows are only decoded when they are accessed, so a multi-gigabyte
+    listing can be served, searched and diffed without loading it into
+    memory. Rows must not contain embedded line breaks.
+    """
+
+    def __init__(self, path: str, fmt: str | None = None):
+        self.path = path
+        self.format = fmt or detect_format(path)
+        if self.format not in LINE_FORMATS:
+            raise ValueError(
+                f"Listing '{path}' is in {self.format} format; only {', '.join(MAPPED_FORMATS)} listings can be memory-mapped."
+            )
+        self._file = open(path, "rb")
+        stat_info = os.fstat(self._file.fileno())
+        self.signature = (stat_info.st_size, stat_info.st_mtime_ns)
+        # mmap cannot map an empty file
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat_info.st_size else b""
+        self._keys = None
+        self._offsets = self._build_index()
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("listing index out of range")
+        return self._decode(self._mm[self._offsets[index]:self._offsets[index + 1]])
+
+    def __iter__(self) -> Iterator[dict]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def is_sorted(self) -> bool:
+        """Returns whether the rows are in listing.path_sort_key order."""
+        previous = None
+        for entry in self:
+            key = path_sort_key(entry["filename"])
+            if previous is not None and key < previous:
+                return False
+            previous = key
+        return True
+
+    def iter_sorted(self) -> Iterator[dict]:
+        """
+        Yields the rows in path_sort_key order. If the file is not sorted,
+        the rows go through sorting.external_sort, so memory stays bounded
+        however large the listing is.
+        """
+        if self.is_sorted():
+            yield from self
+            return
+        yield from external_sort(iter(self), "name")
+
+    def search(self, pattern: str | None = None, offset: int = 0, limit: int = DEFAULT_READ_LIMIT) -> dict:
+        return search_rows(self, pattern, offset, limit)
+
+    def _build_index(self) -> array:
+        if not self._mm:
+            return array("Q", [0])
+        lines = iter(self._mm.readline, b"")
+        offsets = array("Q", accumulate(map(len, lines), initial=0))
+        if self.format == "efu":
+            header = self._mm[:offsets[1]].decode("utf-8-sig")
+            self._keys = efu_column_keys(next(csv.reader([header])))
+            # Drop the header row from the index
+            offsets = offsets[1:]
+        # Drop trailing blank lines
+        while len(offsets) > 1 and not self._mm[offsets[-2]:offsets[-1]].strip():
+            offsets.pop()
+        return offsets
+
+    def _decode(self, line: bytes) -> dict:
+        if self.format == "ndjson":
+            return json.loads(line)
+        row = next(csv.reader([line.decode("utf-8").rstrip("\r\n")]))
+        return efu_row_to_entry(self._keys, row)
+
+
+class SnapshotListing:
+    """
+    Read-only view of a binary snapshot (see snapshot.py) backed by mmap.
+
+    Opening a snapshot only reads its preamble and trailer. Row i is found
+    by decoding at most one restart block of the path table and reading the
+    fixed-width columns directly, and rows are always in path_sort_key
+    order, so lookups by filename are a binary search.
+    """
+
+    format = SNAPSHOT_FORMAT
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            stat_info = os.fstat(self._file.fileno())
+            self.signature = (stat_info.st_size, stat_info.st_mtime_ns)
+            if stat_info.st_size < PREAMBLE.size + TRAILER.size:
+                raise ValueError(f"'{path}' is not a valid snapshot (file too short).")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        try:
+            self._read_layout()
+        except Exception:
+            self.close()
+            raise
+        self._cached_block = (None, None)
+
+    def _read_layout(self):
+        magic, version, self._restart_interval, _ = PREAMBLE.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"'{self.path}' is not a snapshot.")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot '{self.path}' has unsupported version {version}.")
+        self._count, self._restart_offset, columns_offset, end_magic = TRAILER.unpack_from(
+            self._mm, len(self._mm) - TRAILER.size
+        )
+        if end_magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Snapshot '{self.path}' is truncated.")
+        self._block_count = -(-self._count // self._restart_interval)
+        self._columns = []
+        for key, code in SNAPSHOT_COLUMNS:
+            self._columns.append((key, code, columns_offset))
+            columns_offset += self._count * struct.calcsize(code)
+        if columns_offset + TRAILER.size != len(self._mm):
+            raise ValueError(f"Snapshot '{self.path}' is corrupt (unexpected size).")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("listing index out of range")
+        block, position = divmod(index, self._restart_interval)
+        cached_block, entries = self._cached_block
+        if cached_block != block:
+            entries = self._read_block(block)
+            self._cached_block = (block, entries)
+        return dict(entries[position])
+
+    def __iter__(self) -> Iterator[dict]:
+        for block in range(self._block_count):
+            yield from self._read_block(block)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def is_sorted(self) -> bool:
+        return True
+
+    def iter_sorted(self) -> Iterator[dict]:
+        return iter(self)
+
+    def search(self, pattern: str | None = None, offset: int = 0, limit: int = DEFAULT_READ_LIMIT) -> dict:
+        return search_rows(self, pattern, offset, limit)
+
+    def find(self, filename: str) -> int | None:
+        """Returns the row number of the entry with the given filename, or None."""
+        target = path_sort_key(filename)
+        low, high = 0, self._block_count
+        # Find the last block whose first path sorts at or before the target
+        while low < high:
+            middle = (low + high) // 2
+            if path_sort_key(self._restart_path(middle)) <= target:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+        block = low - 1
+        for position, path in enumerate(self._block_paths(block)):
+            if path == filename:
+                return block * self._restart_interval + position
+        return None
+
+    def _restart_path(self, block: int) -> str:
+        offset = struct.unpack_from("<Q", self._mm, self._restart_offset + block * 8)[0]
+        _, pos = decode_varint(self._mm, offset)
+        length, pos = decode_varint(self._mm, pos)
+        return self._mm[pos:pos + length].decode("utf-8", "surrogatepass")
+
+    def _block_paths(self, block: int) -> list[str]:
+        mm = self._mm
+        pos = struct.unpack_from("<Q", mm, self._restart_offset + block * 8)[0]
+        first = block * self._restart_interval
+        count = min(self._restart_interval, self._count - first)
+        paths = []
+        previous = b""
+        for _ in range(count):
+            shared, pos = decode_varint(mm, pos)
+            length, pos = decode_varint(mm, pos)
+            previous = previous[:shared] + mm[pos:pos + length]
+            pos += length
+            paths.append(previous.decode("utf-8", "surrogatepass"))
+        return paths
+
+    def _read_block(self, block: int) -> list[dict]:
+        paths = self._block_paths(block)
+        first = block * self._restart_interval
+        entries = [{"filename": path} for path in paths]
+        for key, code, offset in self._columns:
+            width = struct.calcsize(code)
+            values = struct.unpack_from(f"<{len(paths)}{code}", self._mm, offset + first * width)
+            for entry, value in zip(entries, values):
+                entry[key] = value
+        return entries
+
+
+class MappedListingPool:
+    """
+    Keeps recently used MappedListings open so that their offset index is
+    built only once. A listing is reopened when its file changes.
+    """
+
+    def __init__(self, max_open: int = DEFAULT_MAX_OPEN_LISTINGS):
+        self.max_open = max_open
+        self._listings: OrderedDict[str, MappedListing] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, path: str) -> "MappedListing | SnapshotListing":
+        real_path = os.path.realpath(path)
+        if not os.path.isfile(real_path):
+            raise ValueError(f"Listing '{path}' is not a valid file.")
+        stat_info = os.stat(real_path)
+        with self._lock:
+            listing = self._listings.get(real_path)
+            if listing is not None and listing.signature == (stat_info.st_size, stat_info.st_mtime_ns):
+                self._listings.move_to_end(real_path)
+                return listing
+        # Index outside the lock; other callers keep using their listings.
+        listing = open_mapped_listing(real_path)
+        # Replaced and evicted listings may still be in use by another request,
+        # so they are not closed here; the map is released once unreferenced.
+        with self._lock:
+            self._listings.pop(real_path, None)
+            self._listings[real_path] = listing
+            while len(self._listings) > self.max_open:
+                self._listings.popitem(last=False)
+        return listing
+
+    def read(self, path: str, pattern: str | None = None, offset: int = 0, limit: int = DEFAULT_READ_LIMIT) -> dict:
+        """Reads or searches a saved listing; see search_rows()."""
+        result = self.open(path).search(pattern, offset, limit)
+        result["listing"] = path
+        return result
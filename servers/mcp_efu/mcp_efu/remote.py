@@ -0,0 +1,88 @@
+# mcp_efu/remote.py
+#
+# Minimal blocking client for the line-delimited JSON-RPC transport, used by
+# the CLI's --connect mode. Only the standard library is imported here so
+# that a one-off CLI call stays fast to start.
+import itertools
+import json
+import socket
+
+DEFAULT_TCP_HOST = "127.0.0.1"
+DEFAULT_TCP_PORT = 8765
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 10.0
+
+_request_ids = itertools.count(1)
+
+
+class RemoteError(Exception):
+    """Raised when the daemon answers with a JSON-RPC error."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """Parses 'HOST:PORT', ':PORT' or 'PORT' into a (host, port) tuple."""
+    host, sep, port = address.rpartition(":")
+    if not sep:
+        host, port = "", address
+    if not port.isdigit():
+        raise ValueError(f"Invalid daemon address '{address}'. Expected HOST:PORT.")
+    return host.strip("[]") or DEFAULT_TCP_HOST, int(port)
+
+
+class DaemonClient:
+    """
+    A connection to a running `mcp_efu --transport tcp` daemon.
+
+    The daemon greets every connection with a server/hello notification;
+    requests are then sent one per line and answered one per line.
+    """
+
+    def __init__(self, address: str, timeout: float | None = DEFAULT_CONNECT_TIMEOUT_SECONDS):
+        host, port = parse_address(address)
+        try:
+            self._sock = socket.create_connection((host, port), timeout=timeout)
+        except OSError as e:
+            raise ConnectionError(f"Cannot connect to mcp_efu daemon at {host}:{port}: {e}") from e
+        # Scans of large trees can take a while; only bound the connect step.
+        self._sock.settimeout(None)
+        self._file = self._sock.makefile("rwb")
+        self.hello = self._read_message()
+        if self.hello.get("method") != "server/hello":
+            self.close()
+            raise ConnectionError(f"Unexpected greeting from daemon: {self.hello}")
+
+    def call(self, method: str, params) -> object:
+        """Sends one request and returns its result, raising RemoteError on failure."""
+        req_id = next(_request_ids)
+        request = {"jsonrpc": "2.0", "method": method, "params": params, "id": req_id}
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+        while True:
+            response = self._read_message()
+            if response.get("id") == req_id:
+                break
+        if "error" in response:
+            error = response["error"]
+            raise RemoteError(error.get("code", 0), error.get("message", "Unknown error"))
+        return response.get("result")
+
+    def close(self):
+        try:
+            self._file.close()
+        finally:
+            self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read_message(self) -> dict:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by mcp_efu daemon.")
+        return json.loads(line)
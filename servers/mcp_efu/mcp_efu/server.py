@@ -0,0 +1,232 @@
+# mcp_efu/server.py
+#
+# FastMCP server mode. This module pulls in fastmcp and its dependency tree,
+# so main.py only imports it when a server transport is requested.
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+
+from fastmcp import FastMCP, Context
+from fastmcp.server.middleware import Middleware
+
+from .core import EfuFileManager, DEFAULT_TREE_SUMMARY_TOP
+from .cache import ResponseCache
+from .pagination import SnapshotStore, DEFAULT_PAGE_SIZE
+from .diff import diff_file_lists as diff_listings
+from .grep import GrepPool, grep_files as grep_tree, DEFAULT_MAX_MATCHES_PER_FILE, DEFAULT_MAX_MATCHES
+from .estimate import estimate_tree as estimate_tree_stats, DEFAULT_TIME_BUDGET_SECONDS
+from .reader import MappedListingPool, DEFAULT_READ_LIMIT
+from .progress import ProgressReporter
+from .jobs import JobManager
+from .iosched import IoScheduler, INTERACTIVE
+from .transport import monitor_event_loop_lag
+from .metrics import (
+    MetricsRegistry,
+    DEFAULT_METRICS_HOST,
+    create_server_metrics,
+    cache_collector,
+    scheduler_collector,
+    start_metrics_http_server,
+)
+
+
+class MetricsMiddleware(Middleware):
+    """
+    Counts MCP requests and their latency; tool calls are labelled with the
+    tool name. Event loop lag is measured from the first request on. FastMCP
+    does not expose the encoded messages, so bytes received and sent are not
+    counted here.
+    """
+
+    def __init__(self, metrics: MetricsRegistry):
+        self.metrics = metrics
+        self._lag_monitor = None
+
+    async def on_request(self, context, call_next):
+        if self._lag_monitor is None:
+            self._lag_monitor = asyncio.create_task(monitor_event_loop_lag(self.metrics))
+        method = context.method or "other"
+        if method == "tools/call":
+            method = getattr(context.message, "name", method)
+        started = time.perf_counter()
+        self.metrics.add("mcp_efu_requests_in_flight", 1)
+        failed = False
+        try:
+            return await call_next(context)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.metrics.add("mcp_efu_requests_in_flight", -1)
+            self.metrics.inc("mcp_efu_requests_total", method=method)
+            self.metrics.observe("mcp_efu_request_duration_seconds", time.perf_counter() - started, method=method)
+            if failed:
+                self.metrics.inc("mcp_efu_request_errors_total", method=method, code="exception")
+
+
+def create_server(args) -> FastMCP:
+    """Builds the FastMCP server and registers the EFU tools."""
+    # Tool calls run as interactive work, jobs as throttled background work
+    scheduler = IoScheduler(
+        interactive_workers=args.max_workers,
+        background_workers=args.max_jobs,
+        max_bytes_per_second=args.io_bandwidth * 1024 * 1024 if args.io_bandwidth else None,
+        max_iops=args.io_iops,
+        background_nice=args.background_nice,
+        background_idle_io=args.background_idle_io,
+    )
+    metrics = create_server_metrics()
+    efu_manager = EfuFileManager(scheduler, metrics)
+    response_cache = ResponseCache(ttl=args.cache_ttl, max_entries=args.cache_size)
+    metrics.register_collector(cache_collector(response_cache))
+    metrics.register_collector(scheduler_collector(scheduler))
+    listing_pool = MappedListingPool()
+    snapshot_store = SnapshotStore(ttl=args.snapshot_ttl, max_bytes=args.snapshot_memory * 1024 * 1024)
+    job_manager = JobManager(args.jobs_dir, efu_manager, max_running=args.max_jobs, scheduler=scheduler)
+    grep_pool = GrepPool()
+
+    @asynccontextmanager
+    async def lifespan(server):
+        try:
+            yield
+        finally:
+            grep_pool.shutdown(wait=False)
+            # Queued jobs resume from their checkpoints on the next start
+            scheduler.shutdown(wait=False, cancel_futures=True)
+
+    server = FastMCP(name="EFU File Lister", version="0.1.0", lifespan=lifespan)
+    server.add_middleware(MetricsMiddleware(metrics))
+    if args.metrics_port is not None:
+        start_metrics_http_server(metrics, args.metrics_host or DEFAULT_METRICS_HOST, args.metrics_port)
+
+    async def run_in_worker(func, *func_args, **func_kwargs):
+        # Scans and hashes run in worker threads so that concurrent tool calls
+        # proceed in parallel and the event loop stays responsive.
+        return await asyncio.wrap_future(scheduler.submit(func, *func_args, priority=INTERACTIVE, **func_kwargs))
+
+    @server.tool(description="指定されたパス内のファイルとディレクトリの一覧を取得します。日時は常にWindowsのFILETIME 64ビット整数で返します。sort(name/size/mtime)を指定するとその昇順で返します。dir_sizesをtrueにするとディレクトリのsizeに配下の合計サイズ、file_count/dir_countに配下のファイル数・ディレクトリ数を設定します。one_file_system、dedupe_dirs、dedupe_hardlinksで、別デバイス(マウントポイント)配下や既に走査したディレクトリ(バインドマウント等)に降りない、ハードリンクされたファイルを1回だけ返す、を指定できます。page_sizeを指定するとスナップショットを取得してページ単位で返し、続きは返されたnext_cursorをcursorに指定して取得します。")
+    async def get_file_list(
+        ctx: Context,
+        path: str,
+        page_size: int | None = None,
+        cursor: str | None = None,
+        sort: str | None = None,
+        dir_sizes: bool = False,
+        one_file_system: bool = False,
+        dedupe_dirs: bool = False,
+        dedupe_hardlinks: bool = False
+    ) -> list[dict] | dict:
+        if cursor is not None:
+            return snapshot_store.next_page(cursor, page_size or DEFAULT_PAGE_SIZE, path)
+        reporter = ProgressReporter(ctx)
+        options = {"sort": sort} if sort is not None else {}
+        # Only options that are set, so equivalent calls share a cache entry
+        flags = {
+            "dir_sizes": dir_sizes,
+            "one_file_system": one_file_system,
+            "dedupe_dirs": dedupe_dirs,
+            "dedupe_hardlinks": dedupe_hardlinks,
+        }
+        options.update((flag, True) for flag, value in flags.items() if value)
+        file_list = await run_in_worker(response_cache.get_file_list, efu_manager, path, reporter.scan, **options)
+        if page_size is None:
+            return file_list
+        return snapshot_store.first_page(path, file_list, page_size)
+
+    @server.tool(description="指定されたディレクトリ配下の合計サイズ・ファイル数・ディレクトリ数と、合計サイズが大きい上位top件のサブディレクトリを返します。max_depthを指定するとその深さまでのサブディレクトリだけを対象にします。ハードリンクは1回だけ数えます。")
+    async def get_tree_summary(ctx: Context, path: str, top: int = DEFAULT_TREE_SUMMARY_TOP, max_depth: int | None = None) -> dict:
+        return await run_in_worker(efu_manager.get_tree_summary, path, top, max_depth, ProgressReporter(ctx).scan)
+
+    @server.tool(description="指定されたディレクトリ配下のファイル数・ディレクトリ数・合計サイズと拡張子ごとのファイル数を、ランダムなディレクトリ降下のサンプリングで推定し、信頼区間(low/high)付きで返します。time_budget秒(既定0.2秒)以内に返し、時間を長くするほど精度が上がります。全ディレクトリを読み終えた場合はexactがtrueになり正確な値を返します。時間内にすべてのファイルをstatできなかったディレクトリは、一部のファイルのサイズから合計サイズを推定し、partialがtrueになります。")
+    async def estimate_tree(path: str, time_budget: float = DEFAULT_TIME_BUDGET_SECONDS, seed: int | None = None) -> dict:
+        return await run_in_worker(estimate_tree_stats, efu_manager, path, time_budget, seed=seed)
+
+    @server.tool(description="指定されたディレクトリ配下のファイルの内容を正規表現で検索し、一致した行(行番号と内容)だけを返します。include/excludeのglobパターン(/を含まないものはファイル名、含むものはルートからの相対パスと照合)で対象ファイルを絞り込めます。バイナリファイルは読み飛ばします。一致はファイルごとにmax_matches_per_file行、全体でmax_matches行までで、打ち切った場合はtruncatedがtrueになります。")
+    async def grep_files(
+        ctx: Context,
+        path: str,
+        pattern: str,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+        ignore_case: bool = False,
+        max_matches_per_file: int = DEFAULT_MAX_MATCHES_PER_FILE,
+        max_matches: int = DEFAULT_MAX_MATCHES
+    ) -> dict:
+        return await run_in_worker(
+            grep_tree, efu_manager, path, pattern, include, exclude, ignore_case,
+            max_matches_per_file, max_matches, ProgressReporter(ctx).grep, pool=grep_pool
+        )
+
+    @server.tool(description="指定されたフルパスのファイルのMD5ハッシュを取得します。戻り値のpathは絶対パス、realpathは実体パスです。")
+    async def get_md5_hash(ctx: Context, path: str) -> dict:
+        return await run_in_worker(efu_manager.get_md5_hash, path, ProgressReporter(ctx).hash)
+
+    @server.tool(description="指定されたフルパスのファイルのSHA1ハッシュを取得します。戻り値のpathは絶対パス、realpathは実体パスです。")
+    async def get_sha1_hash(ctx: Context, path: str) -> dict:
+        return await run_in_worker(efu_manager.get_sha1_hash, path, ProgressReporter(ctx).hash)
+
+    @server.tool(description="指定されたフルパスのファイルのGit Blob SHA1ハッシュを取得します。戻り値のpathは絶対パス、realpathは実体パスです。")
+    async def get_git_blob_hash(ctx: Context, path: str) -> dict:
+        return await run_in_worker(efu_manager.get_git_blob_hash, path, ProgressReporter(ctx).hash)
+
+    @server.tool(description="2つのファイル一覧を比較し、追加・削除・変更されたエントリを返します。old/newにはディレクトリ(その場でスキャン)または保存済みの一覧ファイル(JSON/NDJSON/EFU/スナップショット)を指定します。hash_method(md5/sha1/git_blob)を指定するとサイズが同じファイルを内容でも比較します(old/newの少なくとも一方がディレクトリの場合のみ)。")
+    async def diff_file_lists(old: str, new: str, hash_method: str | None = None) -> dict:
+        return await run_in_worker(diff_listings, efu_manager, old, new, hash_method)
+
+    @server.tool(description="保存済みのファイル一覧(NDJSON/EFU/スナップショット)をメモリマップで読み込み、offsetから最大limit件のエントリを返します。patternを指定するとfilenameがglobパターンに一致するエントリだけを返します。続きはnext_offsetから取得します。")
+    async def read_file_list(listing: str, pattern: str | None = None, offset: int = 0, limit: int = DEFAULT_READ_LIMIT) -> dict:
+        return await run_in_worker(listing_pool.read, listing, pattern, offset, limit)
+
+    @server.tool(description="ディレクトリのスキャンをバックグラウンドジョブとして開始し、job_idを返します。進捗は定期的にディスクへチェックポイントされ、サーバーが再起動しても最後のチェックポイントから再開します。結果はjob_resultsで取得します。")
+    async def start_scan_job(path: str) -> dict:
+        return await run_in_worker(job_manager.start_scan_job, path)
+
+    @server.tool(description="ファイルのハッシュ計算をバックグラウンドジョブとして開始し、job_idを返します。pathsにファイルの一覧、またはlistingに保存済みの一覧ファイルを指定します。計算済みのファイルは再開時に読み直しません。")
+    async def start_hash_job(paths: list[str] | None = None, listing: str | None = None, hash_method: str = "sha1") -> dict:
+        return await run_in_worker(job_manager.start_hash_job, paths, listing, hash_method)
+
+    @server.tool(description="ジョブの状態(queued/running/completed/failed/cancelled)、進捗、確定済みの結果件数を返します。")
+    async def job_status(job_id: str) -> dict:
+        return await run_in_worker(job_manager.job_status, job_id)
+
+    @server.tool(description="ジョブの確定済みの結果をoffsetから最大limit件返します。続きはnext_offsetから取得します。")
+    async def job_results(job_id: str, offset: int = 0, limit: int = DEFAULT_READ_LIMIT) -> dict:
+        return await run_in_worker(job_manager.job_results, job_id, offset, limit)
+
+    @server.tool(description="ジョブを中止します。")
+    async def cancel_job(job_id: str) -> dict:
+        return await run_in_worker(job_manager.cancel_job, job_id)
+
+    @server.resource("efu://cache/stats", description="get_file_list応答キャッシュのヒット率などの統計情報を返します。")
+    def cache_stats() -> dict:
+        return response_cache.stats()
+
+    @server.resource("efu://scheduler/stats", description="I/Oスケジューラの優先度クラスごとのキュー長・実行中件数と、I/O量・スロットリング時間の統計情報を返します。")
+    def scheduler_stats() -> dict:
+        return scheduler.stats()
+
+    @server.resource("efu://server/metrics", description="リクエスト数・レイテンシ分布・送受信バイト数・スキャン件数・ハッシュ量・キャッシュヒット率などのメトリクスを返します。")
+    def server_metrics() -> dict:
+        return metrics.snapshot()
+
+    return server
+
+
+def run_server(args):
+    """Runs the FastMCP server with the transport selected on the command line."""
+    server = create_server(args)
+    run_kwargs = {}
+    if args.transport in ("sse", "streamable-http"):
+        if args.host is not None:
+            run_kwargs["host"] = args.host
+        if args.port is not None:
+            run_kwargs["port"] = args.port
+
+    print(f"Starting MCP server with transport: {args.transport}", file=sys.stderr)
+    try:
+        server.run(transport=args.transport, **run_kwargs)
+    except KeyboardInterrupt:
+        print("\nServer shutting down gracefully.", file=sys.stderr)
+    except Exception as e:
+        print(f"\nAn unexpected server error occurred: {e}", file=sys.stderr)
@@ -0,0 +1,142 @@
+# mcp_efu/snapshot.py
+#
+# Compact binary snapshot format for saved listings. All integers are
+# little-endian; offsets are absolute file offsets.
+#
+#   preamble      magic (8 bytes), version (u16), restart interval (u16), reserved (u32)
+#   path table    one record per entry, in path_sort_key order:
+#                 varint shared prefix length, varint suffix length, suffix bytes.
+#                 Every restart-interval'th record stores the full path.
+#   padding       to an 8-byte boundary
+#   restart index u64 offset of each full-path record
+#   columns       size (u64 x count), date_modified (u64 x count),
+#                 date_created (u64 x count), attributes (u32 x count)
+#   trailer       count (u64), restart index offset (u64), columns offset (u64), magic (8 bytes)
+#
+# Paths are UTF-8 encoded with surrogatepass, so any filename returned by the
+# scanner round-trips. Reading is implemented by reader.SnapshotListing.
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from os.path import commonprefix
+from typing import BinaryIO, Iterable
+
+from .listing import SNAPSHOT_MAGIC, path_sort_key
+
+SNAPSHOT_VERSION = 1
+DEFAULT_RESTART_INTERVAL = 16
+
+PREAMBLE = struct.Struct("<8sHHI")
+TRAILER = struct.Struct("<QQQ8s")
+
+# Fixed-width columns, in file order, with their array type codes
+SNAPSHOT_COLUMNS = (
+    ("size", "Q"),
+    ("date_modified", "Q"),
+    ("date_created", "Q"),
+    ("attributes", "I"),
+)
+# Entry fields a snapshot holds; entries with any other field are rejected
+SNAPSHOT_FIELDS = frozenset(("filename",) + tuple(key for key, _ in SNAPSHOT_COLUMNS))
+
+# Number of column values buffered in memory before spilling to disk
+_SPOOL_CHUNK = 65536
+
+
+def encode_varint(value: int) -> bytes:
+    """Encodes a non-negative integer as LEB128."""
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(buffer, pos: int) -> tuple[int, int]:
+    """Decodes a LEB128 integer at pos; returns the value and the position after it."""
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_snapshot(entries: Iterable[dict], handle: BinaryIO, restart_interval: int = DEFAULT_RESTART_INTERVAL) -> int:
+    """
+    Writes entries to a binary stream as a snapshot and returns the number
+    of entries written.
+
+    Entries must arrive in path_sort_key order (as produced by a name-order
+    scan) and hold only SNAPSHOT_FIELDS, so that nothing (such as a hash or
+    the file_count and dir_count of a dir_sizes scan) is silently dropped;
+    a ValueError is raised otherwise. The stream is written strictly
+    sequentially, so it does not need to be seekable. Column values are
+    spooled to temporary files, keeping memory use independent of the
+    number of entries.
+    """
+    if not 1 <= restart_interval <= 0xFFFF:
+        raise ValueError("restart_interval must be between 1 and 65535.")
+
+    handle.write(PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, restart_interval, 0))
+    position = PREAMBLE.size
+    restarts = array("Q")
+    columns = [(key, array(code), tempfile.TemporaryFile()) for key, code in SNAPSHOT_COLUMNS]
+    try:
+        count = 0
+        previous_path = b""
+        previous_key = None
+        for entry in entries:
+            filename = entry["filename"]
+            if not entry.keys() <= SNAPSHOT_FIELDS:
+                fields = ", ".join(sorted(entry.keys() - SNAPSHOT_FIELDS))
+                raise ValueError(f"Snapshots cannot store the field(s) {fields} of '{filename}'; use another format.")
+            key = path_sort_key(filename)
+            if previous_key is not None and key < previous_key:
+                raise ValueError(f"Snapshot entries must be sorted by path; '{filename}' is out of order.")
+            path = filename.encode("utf-8", "surrogatepass")
+            if count % restart_interval == 0:
+                restarts.append(position)
+                shared = 0
+            else:
+                shared = len(commonprefix((previous_path, path)))
+            record = encode_varint(shared) + encode_varint(len(path) - shared) + path[shared:]
+            handle.write(record)
+            position += len(record)
+
+            for column_key, values, spool in columns:
+                values.append(entry.get(column_key) or 0)
+                if len(values) >= _SPOOL_CHUNK:
+                    spool.write(_to_little_endian(values))
+                    del values[:]
+            previous_path = path
+            previous_key = key
+            count += 1
+
+        padding = -position % 8
+        handle.write(b"\0" * padding)
+        restart_offset = position + padding
+        handle.write(_to_little_endian(restarts))
+        columns_offset = restart_offset + len(restarts) * restarts.itemsize
+        for _, values, spool in columns:
+            spool.write(_to_little_endian(values))
+            spool.seek(0)
+            shutil.copyfileobj(spool, handle)
+        handle.write(TRAILER.pack(count, restart_offset, columns_offset, SNAPSHOT_MAGIC))
+    finally:
+        for _, _, spool in columns:
+            spool.close()
+    return count
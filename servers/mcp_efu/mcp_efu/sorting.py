@@ -0,0 +1,90 @@
+# mcp_efu/sorting.py
+#
+# External merge sort for listings that may not fit in memory.
+import heapq
+import json
+import tempfile
+from typing import Callable, Iterable, Iterator, TextIO
+
+from .listing import path_sort_key
+
+SORT_KEYS = ("name", "size", "mtime")
+DEFAULT_SORT_MEMORY_BYTES = 256 * 1024 * 1024
+
+# Rough in-memory size of an entry dict, excluding the filename characters
+_ENTRY_OVERHEAD_BYTES = 400
+# Maximum number of runs merged at once; more are first merged into a longer run
+_MAX_MERGE_FAN_IN = 64
+
+
+def sort_key_function(sort: str) -> Callable[[dict], tuple]:
+    """
+    Returns the key function for a sort order. All orders are ascending;
+    size and mtime fall back to the path so that the output is deterministic.
+    """
+    if sort == "name":
+        return lambda entry: path_sort_key(entry["filename"])
+    if sort == "size":
+        return lambda entry: (entry.get("size", 0), path_sort_key(entry["filename"]))
+    if sort == "mtime":
+        return lambda entry: (entry.get("date_modified", 0), path_sort_key(entry["filename"]))
+    raise ValueError(f"Unsupported sort order '{sort}'. Expected one of {', '.join(SORT_KEYS)}.")
+
+
+def external_sort(
+    entries: Iterable[dict],
+    sort: str,
+    memory_budget: int = DEFAULT_SORT_MEMORY_BYTES,
+    temp_dir: str | None = None
+) -> Iterator[dict]:
+    """
+    Yields entries in the given sort order, using at most roughly
+    `memory_budget` bytes for buffered entries.
+
+    Entries are collected until the budget is reached, then sorted and
+    spilled to a temporary file as one NDJSON run. The runs and the final
+    in-memory batch are k-way merged with heapq.merge, so a listing of any
+    size is sorted with bounded memory. Temporary files are removed when
+    the generator finishes or is closed.
+    """
+    key = sort_key_function(sort)
+    runs: list[TextIO] = []
+    batch = []
+    batch_bytes = 0
+    try:
+        for entry in entries:
+            batch.append(entry)
+            batch_bytes += _ENTRY_OVERHEAD_BYTES + len(entry["filename"])
+            if batch_bytes >= memory_budget:
+                batch.sort(key=key)
+                runs.append(_write_run(batch, temp_dir))
+                batch = []
+                batch_bytes = 0
+                if len(runs) >= _MAX_MERGE_FAN_IN:
+                    merged = _write_run(heapq.merge(*map(_read_run, runs), key=key), temp_dir)
+                    for run in runs:
+                        run.close()
+                    runs = [merged]
+
+        batch.sort(key=key)
+        if not runs:
+            yield from batch
+            return
+        yield from heapq.merge(*map(_read_run, runs), batch, key=key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _write_run(entries: Iterable[dict], temp_dir: str | None) -> TextIO:
+    run = tempfile.TemporaryFile("w+", encoding="utf-8", dir=temp_dir)
+    for entry in entries:
+        run.write(json.dumps(entry))
+        run.write("\n")
+    return run
+
+
+def _read_run(run: TextIO) -> Iterator[dict]:
+    run.seek(0)
+    for line in run:
+        yield json.loads(line)
@@ -3,7 +3,29 @@ import asyncio
 import sys
 import json
 import time
-from .core import EfuFileManager
+from .core import EfuFileManager, DEFAULT_TREE_SUMMARY_TOP, SCAN_FLAGS
+from .grep import GrepPool, grep_files, DEFAULT_MAX_MATCHES_PER_FILE, DEFAULT_MAX_MATCHES
+from .estimate import estimate_tree, DEFAULT_TIME_BUDGET_SECONDS
+from .cache import ResponseCache
+from .diff import diff_file_lists
+from .reader import MappedListingPool, DEFAULT_READ_LIMIT
+from .sorting import SORT_KEYS
+from .jobs import JobManager
+from .iosched import IoScheduler, INTERACTIVE
+from .metrics import MetricsRegistry, create_server_metrics, cache_collector, scheduler_collector
+from .profiling import (
+    DEFAULT_PROFILE_LIMIT,
+    DEFAULT_PROFILE_SECONDS,
+    DEFAULT_SAMPLE_INTERVAL_SECONDS,
+    check_profile_params,
+    cprofile_result,
+    exclusive_profile,
+    sample_stacks,
+)
+
+JOB_METHODS = ("start_scan_job", "start_hash_job", "job_status", "job_results", "cancel_job")
+# How often the event loop lag is measured
+LOOP_LAG_INTERVAL_SECONDS = 0.25
 
 def create_success_response(req_id, result):
     """Creates a JSON-RPC 2.0 success response."""
@@ -17,6 +39,10 @@ def create_error_response(req_id, code, message):
         "jsonrpc": "2.0"
     }
 
+def encode_success_response(req_id, result_json: bytes) -> bytes:
+    """Builds a newline-terminated JSON-RPC 2.0 success response around an already-encoded result."""
+    return b'{"id": ' + json.dumps(req_id).encode() + b', "result": ' + result_json + b', "jsonrpc": "2.0"}\n'
+
 def extract_path_param(params):
     if isinstance(params, list) and len(params) == 1 and isinstance(params[0], str):
         return params[0]
@@ -24,23 +50,329 @@ def extract_path_param(params):
         return params.get("path")
     return None
 
+def extract_file_list_params(params):
+    path = extract_path_param(params)
+    if path is None:
+        return None
+    options = {}
+    if isinstance(params, dict) and params.get("sort") is not None:
+        if not isinstance(params["sort"], str):
+            return None
+        options["sort"] = params["sort"]
+    for flag in SCAN_FLAGS:
+        if isinstance(params, dict) and flag in params:
+            if not isinstance(params[flag], bool):
+                return None
+            if params[flag]:
+                options[flag] = True
+    return path, options
+
+def extract_tree_summary_params(params):
+    path = extract_path_param(params)
+    if path is None:
+        return None
+    if not isinstance(params, dict):
+        return path, DEFAULT_TREE_SUMMARY_TOP, None
+    top = params.get("top", DEFAULT_TREE_SUMMARY_TOP)
+    max_depth = params.get("max_depth")
+    if isinstance(top, int) and (max_depth is None or isinstance(max_depth, int)):
+        return path, top, max_depth
+    return None
+
+def extract_estimate_params(params):
+    path = extract_path_param(params)
+    if path is None:
+        return None
+    if not isinstance(params, dict):
+        return path, DEFAULT_TIME_BUDGET_SECONDS, None
+    time_budget = params.get("time_budget", DEFAULT_TIME_BUDGET_SECONDS)
+    seed = params.get("seed")
+    if isinstance(time_budget, (int, float)) and not isinstance(time_budget, bool) and (seed is None or isinstance(seed, int)):
+        return path, time_budget, seed
+    return None
+
+def extract_grep_params(params):
+    """Returns the keyword arguments for grep_files(), or None if the params are invalid."""
+    if not isinstance(params, dict) or not isinstance(params.get("path"), str) or not isinstance(params.get("pattern"), str):
+        return None
+    options = {"root": params["path"], "pattern": params["pattern"]}
+    for key in ("include", "exclude"):
+        globs = params.get(key)
+        if globs is not None and not (isinstance(globs, list) and all(isinstance(g, str) for g in globs)):
+            return None
+        options[key] = globs
+    options["ignore_case"] = params.get("ignore_case", False)
+    options["max_matches_per_file"] = params.get("max_matches_per_file", DEFAULT_MAX_MATCHES_PER_FILE)
+    options["max_matches"] = params.get("max_matches", DEFAULT_MAX_MATCHES)
+    if not isinstance(options["ignore_case"], bool):
+        return None
+    if not isinstance(options["max_matches_per_file"], int) or not isinstance(options["max_matches"], int):
+        return None
+    return options
+
+def extract_diff_params(params):
+    if isinstance(params, list) and len(params) in (2, 3) and all(isinstance(p, str) for p in params):
+        return params[0], params[1], params[2] if len(params) == 3 else None
+    if isinstance(params, dict) and isinstance(params.get("old"), str) and isinstance(params.get("new"), str):
+        hash_method = params.get("hash_method")
+        if hash_method is None or isinstance(hash_method, str):
+            return params["old"], params["new"], hash_method
+    return None
+
+def extract_read_params(params):
+    if isinstance(params, list) and len(params) == 1 and isinstance(params[0], str):
+        return params[0], None, 0, DEFAULT_READ_LIMIT
+    if isinstance(params, dict) and isinstance(params.get("listing"), str):
+        pattern = params.get("pattern")
+        offset = params.get("offset", 0)
+        limit = params.get("limit", DEFAULT_READ_LIMIT)
+        if (pattern is None or isinstance(pattern, str)) and isinstance(offset, int) and isinstance(limit, int):
+            return params["listing"], pattern, offset, limit
+    return None
+
+def extract_job_params(method, params):
+    """Returns the keyword arguments for a JobManager method, or None if the params are invalid."""
+    if method == "start_scan_job":
+        path = extract_path_param(params)
+        return {"path": path} if path is not None else None
+    if method == "start_hash_job":
+        if not isinstance(params, dict):
+            return None
+        paths = params.get("paths")
+        listing = params.get("listing")
+        hash_method = params.get("hash_method", "sha1")
+        if paths is not None and not (isinstance(paths, list) and all(isinstance(p, str) for p in paths)):
+            return None
+        if (listing is None or isinstance(listing, str)) and isinstance(hash_method, str):
+            return {"paths": paths, "listing": listing, "hash_method": hash_method}
+        return None
+    if isinstance(params, list) and len(params) == 1 and isinstance(params[0], str):
+        return {"job_id": params[0]}
+    if not isinstance(params, dict) or not isinstance(params.get("job_id"), str):
+        return None
+    if method == "job_results":
+        offset = params.get("offset", 0)
+        limit = params.get("limit", DEFAULT_READ_LIMIT)
+        if isinstance(offset, int) and isinstance(limit, int):
+            return {"job_id": params["job_id"], "offset": offset, "limit": limit}
+        return None
+    return {"job_id": params["job_id"]}
+
+def extract_profile_params(params):
+    if params is None:
+        params = {}
+    if not isinstance(params, dict):
+        return None
+    seconds = params.get("seconds", DEFAULT_PROFILE_SECONDS)
+    mode = params.get("mode", "sampling")
+    interval = params.get("interval", DEFAULT_SAMPLE_INTERVAL_SECONDS)
+    limit = params.get("limit", DEFAULT_PROFILE_LIMIT)
+    numbers = (seconds, interval)
+    if any(not isinstance(n, (int, float)) or isinstance(n, bool) for n in numbers) or not isinstance(mode, str) or not isinstance(limit, int):
+        return None
+    return seconds, mode, interval, limit
+
+def record_request(metrics: MetricsRegistry, method, response, sent_bytes: int, seconds: float):
+    """Counts one handled request. Unknown and malformed methods share a label to bound its values."""
+    error_code = response.get("error", {}).get("code") if isinstance(response, dict) else None
+    if not isinstance(method, str) or error_code in (-32601, -32700):
+        method = "other"
+    metrics.add("mcp_efu_requests_in_flight", -1)
+    metrics.inc("mcp_efu_requests_total", method=method)
+    metrics.inc("mcp_efu_sent_bytes_total", sent_bytes)
+    metrics.observe("mcp_efu_request_duration_seconds", seconds, method=method)
+    if error_code is not None:
+        metrics.inc("mcp_efu_request_errors_total", method=method, code=str(error_code))
+
+async def profile_server(seconds: float, mode: str, interval: float, limit: int) -> dict:
+    """
+    Profiles the running server for `seconds`. "cprofile" traces the event
+    loop thread, where the TCP transport handles every request; "sampling"
+    samples the stacks of all threads from a separate thread.
+    """
+    check_profile_params(seconds, mode, interval, limit)
+    with exclusive_profile():
+        if mode == "cprofile":
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            return cprofile_result(profiler, seconds, limit)
+        return await asyncio.to_thread(sample_stacks, seconds, interval, limit)
+
+async def monitor_event_loop_lag(metrics: MetricsRegistry, interval: float = LOOP_LAG_INTERVAL_SECONDS):
+    """Records how late the event loop wakes up from a sleep; runs until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        metrics.observe("mcp_efu_event_loop_lag_seconds", max(0.0, loop.time() - expected))
+
+async def run_in_worker(scheduler: IoScheduler | None, func, *args, **kwargs):
+    """
+    Runs a blocking tool call off the event loop, in the scheduler's
+    interactive class when the server has one, so other connections keep
+    being served while it scans, hashes or reads.
+    """
+    if scheduler is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return await asyncio.wrap_future(scheduler.submit(func, *args, priority=INTERACTIVE, **kwargs))
+
+
 async def handle_connection(
     reader: asyncio.StreamReader,
     writer: asyncio.StreamWriter,
     efu_manager: EfuFileManager,
-    peer_name: str
+    peer_name: str,
+    response_cache: ResponseCache | None = None,
+    listing_pool: MappedListingPool | None = None,
+    job_manager: JobManager | None = None,
+    metrics: MetricsRegistry | None = None,
+    grep_pool: GrepPool | None = None
 ):
     """
     Generic handler for a connection (TCP or stdio).
     It reads line-by-line JSON-RPC requests and writes back JSON-RPC responses.
+    Large grep_files searches use `grep_pool`, or start their own processes
+    if none is given.
     """
     print(f"[{time.time()}] Connection established from {peer_name}", file=sys.stderr)
+    if response_cache is None:
+        response_cache = ResponseCache()
+    if listing_pool is None:
+        listing_pool = MappedListingPool()
+    if metrics is None:
+        metrics = create_server_metrics()
+    scheduler = job_manager.scheduler if job_manager is not None else efu_manager.io_scheduler
+    metrics.add("mcp_efu_connections", 1)
     try:
         # Define the tools provided by this server
         tools = [
             {
                 "name": "get_file_list",
-                "description": "指定されたパス内のファイルとディレクトリの一覧を取得します。日時は常にWindowsのFILETIME 64ビット整数で返します。",
+                "description": "指定されたパス内のファイルとディレクトリの一覧を取得します。日時は常にWindowsのFILETIME 64ビット整数で返します。sort(name/size/mtime)を指定するとその昇順で返します。dir_sizesをtrueにするとディレクトリのsizeに配下の合計サイズ、file_count/dir_countに配下のファイル数・ディレクトリ数を設定します。one_file_system、dedupe_dirs、dedupe_hardlinksで、別デバイス(マウントポイント)配下や既に走査したディレクトリ(バインドマウント等)に降りない、ハードリンクされたファイルを1回だけ返す、を指定できます。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "スキャンするルートパス"
+                        },
+                        "sort": {
+                            "type": "string",
+                            "enum": list(SORT_KEYS),
+                            "description": "並び順(name: パス順, size: サイズ順, mtime: 更新日時順)"
+                        },
+                        "dir_sizes": {
+                            "type": "boolean",
+                            "description": "ディレクトリに配下の合計サイズと件数を設定するかどうか"
+                        },
+                        "one_file_system": {
+                            "type": "boolean",
+                            "description": "ルートと異なるデバイスのディレクトリに降りないかどうか"
+                        },
+                        "dedupe_dirs": {
+                            "type": "boolean",
+                            "description": "既に走査したディレクトリ(同じデバイス・inode)に再び降りないかどうか"
+                        },
+                        "dedupe_hardlinks": {
+                            "type": "boolean",
+                            "description": "ハードリンクされたファイルを最初に見つかったパスでだけ返すかどうか"
+                        }
+                    },
+                    "required": ["path"]
+                }
+            },
+            {
+                "name": "get_tree_summary",
+                "description": "指定されたディレクトリ配下の合計サイズ・ファイル数・ディレクトリ数と、合計サイズが大きい上位top件のサブディレクトリを返します。max_depthを指定するとその深さまでのサブディレクトリだけを対象にします。ハードリンクは1回だけ数えます。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "集計するルートパス"
+                        },
+                        "top": {
+                            "type": "integer",
+                            "description": "返すサブディレクトリの数"
+                        },
+                        "max_depth": {
+                            "type": "integer",
+                            "description": "対象にするサブディレクトリの最大の深さ"
+                        }
+                    },
+                    "required": ["path"]
+                }
+            },
+            {
+                "name": "estimate_tree",
+                "description": "指定されたディレクトリ配下のファイル数・ディレクトリ数・合計サイズと拡張子ごとのファイル数を、ランダムなディレクトリ降下のサンプリングで推定し、信頼区間(low/high)付きで返します。time_budget秒(既定0.2秒)以内に返し、時間を長くするほど精度が上がります。全ディレクトリを読み終えた場合はexactがtrueになり正確な値を返します。時間内にすべてのファイルをstatできなかったディレクトリは、一部のファイルのサイズから合計サイズを推定し、partialがtrueになります。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "推定するルートパス"
+                        },
+                        "time_budget": {
+                            "type": "number",
+                            "description": "推定に使う時間(秒)"
+                        },
+                        "seed": {
+                            "type": "integer",
+                            "description": "乱数のシード(再現性が必要な場合)"
+                        }
+                    },
+                    "required": ["path"]
+                }
+            },
+            {
+                "name": "grep_files",
+                "description": "指定されたディレクトリ配下のファイルの内容を正規表現で検索し、一致した行(行番号と内容)だけを返します。include/excludeのglobパターンで対象ファイルを絞り込めます。バイナリファイルは読み飛ばします。一致はファイルごとにmax_matches_per_file行、全体でmax_matches行までです。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "検索するルートパス"
+                        },
+                        "pattern": {
+                            "type": "string",
+                            "description": "検索する正規表現(Python構文、行単位)"
+                        },
+                        "include": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "対象にするファイルのglobパターン。/を含まないものはファイル名、含むものはルートからの相対パスと照合します"
+                        },
+                        "exclude": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "除外するファイルのglobパターン"
+                        },
+                        "ignore_case": {
+                            "type": "boolean",
+                            "description": "大文字・小文字を区別しない(ASCIIのみ)"
+                        },
+                        "max_matches_per_file": {
+                            "type": "integer",
+                            "description": "1ファイルあたりの最大一致行数"
+                        },
+                        "max_matches": {
+                            "type": "integer",
+                            "description": "全体の最大一致行数"
+                        }
+                    },
+                    "required": ["path", "pattern"]
+                }
+            },
+            {
+                "name": "start_scan_job",
+                "description": "ディレクトリのスキャンをバックグラウンドジョブとして開始し、job_idを返します。進捗は定期的にディスクへチェックポイントされ、サーバーが再起動しても最後のチェックポイントから再開します。結果はjob_resultsで取得します。",
                 "inputSchema": {
                     "type": "object",
                     "properties": {
@@ -52,6 +384,79 @@ async def handle_connection(
                     "required": ["path"]
                 }
             },
+            {
+                "name": "start_hash_job",
+                "description": "ファイルのハッシュ計算をバックグラウンドジョブとして開始し、job_idを返します。pathsにファイルの一覧、またはlistingに保存済みの一覧ファイルを指定します。計算済みのファイルは再開時に読み直しません。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "ハッシュを計算するファイルの絶対パスの一覧"
+                        },
+                        "listing": {
+                            "type": "string",
+                            "description": "ハッシュを計算するファイルを含む保存済み一覧ファイルのパス"
+                        },
+                        "hash_method": {
+                            "type": "string",
+                            "enum": ["md5", "sha1", "git_blob"],
+                            "description": "ハッシュの種類(既定: sha1)"
+                        }
+                    }
+                }
+            },
+            {
+                "name": "job_status",
+                "description": "ジョブの状態(queued/running/completed/failed/cancelled)、進捗、確定済みの結果件数を返します。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "job_id": {
+                            "type": "string",
+                            "description": "ジョブID"
+                        }
+                    },
+                    "required": ["job_id"]
+                }
+            },
+            {
+                "name": "job_results",
+                "description": "ジョブの確定済みの結果をoffsetから最大limit件返します。続きはnext_offsetから取得します。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "job_id": {
+                            "type": "string",
+                            "description": "ジョブID"
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "description": "読み出しを開始する結果の番号"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "返す結果の最大数"
+                        }
+                    },
+                    "required": ["job_id"]
+                }
+            },
+            {
+                "name": "cancel_job",
+                "description": "ジョブを中止します。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "job_id": {
+                            "type": "string",
+                            "description": "ジョブID"
+                        }
+                    },
+                    "required": ["job_id"]
+                }
+            },
             {
                 "name": "get_md5_hash",
                 "description": "指定されたフルパスのファイルのMD5ハッシュを取得します。戻り値のpathは絶対パス、realpathは実体パスです。",
@@ -93,6 +498,55 @@ async def handle_connection(
                     },
                     "required": ["path"]
                 }
+            },
+            {
+                "name": "diff_file_lists",
+                "description": "2つのファイル一覧を比較し、追加・削除・変更されたエントリを返します。old/newにはディレクトリ(その場でスキャン)または保存済みの一覧ファイル(JSON/NDJSON/EFU/スナップショット)を指定します。hash_method(md5/sha1/git_blob)を指定するとサイズが同じファイルを内容でも比較します(old/newの少なくとも一方がディレクトリの場合のみ)。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "old": {
+                            "type": "string",
+                            "description": "比較元のディレクトリまたは一覧ファイルのパス"
+                        },
+                        "new": {
+                            "type": "string",
+                            "description": "比較先のディレクトリまたは一覧ファイルのパス"
+                        },
+                        "hash_method": {
+                            "type": "string",
+                            "enum": ["md5", "sha1", "git_blob"],
+                            "description": "内容比較に使うハッシュ方式"
+                        }
+                    },
+                    "required": ["old", "new"]
+                }
+            },
+            {
+                "name": "read_file_list",
+                "description": "保存済みのファイル一覧(NDJSON/EFU/スナップショット)をメモリマップで読み込み、offsetから最大limit件のエントリを返します。patternを指定するとfilenameがglobパターンに一致するエントリだけを返します。続きはnext_offsetから取得します。",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "listing": {
+                            "type": "string",
+                            "description": "保存済み一覧ファイルのパス"
+                        },
+                        "pattern": {
+                            "type": "string",
+                            "description": "filenameに対するglobパターン"
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "description": "読み出しを開始する行番号"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "返すエントリの最大数"
+                        }
+                    },
+                    "required": ["listing"]
+                }
             }
         ]
 
@@ -121,7 +575,11 @@ async def handle_connection(
             
             print(f"[{time.time()}] RAW < {request_str}", file=sys.stderr)
 
+            started = time.perf_counter()
+            metrics.inc("mcp_efu_received_bytes_total", len(request_line))
+            metrics.add("mcp_efu_requests_in_flight", 1)
             req_id = None
+            method = None
             try:
                 request = json.loads(request_str)
                 print(f"[{time.time()}] REQ > {request}", file=sys.stderr)
@@ -133,21 +591,88 @@ async def handle_connection(
                 if method == "tools/list":
                     response = create_success_response(req_id, {"tools": tools})
 
+                elif method == "cache/stats":
+                    response = create_success_response(req_id, response_cache.stats())
+
+                elif method == "server/metrics":
+                    response = create_success_response(req_id, metrics.snapshot())
+
+                elif method == "server/profile":
+                    profile_params = extract_profile_params(params)
+                    if profile_params is not None:
+                        try:
+                            result = await profile_server(*profile_params)
+                            response = create_success_response(req_id, result)
+                        except ValueError as e:
+                            response = create_error_response(req_id, -32000, f"Server error: {e}")
+                    else:
+                        response = create_error_response(req_id, -32602, "Invalid params: Expected an object {'seconds': ..., 'mode': 'sampling' | 'cprofile', 'interval': ..., 'limit': ...}.")
+
+                elif method == "scheduler/stats":
+                    if scheduler is None:
+                        response = create_error_response(req_id, -32000, "Server error: No I/O scheduler is configured on this server.")
+                    else:
+                        response = create_success_response(req_id, scheduler.stats())
+
                 elif method == "get_file_list":
-                    path = extract_path_param(params)
-                    if path is not None:
+                    file_list_params = extract_file_list_params(params)
+                    if file_list_params is not None:
+                        path, options = file_list_params
                         try:
-                            file_list = efu_manager.get_file_list(path)
-                            response = create_success_response(req_id, file_list)
+                            payload = await run_in_worker(scheduler, response_cache.file_list_payload, efu_manager, path, **options)
+                            response = encode_success_response(req_id, payload)
                         except ValueError as e:
                             response = create_error_response(req_id, -32000, f"Server error: {e}")
                     else:
-                        response = create_error_response(req_id, -32602, "Invalid params: Expected a list with one string [path] or an object {'path': '...'}.")
+                        response = create_error_response(req_id, -32602, "Invalid params: Expected a list with one string [path] or an object {'path': '...', 'sort': ..., 'dir_sizes': ..., 'one_file_system': ..., 'dedupe_dirs': ..., 'dedupe_hardlinks': ...}.")
+                elif method == "get_tree_summary":
+                    summary_params = extract_tree_summary_params(params)
+                    if summary_params is not None:
+                        try:
+                            result = await run_in_worker(scheduler, efu_manager.get_tree_summary, *summary_params)
+                            response = create_success_response(req_id, result)
+                        except ValueError as e:
+                            response = create_error_response(req_id, -32000, f"Server error: {e}")
+                    else:
+                        response = create_error_response(req_id, -32602, "Invalid params: Expected a list with one string [path] or an object {'path': '...', 'top': ..., 'max_depth': ...}.")
+                elif method == "estimate_tree":
+                    estimate_params = extract_estimate_params(params)
+                    if estimate_params is not None:
+                        path, time_budget, seed = estimate_params
+                        try:
+                            result = await run_in_worker(scheduler, estimate_tree, efu_manager, path, time_budget, seed=seed)
+                            response = create_success_response(req_id, result)
+                        except ValueError as e:
+                            response = create_error_response(req_id, -32000, f"Server error: {e}")
+                    else:
+                        response = create_error_response(req_id, -32602, "Invalid params: Expected a list with one string [path] or an object {'path': '...', 'time_budget': ..., 'seed': ...}.")
+                elif method == "grep_files":
+                    grep_params = extract_grep_params(params)
+                    if grep_params is not None:
+                        try:
+                            result = await run_in_worker(scheduler, grep_files, efu_manager, pool=grep_pool, **grep_params)
+                            response = create_success_response(req_id, result)
+                        except ValueError as e:
+                            response = create_error_response(req_id, -32000, f"Server error: {e}")
+                    else:
+                        response = create_error_response(req_id, -32602, "Invalid params: Expected an object {'path': '...', 'pattern': '...', 'include': [...], 'exclude': [...], 'ignore_case': ..., 'max_matches_per_file': ..., 'max_matches': ...}.")
+                elif method in JOB_METHODS:
+                    job_params = extract_job_params(method, params)
+                    if job_manager is None:
+                        response = create_error_response(req_id, -32000, "Server error: Jobs are not enabled on this server.")
+                    elif job_params is not None:
+                        try:
+                            result = await run_in_worker(scheduler, getattr(job_manager, method), **job_params)
+                            response = create_success_response(req_id, result)
+                        except ValueError as e:
+                            response = create_error_response(req_id, -32000, f"Server error: {e}")
+                    else:
+                        response = create_error_response(req_id, -32602, f"Invalid params for {method}. See tools/list for its inputSchema.")
                 elif method == "get_md5_hash":
                     path = extract_path_param(params)
                     if path is not None:
                         try:
-                            result = efu_manager.get_md5_hash(path)
+                            result = await run_in_worker(scheduler, efu_manager.get_md5_hash, path)
                             response = create_success_response(req_id, result)
                         except ValueError as e:
                             response = create_error_response(req_id, -32000, f"Server error: {e}")
@@ -157,7 +682,7 @@ async def handle_connection(
                     path = extract_path_param(params)
                     if path is not None:
                         try:
-                            result = efu_manager.get_sha1_hash(path)
+                            result = await run_in_worker(scheduler, efu_manager.get_sha1_hash, path)
                             response = create_success_response(req_id, result)
                         except ValueError as e:
                             response = create_error_response(req_id, -32000, f"Server error: {e}")
@@ -167,12 +692,32 @@ async def handle_connection(
                     path = extract_path_param(params)
                     if path is not None:
                         try:
-                            result = efu_manager.get_git_blob_hash(path)
+                            result = await run_in_worker(scheduler, efu_manager.get_git_blob_hash, path)
                             response = create_success_response(req_id, result)
                         except ValueError as e:
                             response = create_error_response(req_id, -32000, f"Server error: {e}")
                     else:
                         response = create_error_response(req_id, -32602, "Invalid params: Expected a list with one string [path] or an object {'path': '...'}.")
+                elif method == "diff_file_lists":
+                    diff_params = extract_diff_params(params)
+                    if diff_params is not None:
+                        try:
+                            result = await run_in_worker(scheduler, diff_file_lists, efu_manager, *diff_params)
+                            response = create_success_response(req_id, result)
+                        except ValueError as e:
+                            response = create_error_response(req_id, -32000, f"Server error: {e}")
+                    else:
+                        response = create_error_response(req_id, -32602, "Invalid params: Expected [old, new] or an object {'old': '...', 'new': '...', 'hash_method': ...}.")
+                elif method == "read_file_list":
+                    read_params = extract_read_params(params)
+                    if read_params is not None:
+                        try:
+                            result = await run_in_worker(scheduler, listing_pool.read, *read_params)
+                            response = create_success_response(req_id, result)
+                        except ValueError as e:
+                            response = create_error_response(req_id, -32000, f"Server error: {e}")
+                    else:
+                        response = create_error_response(req_id, -32602, "Invalid params: Expected [listing] or an object {'listing': '...', 'pattern': ..., 'offset': ..., 'limit': ...}.")
                 else:
                     response = create_error_response(req_id, -32601, f"Method not found: {method}")
 
@@ -181,15 +726,24 @@ async def handle_connection(
             except Exception as e:
                 response = create_error_response(req_id, -32603, f"Internal error: {e}")
 
-            print(f"[{time.time()}] RSP < {response}", file=sys.stderr)
-            writer.write((json.dumps(response) + '\n').encode())
-            await writer.drain()
+            if isinstance(response, bytes):
+                print(f"[{time.time()}] RSP < <encoded response, {len(response)} bytes>", file=sys.stderr)
+                data = response
+            else:
+                print(f"[{time.time()}] RSP < {response}", file=sys.stderr)
+                data = (json.dumps(response) + '\n').encode()
+            writer.write(data)
+            try:
+                await writer.drain()
+            finally:
+                record_request(metrics, method, response, len(data), time.perf_counter() - started)
 
     except (asyncio.CancelledError, ConnectionResetError):
         pass  # Client disconnected
     except Exception as e:
         print(f"An unexpected error occurred with {peer_name}: {e}", file=sys.stderr)
     finally:
+        metrics.add("mcp_efu_connections", -1)
         print(f"Closing connection with {peer_name}", file=sys.stderr)
         if not writer.is_closing():
             try:
@@ -198,11 +752,38 @@ async def handle_connection(
             except Exception:
                 pass  # Ignore errors on close
 
-async def start_tcp_server(host: str, port: int, efu_manager: EfuFileManager):
-    """Starts the TCP server."""
+def register_collectors(metrics: MetricsRegistry, response_cache: ResponseCache, scheduler: IoScheduler | None):
+    metrics.register_collector(cache_collector(response_cache))
+    if scheduler is not None:
+        metrics.register_collector(scheduler_collector(scheduler))
+
+async def start_tcp_server(
+    host: str,
+    port: int,
+    efu_manager: EfuFileManager,
+    response_cache: ResponseCache | None = None,
+    job_manager: JobManager | None = None,
+    metrics: MetricsRegistry | None = None
+):
+    """
+    Starts the TCP server. All connections share one response cache, listing
+    pool, grep process pool, job manager and metrics registry. Jobs are only
+    available when a `job_manager` (and with it a jobs directory) is given.
+    """
+    if response_cache is None:
+        response_cache = ResponseCache()
+    if metrics is None:
+        metrics = create_server_metrics()
+    register_collectors(metrics, response_cache, job_manager.scheduler if job_manager is not None else efu_manager.io_scheduler)
+    listing_pool = MappedListingPool()
+    grep_pool = GrepPool()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag(metrics))
     try:
         server = await asyncio.start_server(
-            lambda r, w: handle_connection(r, w, efu_manager, f"TCP client {w.get_extra_info('peername')}"),
+            lambda r, w: handle_connection(
+                r, w, efu_manager, f"TCP client {w.get_extra_info('peername')}", response_cache, listing_pool, job_manager, metrics,
+                grep_pool
+            ),
             host,
             port
         )
@@ -212,10 +793,25 @@ async def start_tcp_server(host: str, port: int, efu_manager: EfuFileManager):
             await server.serve_forever()
     except Exception as e:
         print(f"Failed to start TCP server: {e}", file=sys.stderr)
+    finally:
+        lag_monitor.cancel()
+        grep_pool.shutdown(wait=False)
 
 
-async def start_stdio_server(efu_manager: EfuFileManager):
-    """Starts the stdio server, using stdin and stdout."""
+async def start_stdio_server(
+    efu_manager: EfuFileManager,
+    response_cache: ResponseCache | None = None,
+    job_manager: JobManager | None = None,
+    metrics: MetricsRegistry | None = None
+):
+    """Starts the stdio server, using stdin and stdout. Jobs are only available when a `job_manager` is given."""
+    if response_cache is None:
+        response_cache = ResponseCache()
+    if metrics is None:
+        metrics = create_server_metrics()
+    register_collectors(metrics, response_cache, job_manager.scheduler if job_manager is not None else efu_manager.io_scheduler)
+    grep_pool = GrepPool()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag(metrics))
     print("stdio server started. Waiting for JSON-RPC requests on stdin.", file=sys.stderr)
     loop = asyncio.get_running_loop()
     try:
@@ -228,6 +824,11 @@ async def start_stdio_server(efu_manager: EfuFileManager):
         )
         writer = asyncio.StreamWriter(writer_transport, writer_protocol, None, loop)
 
-        await handle_connection(reader, writer, efu_manager, "stdio")
+        await handle_connection(
+            reader, writer, efu_manager, "stdio", response_cache, job_manager=job_manager, metrics=metrics, grep_pool=grep_pool
+        )
     except Exception as e:
         print(f"Error in stdio server: {e}", file=sys.stderr)
+    finally:
+        lag_monitor.cancel()
+        grep_pool.shutdown(wait=False)
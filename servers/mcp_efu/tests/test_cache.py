@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import sys
+import time
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.cache import ResponseCache
+
+
+class CountingFileManager(EfuFileManager):
+    def __init__(self):
+        super().__init__()
+        self.scans = 0
+
+    def get_file_list(self, root_path_str: str, **options) -> list[dict]:
+        self.scans += 1
+        return super().get_file_list(root_path_str, **options)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_cache"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "a.txt").write_text("alpha")
+        self.subdir = self.test_dir / "subdir"
+        self.subdir.mkdir(exist_ok=True)
+        (self.subdir / "b.txt").write_text("beta")
+        self.efu = CountingFileManager()
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _bump_mtime(self, path: Path):
+        # Make the change visible even on filesystems with coarse timestamps.
+        stat_info = path.stat()
+        os.utime(path, (stat_info.st_atime, stat_info.st_mtime + 10))
+
+    def test_second_call_is_served_from_cache(self):
+        cache = ResponseCache(ttl=60)
+        first = cache.file_list_payload(self.efu, str(self.test_dir))
+        second = cache.file_list_payload(self.efu, str(self.test_dir))
+        self.assertIs(first, second)
+        self.assertEqual(self.efu.scans, 1)
+        self.assertEqual(json.loads(first), self.efu.get_file_list(str(self.test_dir)))
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertAlmostEqual(stats["hit_rate"], 0.5)
+
+    def test_decoded_list_is_cached(self):
+        cache = ResponseCache(ttl=60)
+        first = cache.get_file_list(self.efu, str(self.test_dir))
+        self.assertIs(cache.get_file_list(self.efu, str(self.test_dir)), first)
+        self.assertEqual(json.loads(cache.file_list_payload(self.efu, str(self.test_dir))), first)
+        self.assertEqual(self.efu.scans, 1)
+
+        # An entry stored from the payload path is decoded once, on its first decoded hit
+        cache.clear()
+        cache.file_list_payload(self.efu, str(self.test_dir))
+        decoded = cache.get_file_list(self.efu, str(self.test_dir))
+        self.assertIs(cache.get_file_list(self.efu, str(self.test_dir)), decoded)
+        self.assertEqual(self.efu.scans, 2)
+
+    def test_decoded_list_counts_against_max_bytes(self):
+        cache = ResponseCache(ttl=60)
+        payload = cache.file_list_payload(self.efu, str(self.test_dir))
+        self.assertEqual(cache.stats()["bytes"], len(payload))
+        cache.get_file_list(self.efu, str(self.test_dir))
+        decoded_bytes = cache.stats()["bytes"]
+        self.assertGreater(decoded_bytes, 2 * len(payload))
+
+        # A listing stored decoded on a miss is charged for the list as well
+        cache.clear()
+        cache.get_file_list(self.efu, str(self.test_dir))
+        self.assertGreater(cache.stats()["bytes"], 2 * len(payload))
+
+        # Room for the payload but not the decoded list: decoding evicts the entry
+        cache = ResponseCache(ttl=60, max_bytes=decoded_bytes - 1)
+        cache.file_list_payload(self.efu, str(self.test_dir))
+        cache.get_file_list(self.efu, str(self.test_dir))
+        self.assertEqual(cache.stats()["entries"], 0)
+        self.assertEqual(cache.stats()["bytes"], 0)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_directory_change_invalidates_entry(self):
+        cache = ResponseCache(ttl=60)
+        cache.file_list_payload(self.efu, str(self.test_dir))
+
+        (self.subdir / "c.txt").write_text("gamma")
+        self._bump_mtime(self.subdir)
+
+        result = cache.get_file_list(self.efu, str(self.test_dir))
+        self.assertEqual(self.efu.scans, 2)
+        self.assertIn(str((self.subdir / "c.txt").resolve()), {item["filename"] for item in result})
+        self.assertEqual(cache.stats()["invalidated"], 1)
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl=0.05)
+        cache.file_list_payload(self.efu, str(self.test_dir))
+        time.sleep(0.1)
+        cache.file_list_payload(self.efu, str(self.test_dir))
+        self.assertEqual(self.efu.scans, 2)
+        self.assertEqual(cache.stats()["expired"], 1)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(ttl=60, max_entries=1)
+        cache.file_list_payload(self.efu, str(self.test_dir))
+        cache.file_list_payload(self.efu, str(self.subdir))
+        cache.file_list_payload(self.efu, str(self.test_dir))
+        self.assertEqual(self.efu.scans, 3)
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["evictions"], 2)
+
+    def test_disabled_cache_always_scans(self):
+        cache = ResponseCache(ttl=0)
+        cache.file_list_payload(self.efu, str(self.test_dir))
+        cache.file_list_payload(self.efu, str(self.test_dir))
+        self.assertEqual(self.efu.scans, 2)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
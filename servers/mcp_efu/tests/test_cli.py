@@ -3,7 +3,11 @@ import subprocess
 import sys
 import os
 import json
+import hashlib
 import shutil
+import socket
+import time
+from contextlib import closing
 from pathlib import Path
 
 # Add the project root to the path to allow running the module with -m
@@ -95,5 +99,164 @@ class TestCliMode(unittest.TestCase):
             self.assertIsInstance(data, list)
             self.assertEqual(len(data), 4)
 
+    def test_output_formats(self):
+        """Test that --format ndjson and efu write one line per entry."""
+        for fmt in ("ndjson", "efu"):
+            output_file = self.test_dir.parent / f"test_cli_output.{fmt}"
+            try:
+                command = self.base_command + [str(self.test_dir), "--format", fmt, "--output", str(output_file)]
+                subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+                lines = output_file.read_text(encoding='utf-8').splitlines()
+                # EFU files start with a header row
+                self.assertEqual(len(lines), 4 if fmt == "ndjson" else 5)
+            finally:
+                output_file.unlink(missing_ok=True)
+
+    def test_hash_option(self):
+        """Test that --hash adds the hash of each file and needs a format that can store it."""
+        command = self.base_command + [str(self.test_dir), "--format", "ndjson", "--hash", "md5"]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+        entries = {Path(entry["filename"]).name: entry for entry in map(json.loads, result.stdout.splitlines())}
+        self.assertEqual(entries["file1.txt"]["hash"], hashlib.md5((self.test_dir / "file1.txt").read_bytes()).hexdigest())
+        self.assertEqual(entries["file1.txt"]["hash_method"], "md5")
+        self.assertNotIn("hash", entries[self.subdir.name])
+
+        command = self.base_command + [str(self.test_dir), "--format", "efu", "--hash", "md5"]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', env=self.env)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("--hash can only be used", result.stderr)
+
+    def test_sort_option(self):
+        """Test that --sort size streams entries in ascending size order."""
+        (self.test_dir / "big.bin").write_bytes(b"x" * 100)
+        command = self.base_command + [str(self.test_dir), "--format", "ndjson", "--sort", "size", "--sort-memory", "0"]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+        entries = [json.loads(line) for line in result.stdout.splitlines()]
+        self.assertEqual(len(entries), 5)
+        self.assertEqual([e["size"] for e in entries], sorted(e["size"] for e in entries))
+        self.assertTrue(entries[-1]["filename"].endswith("big.bin"))
+
+    def test_dedupe_hardlinks_option(self):
+        """Test that --dedupe-hardlinks lists a hardlinked file once."""
+        os.link(self.test_dir / "file1.txt", self.subdir / "file1-link.txt")
+        command = self.base_command + [str(self.test_dir), "--format", "ndjson", "-x", "--dedupe-dirs"]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+        self.assertEqual(len(result.stdout.splitlines()), 5)
+        command.append("--dedupe-hardlinks")
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+        self.assertEqual(len(result.stdout.splitlines()), 4)
+
+    def test_snapshot_and_convert(self):
+        """Test that a snapshot written by the CLI converts back to the same JSON listing."""
+        snapshot = self.test_dir.parent / "test_cli_output.efusnap"
+        try:
+            command = self.base_command + [str(self.test_dir), "--format", "snapshot", "--output", str(snapshot)]
+            subprocess.run(command, capture_output=True, check=True, env=self.env)
+            self.assertTrue(snapshot.read_bytes().startswith(b"EFUSNAP"))
+
+            command = self.base_command + ["convert", str(snapshot), "--format", "json"]
+            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+            converted = json.loads(result.stdout)
+
+            command = self.base_command + [str(self.test_dir)]
+            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+            scanned = json.loads(result.stdout)
+            self.assertEqual(sorted(converted, key=lambda e: e["filename"]), sorted(scanned, key=lambda e: e["filename"]))
+        finally:
+            snapshot.unlink(missing_ok=True)
+
+    def test_diff_subcommand(self):
+        """Test that 'diff' compares a saved listing with a live directory."""
+        saved = self.test_dir.parent / "test_cli_before.ndjson"
+        try:
+            command = self.base_command + [str(self.test_dir), "--format", "ndjson", "--output", str(saved)]
+            subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+            (self.subdir / "added.txt").write_text("new")
+
+            command = self.base_command + ["diff", str(saved), str(self.test_dir)]
+            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+            data = json.loads(result.stdout)
+            self.assertEqual([item["filename"] for item in data["added"]], [str((self.subdir / "added.txt").resolve())])
+            self.assertEqual(data["summary"]["removed"], 0)
+        finally:
+            saved.unlink(missing_ok=True)
+
+    def test_grep_subcommand(self):
+        """Test that 'grep' prints one JSON line per file with matching lines."""
+        command = self.base_command + ["grep", "wor", str(self.test_dir), "--include", "*.log"]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+        lines = [json.loads(line) for line in result.stdout.splitlines()]
+        self.assertEqual(lines, [{"filename": str((self.subdir / "file2.log").resolve()), "matches": [{"line": 1, "text": "world"}], "truncated": False}])
+
+        command = self.base_command + ["grep", "(", str(self.test_dir)]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', env=self.env)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("Invalid pattern", result.stderr)
+
+
+class TestConnectMode(unittest.TestCase):
+
+    def setUp(self):
+        """Start a tcp daemon and create a temporary directory to scan through it."""
+        try:
+            with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+                s.bind(('127.0.0.1', 0))
+                self.port = s.getsockname()[1]
+        except PermissionError:
+            self.skipTest("TCP sockets not permitted in this environment.")
+
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_connect"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "file1.txt").write_text("hello")
+
+        self.env = os.environ.copy()
+        package_root = PROJECT_ROOT / "servers" / "mcp_efu"
+        self.env["PYTHONPATH"] = str(package_root) + os.pathsep + self.env.get("PYTHONPATH", "")
+        self.base_command = [sys.executable, "-m", "mcp_efu"]
+        self.address = f"127.0.0.1:{self.port}"
+
+        self.daemon = subprocess.Popen(
+            self.base_command + ["--transport", "tcp", "--host", "127.0.0.1", "--port", str(self.port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=self.env,
+        )
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        self.fail("tcp daemon did not start.")
+
+    def tearDown(self):
+        self.daemon.terminate()
+        self.daemon.wait(timeout=5)
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir)
+
+    def test_connect_scans_through_daemon(self):
+        """Test that --connect returns the same listing as an in-process scan."""
+        command = self.base_command + [str(self.test_dir), "--connect", self.address]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True, env=self.env)
+        data = json.loads(result.stdout)
+        self.assertEqual(len(data), 2)
+        self.assertIn(str((self.test_dir / "file1.txt").resolve()), {item['filename'] for item in data})
+
+    def test_connect_reports_daemon_errors(self):
+        """Test that errors from the daemon are reported like local errors."""
+        command = self.base_command + ["/path/to/nonexistent/dir", "--connect", self.address]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', env=self.env)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("is not a valid directory", result.stderr)
+
+    def test_connect_with_transport_error(self):
+        """Test that --connect cannot be combined with a server transport."""
+        command = self.base_command + ["--transport", "stdio", "--connect", self.address]
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', env=self.env)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("--connect cannot be used with --transport", result.stderr)
+
 if __name__ == "__main__":
     unittest.main()
@@ -87,6 +87,93 @@ class TestEfuFileManager(unittest.TestCase):
             {"path": abs_target, "realpath": real_target, "hash": "b6fc4c620b67d95f953a5c1c1230aaab5db5a1b0"},
         )
 
+    def test_get_file_list_reports_progress(self):
+        reports = []
+        results = self.efu.get_file_list(str(self.test_dir), progress=lambda *args: reports.append(args))
+        # One report per directory (root and subdir); nothing is pending at the end.
+        self.assertEqual(len(reports), 2)
+        self.assertEqual(reports[-1], (len(results), 0))
+
+    def test_dir_sizes_are_recursive_and_count_hardlinks_once(self):
+        (self.subdir / "inner.txt").write_text("12345678")
+        os.link(self.subdir / "inner.txt", self.subdir / "inner-link.txt")
+        results = self.efu.get_file_list(str(self.test_dir), dir_sizes=True)
+        by_name = {item["filename"]: item for item in results}
+
+        subdir_entry = by_name[str(self.subdir.resolve())]
+        self.assertEqual((subdir_entry["size"], subdir_entry["file_count"], subdir_entry["dir_count"]), (8, 2, 0))
+        # Directories come after their contents; the root is last.
+        root_entry = results[-1]
+        self.assertEqual(root_entry["filename"], str(self.test_dir.resolve()))
+        self.assertEqual(root_entry["size"], len("hello") + len("secret") + len("readonly") + 8)
+        self.assertEqual((root_entry["file_count"], root_entry["dir_count"]), (5, 1))
+
+    def _fake_stat(self, path, device_offset=0, same_as=None):
+        """Stats `path`, optionally with another device or the device and inode of `same_as`."""
+        st = os.stat(path, follow_symlinks=False)
+        ino, dev = st.st_ino, st.st_dev + device_offset
+        if same_as is not None:
+            other = os.stat(same_as, follow_symlinks=False)
+            ino, dev = other.st_ino, other.st_dev
+        return os.stat_result((st.st_mode, ino, dev, st.st_nlink, st.st_uid, st.st_gid, st.st_size, st.st_atime, st.st_mtime, st.st_ctime))
+
+    def _scan_all_walkers(self, **options):
+        """Returns the sets of filenames from the os.walk, name-order and dir-sizes walkers."""
+        return [
+            {item["filename"] for item in self.efu.get_file_list(str(self.test_dir), **options)},
+            {item["filename"] for item in self.efu.get_file_list(str(self.test_dir), name_order=True, **options)},
+            {item["filename"] for item in self.efu.get_file_list(str(self.test_dir), dir_sizes=True, **options)},
+        ]
+
+    def test_one_file_system_and_dedupe_dirs(self):
+        (self.subdir / "inner.txt").write_text("inner")
+        other = self.test_dir / "other"
+        other.mkdir()
+        (other / "copy.txt").write_text("copy")
+        inner = str((self.subdir / "inner.txt").resolve())
+        copy = str((other / "copy.txt").resolve())
+        real_lstat = self.efu._lstat
+
+        # 'subdir' on another device, as if it were a mount point
+        self.efu._lstat = lambda path: self._fake_stat(path, 1) if path == self.subdir.resolve() else real_lstat(path)
+        for filenames in self._scan_all_walkers():
+            self.assertIn(inner, filenames)
+        for filenames in self._scan_all_walkers(one_file_system=True):
+            self.assertIn(str(self.subdir.resolve()), filenames)
+            self.assertNotIn(inner, filenames)
+
+        # 'other' is the same directory as 'subdir', as if bind-mounted
+        self.efu._lstat = lambda path: self._fake_stat(path, same_as=self.subdir) if path == other.resolve() else real_lstat(path)
+        # Whichever of the two is walked first is the one listed in full
+        for filenames in self._scan_all_walkers(dedupe_dirs=True):
+            self.assertIn(str(other.resolve()), filenames)
+            self.assertEqual(len({inner, copy} & filenames), 1)
+
+    def test_dedupe_hardlinks(self):
+        (self.subdir / "inner.txt").write_text("12345678")
+        os.link(self.subdir / "inner.txt", self.test_dir / "a-link.txt")
+        links = {str((self.subdir / "inner.txt").resolve()), str((self.test_dir / "a-link.txt").resolve())}
+        for filenames in self._scan_all_walkers(dedupe_hardlinks=True):
+            self.assertEqual(len(links & filenames), 1)
+        root_entry = self.efu.get_file_list(str(self.test_dir), dir_sizes=True, dedupe_hardlinks=True)[-1]
+        self.assertEqual((root_entry["size"], root_entry["file_count"]), (len("hello") + len("secret") + len("readonly") + 8, 4))
+
+    def test_tree_summary(self):
+        (self.subdir / "nested").mkdir()
+        (self.subdir / "nested" / "big.bin").write_bytes(b"x" * 100)
+        summary = self.efu.get_tree_summary(str(self.test_dir), top=1)
+        self.assertEqual(summary["root"]["size"], 119)
+        self.assertEqual([entry["filename"] for entry in summary["largest"]], [str(self.subdir.resolve())])
+
+        summary = self.efu.get_tree_summary(str(self.test_dir), top=5, max_depth=1)
+        self.assertEqual([entry["filename"] for entry in summary["largest"]], [str(self.subdir.resolve())])
+
+    def test_hash_reports_progress(self):
+        target = self.test_dir / "normal.txt"
+        reports = []
+        self.efu.get_sha1_hash(str(target.absolute()), progress=lambda *args: reports.append(args))
+        self.assertEqual(reports[-1], (5, 5))
+
     def test_hash_invalid_path_raises(self):
         with self.assertRaises(ValueError):
             self.efu.get_md5_hash("/path/to/nonexistent/file.txt")
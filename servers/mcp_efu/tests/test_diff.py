@@ -0,0 +1,139 @@
+import hashlib
+import os
+import shutil
+import sys
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.diff import diff_file_lists, iter_with_hashes
+from servers.mcp_efu.mcp_efu.listing import dumps_listing
+
+
+class CountingFileManager(EfuFileManager):
+    def __init__(self):
+        super().__init__()
+        self.hashed = []
+
+    def get_md5_hash(self, file_path_str, progress=None):
+        self.hashed.append(Path(file_path_str).name)
+        return super().get_md5_hash(file_path_str, progress)
+
+
+class TestDiffFileLists(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_diff"
+        self.tree = self.test_dir / "tree"
+        self.tree.mkdir(parents=True, exist_ok=True)
+        (self.tree / "keep.txt").write_text("keep")
+        (self.tree / "grow.txt").write_text("small")
+        (self.tree / "touch.txt").write_text("same")
+        (self.tree / "gone.txt").write_text("bye")
+        (self.tree / "sub").mkdir(exist_ok=True)
+        (self.tree / "sub" / "inner.txt").write_text("inner")
+        self.efu = EfuFileManager()
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _save(self, name, fmt, entries=None):
+        path = self.test_dir / name
+        if entries is None:
+            entries = self.efu.get_file_list(str(self.tree))
+        path.write_text(dumps_listing(entries, fmt), encoding="utf-8", newline="")
+        return str(path)
+
+    def _change_tree(self):
+        (self.tree / "grow.txt").write_text("much larger now")
+        (self.tree / "gone.txt").unlink()
+        (self.tree / "sub" / "new.txt").write_text("new")
+        touched = self.tree / "touch.txt"
+        stat_info = touched.stat()
+        os.utime(touched, (stat_info.st_atime, stat_info.st_mtime + 100))
+
+    def _names(self, entries):
+        return {Path(entry["filename"]).name for entry in entries}
+
+    def test_saved_listing_against_live_scan(self):
+        saved_listings = {fmt: self._save(f"before.{fmt}", fmt) for fmt in ("json", "ndjson", "efu")}
+        self._change_tree()
+        for fmt, saved in saved_listings.items():
+            with self.subTest(fmt=fmt):
+                result = diff_file_lists(self.efu, saved, str(self.tree))
+                self.assertEqual(self._names(result["added"]), {"new.txt"})
+                self.assertEqual(self._names(result["removed"]), {"gone.txt"})
+                changes = {Path(item["filename"]).name: item["changes"] for item in result["modified"]}
+                self.assertEqual(changes, {"grow.txt": ["size", "date_modified"], "touch.txt": ["date_modified"]})
+                self.assertEqual(result["summary"]["unchanged"], 4)
+
+    def test_two_saved_listings(self):
+        old = self._save("old.ndjson", "ndjson")
+        self._change_tree()
+        new = self._save("new.efu", "efu")
+        result = diff_file_lists(self.efu, old, new)
+        self.assertEqual(result["summary"]["added"], 1)
+        self.assertEqual(result["summary"]["removed"], 1)
+        self.assertEqual(result["summary"]["modified"], 2)
+
+    def test_hash_suppresses_touch_only_changes(self):
+        entries = self.efu.get_file_list(str(self.tree))
+        for entry in entries:
+            if entry["filename"].endswith("touch.txt"):
+                entry.update(hash=hashlib.md5(b"same").hexdigest(), hash_method="md5")
+            if entry["filename"].endswith("keep.txt"):
+                entry.update(hash="0" * 32, hash_method="md5")
+        saved = self._save("hashed.ndjson", "ndjson", entries)
+        self._change_tree()
+        os.utime(self.tree / "keep.txt", (0, 1_000_000_000))
+
+        result = diff_file_lists(self.efu, saved, str(self.tree), hash_method="md5")
+        changes = {Path(item["filename"]).name: item["changes"] for item in result["modified"]}
+        self.assertNotIn("touch.txt", changes)
+        self.assertEqual(changes["keep.txt"], ["date_modified", "hash"])
+
+        # A hash recorded with another method is not compared
+        saved = self._save("sha1.ndjson", "ndjson", [dict(entry, hash_method="sha1") for entry in entries])
+        result = diff_file_lists(self.efu, saved, str(self.tree), hash_method="md5")
+        changes = {Path(item["filename"]).name: item["changes"] for item in result["modified"]}
+        self.assertEqual(changes["touch.txt"], ["date_modified"])
+        self.assertEqual(changes["keep.txt"], ["date_modified"])
+
+    def test_listing_saved_with_hashes(self):
+        saved = self._save("hashed.ndjson", "ndjson", list(iter_with_hashes(self.efu, self.efu.iter_file_list(str(self.tree)), "md5")))
+        self._change_tree()
+        (self.tree / "keep.txt").write_text("KEEP")
+
+        efu = CountingFileManager()
+        result = diff_file_lists(efu, saved, str(self.tree), hash_method="md5")
+        changes = {Path(item["filename"]).name: item["changes"] for item in result["modified"]}
+        self.assertNotIn("touch.txt", changes)
+        self.assertIn("hash", changes["keep.txt"])
+        # Only same-size files are hashed, and only on the live side
+        self.assertEqual(sorted(efu.hashed), ["inner.txt", "keep.txt", "touch.txt"])
+
+    def test_live_side_is_not_hashed_without_saved_hash(self):
+        saved = self._save("plain.ndjson", "ndjson")
+        self._change_tree()
+        efu = CountingFileManager()
+        result = diff_file_lists(efu, str(self.tree), saved, hash_method="md5")
+        changes = {Path(item["filename"]).name: item["changes"] for item in result["modified"]}
+        self.assertEqual(changes["touch.txt"], ["date_modified"])
+        self.assertEqual(efu.hashed, [])
+
+    def test_invalid_source_raises(self):
+        with self.assertRaises(ValueError):
+            diff_file_lists(self.efu, "/path/to/nonexistent", str(self.tree))
+        with self.assertRaises(ValueError):
+            diff_file_lists(self.efu, str(self.tree), str(self.tree), hash_method="crc32")
+        saved = self._save("plain.ndjson", "ndjson")
+        with self.assertRaises(ValueError):
+            diff_file_lists(self.efu, saved, saved, hash_method="sha1")
+
+
+if __name__ == "__main__":
+    unittest.main()
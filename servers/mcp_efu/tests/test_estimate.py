@@ -0,0 +1,90 @@
+import shutil
+import sys
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.estimate import estimate_tree
+
+
+class TestEstimateTree(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_estimate"
+        self.test_dir.mkdir(exist_ok=True)
+        # A uniform tree: 3 directories per level, 2 levels deep, 2 files per directory
+        for a in range(3):
+            for b in range(3):
+                leaf = self.test_dir / f"d{a}" / f"e{b}"
+                leaf.mkdir(parents=True, exist_ok=True)
+                (leaf / "x.txt").write_text("abcd")
+                (leaf / "y.py").write_text("ab")
+        self.efu = EfuFileManager()
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_small_tree_is_exact(self):
+        result = estimate_tree(self.efu, str(self.test_dir), time_budget=5)
+        self.assertTrue(result["exact"])
+        self.assertFalse(result["partial"])
+        self.assertEqual(result["directories_read"], 13)
+        self.assertEqual(result["files"], {"estimate": 18, "low": 18, "high": 18})
+        self.assertEqual(result["dirs"]["estimate"], 13)
+        self.assertEqual(result["bytes"]["estimate"], 54)
+        self.assertEqual(result["extensions"], {".py": 9, ".txt": 9})
+
+    def test_single_probe_is_unbiased_on_uniform_tree(self):
+        result = estimate_tree(self.efu, str(self.test_dir), max_probes=1, seed=1)
+        self.assertFalse(result["exact"])
+        self.assertEqual(result["probes"], 1)
+        self.assertEqual(result["files"], {"estimate": 18, "low": None, "high": None})
+        self.assertEqual(result["bytes"]["estimate"], 54)
+        self.assertEqual(result["extensions"], {".py": 9, ".txt": 9})
+
+    def test_interval_is_bounded_by_directories_read(self):
+        for index in range(20):
+            (self.test_dir / "d0" / "e0" / f"extra_{index}.dat").write_bytes(b"z" * 10)
+        result = estimate_tree(self.efu, str(self.test_dir), max_probes=3, seed=7)
+        self.assertFalse(result["exact"])
+        files = result["files"]
+        # The directories read so far bound the interval from below
+        self.assertGreaterEqual(files["low"], 2)
+        self.assertLessEqual(files["low"], files["estimate"])
+        self.assertLessEqual(files["estimate"], files["high"])
+
+    def test_large_directory_is_sampled_within_budget(self):
+        large = self.test_dir / "large"
+        large.mkdir()
+        for index in range(2000):
+            (large / f"f{index}.bin").write_bytes(b"abc")
+        result = estimate_tree(self.efu, str(large), time_budget=1e-6, seed=3)
+        self.assertTrue(result["partial"])
+        self.assertFalse(result["exact"])
+        # Every file is counted by name; the sizes of those not stat'ed are estimated
+        self.assertEqual(result["files"]["estimate"], 2000)
+        self.assertEqual(result["extensions"], {".bin": 2000})
+        self.assertEqual(result["bytes"]["estimate"], 6000)
+        self.assertGreaterEqual(result["bytes"]["low"], 3 * 32)
+        self.assertLess(result["bytes"]["low"], 6000)
+        self.assertIsNone(result["bytes"]["high"])
+
+        result = estimate_tree(self.efu, str(large), time_budget=30)
+        self.assertFalse(result["partial"])
+        self.assertEqual(result["bytes"], {"estimate": 6000, "low": 6000, "high": 6000})
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            estimate_tree(self.efu, str(self.test_dir / "missing"))
+        with self.assertRaises(ValueError):
+            estimate_tree(self.efu, str(self.test_dir), time_budget=0)
+        with self.assertRaises(ValueError):
+            estimate_tree(self.efu, str(self.test_dir), max_probes=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import unittest
+from contextlib import closing
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.federation import Backend, Federation, parse_backend
+
+
+def find_free_port():
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestRouting(unittest.TestCase):
+    def test_parse_backend(self):
+        self.assertEqual(parse_backend("fs1:8765=/srv/a,/home/"), ("fs1:8765", ["/srv/a", "/home"]))
+        for spec in ("fs1:8765", "fs1:8765=", "fs1:8765=relative", "fs1=/srv"):
+            with self.assertRaises(ValueError):
+                parse_backend(spec)
+
+    def test_longest_root_wins(self):
+        a = Backend("127.0.0.1:1", ["/srv"])
+        b = Backend("127.0.0.1:2", ["/srv/b", "/home"])
+        federation = Federation([a, b])
+        self.assertIs(federation.route("/srv/a/x"), a)
+        self.assertIs(federation.route("/srv/b"), b)
+        self.assertIs(federation.route("/srv/b/../a"), a)
+        self.assertIs(federation.route("/srv/bb"), a)
+        self.assertIs(federation.route("/home/user"), b)
+        with self.assertRaises(ValueError):
+            federation.route("/var")
+
+
+class TestFederatedServer(unittest.TestCase):
+    def setUp(self):
+        try:
+            self.ports = [find_free_port() for _ in range(3)]
+        except PermissionError:
+            self.skipTest("TCP sockets not permitted in this environment.")
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_federation"
+        self.roots = [self.test_dir / "node_a", self.test_dir / "node_b"]
+        for index, root in enumerate(self.roots):
+            (root / "sub").mkdir(parents=True, exist_ok=True)
+            (root / "file.txt").write_bytes(b"x" * (10 + index))
+            (root / "sub" / "big.bin").write_bytes(b"y" * (1000 * (index + 1)))
+
+        self.env = os.environ.copy()
+        package_root = PROJECT_ROOT / "servers" / "mcp_efu"
+        self.env["PYTHONPATH"] = str(package_root) + os.pathsep + self.env.get("PYTHONPATH", "")
+        self.processes = []
+        for index, port in enumerate(self.ports[:2]):
+            self._start([
+                "--transport", "tcp", "--host", "127.0.0.1", "--port", str(port),
+                "--jobs-dir", str(self.test_dir / f"jobs_{index}"),
+            ], port)
+        backends = []
+        for root, port in zip(self.roots, self.ports[:2]):
+            backends += ["--backend", f"127.0.0.1:{port}={root}"]
+        self._start(["--transport", "tcp", "--host", "127.0.0.1", "--port", str(self.ports[2]), "--backend-pool", "2", *backends], self.ports[2])
+
+    def tearDown(self):
+        for process in self.processes:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait(timeout=5)
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _start(self, args, port):
+        process = subprocess.Popen(
+            [sys.executable, "-m", "mcp_efu", *args],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=self.env,
+        )
+        self.processes.append(process)
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.5) as sock:
+                    with sock.makefile("r", encoding="utf-8") as f:
+                        if f.readline():
+                            return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f"Server on port {port} did not start.")
+
+    def _call(self, requests):
+        responses = []
+        with socket.create_connection(("127.0.0.1", self.ports[2]), timeout=10) as sock:
+            with sock.makefile("rw", encoding="utf-8") as f:
+                hello = json.loads(f.readline())
+                self.assertEqual(hello["method"], "server/hello")
+                for index, (method, params) in enumerate(requests):
+                    f.write(json.dumps({"jsonrpc": "2.0", "method": method, "params": params, "id": index}) + "\n")
+                    f.flush()
+                    response = json.loads(f.readline())
+                    self.assertEqual(response["id"], index)
+                    responses.append(response)
+        return responses
+
+    def test_routing_and_sorted_merge(self):
+        single, hashed, merged, unowned, nodes = self._call([
+            ("get_file_list", {"path": str(self.roots[1])}),
+            ("get_md5_hash", [str(self.roots[0] / "file.txt")]),
+            ("get_file_list", {"paths": [str(self.roots[0]), str(self.roots[1])], "sort": "size"}),
+            ("get_file_list", {"path": "/not/owned"}),
+            ("federation/nodes", None),
+        ])
+        self.assertEqual(len(single["result"]), 4)
+        self.assertTrue(all(e["filename"].startswith(str(self.roots[1])) for e in single["result"]))
+        self.assertEqual(len(hashed["result"]["hash"]), 32)
+
+        entries = merged["result"]["entries"]
+        self.assertEqual(merged["result"]["errors"], [])
+        self.assertEqual(len(entries), 8)
+        sizes = [entry["size"] for entry in entries]
+        self.assertEqual(sizes, sorted(sizes))
+        self.assertEqual(sizes[-2:], [1000, 2000])
+
+        self.assertEqual(unowned["error"]["code"], -32000)
+        self.assertIn("No backend owns", unowned["error"]["message"])
+        stats = {node["node"]: node for node in nodes["result"]["nodes"]}
+        self.assertEqual(stats[f"127.0.0.1:{self.ports[0]}"]["failures"], 0)
+        self.assertLessEqual(stats[f"127.0.0.1:{self.ports[0]}"]["open_connections"], 2)
+
+    def test_failed_node_is_reported(self):
+        self.processes[1].terminate()
+        self.processes[1].wait(timeout=5)
+        merged, single = self._call([
+            ("get_file_list", {"paths": [str(self.roots[0]), str(self.roots[1])]}),
+            ("get_file_list", [str(self.roots[1])]),
+        ])
+        self.assertEqual(len(merged["result"]["entries"]), 4)
+        [error] = merged["result"]["errors"]
+        self.assertEqual(error["path"], str(self.roots[1]))
+        self.assertEqual(error["node"], f"127.0.0.1:{self.ports[1]}")
+        self.assertIn("unavailable", single["error"]["message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
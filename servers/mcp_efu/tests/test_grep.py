@@ -0,0 +1,102 @@
+import shutil
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu import grep
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.grep import GrepPool, grep_files, iter_grep, make_path_filter
+
+
+class TestGrepFiles(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_grep"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "src").mkdir(exist_ok=True)
+        (self.test_dir / "src" / "app.py").write_text("import os\n\ndef main():\n    return os.getcwd()  # main\n")
+        (self.test_dir / "src" / "notes.txt").write_text("TODO: main loop\r\nnothing here\r\n")
+        (self.test_dir / "data.bin").write_bytes(b"\0\1main\0")
+        (self.test_dir / "empty.py").write_text("")
+        self.efu = EfuFileManager()
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_finds_matching_lines(self):
+        result = grep_files(self.efu, str(self.test_dir), r"main")
+        files = {Path(item["filename"]).name: item["matches"] for item in result["files"]}
+        self.assertEqual(
+            files["app.py"],
+            [{"line": 3, "text": "def main():"}, {"line": 4, "text": "    return os.getcwd()  # main"}],
+        )
+        self.assertEqual(files["notes.txt"], [{"line": 1, "text": "TODO: main loop"}])
+        self.assertEqual(result["matches"], 3)
+        self.assertEqual(result["files_searched"], 2)
+        self.assertEqual(result["binary_files_skipped"], 1)
+        self.assertFalse(result["truncated"])
+
+    def test_include_exclude_and_ignore_case(self):
+        result = grep_files(self.efu, str(self.test_dir), r"^todo", include=["*.txt", "src/*.py"], ignore_case=True)
+        self.assertEqual([Path(item["filename"]).name for item in result["files"]], ["notes.txt"])
+        result = grep_files(self.efu, str(self.test_dir), r"main", exclude=["src/*.py"])
+        self.assertEqual([Path(item["filename"]).name for item in result["files"]], ["notes.txt"])
+
+    def test_match_caps(self):
+        result = grep_files(self.efu, str(self.test_dir), r"main", max_matches_per_file=1)
+        self.assertTrue(result["truncated"])
+        self.assertEqual(result["matches"], 2)
+        results = list(iter_grep(self.efu, str(self.test_dir), r"main", max_matches=1))
+        self.assertEqual(sum(len(item["matches"]) for item in results), 1)
+        self.assertTrue(results[-1]["truncated"])
+
+    def test_invalid_pattern_raises(self):
+        with self.assertRaises(ValueError):
+            grep_files(self.efu, str(self.test_dir), r"(unclosed")
+        with self.assertRaises(ValueError):
+            grep_files(self.efu, str(self.test_dir / "missing"), r"main")
+
+    def test_process_pool_gives_same_results(self):
+        for index in range(40):
+            (self.test_dir / f"gen_{index:02}.py").write_text(f"x = {index}\nprint('main {index}')\n")
+        serial = grep_files(self.efu, str(self.test_dir), r"main", workers=1)
+        with mock.patch.object(grep, "_PARALLEL_MIN_FILES", 8), mock.patch.object(grep, "_BATCH_FILES", 4):
+            parallel = grep_files(self.efu, str(self.test_dir), r"main", workers=2)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(serial["matches"], 43)
+
+    def test_pool_is_reused_across_searches(self):
+        for index in range(40):
+            (self.test_dir / f"gen_{index:02}.py").write_text(f"x = {index}\nprint('main {index}')\n")
+        serial = grep_files(self.efu, str(self.test_dir), r"main", workers=1)
+        pool = GrepPool(workers=2)
+        self.addCleanup(pool.shutdown)
+        with mock.patch.object(grep, "_PARALLEL_MIN_FILES", 8), mock.patch.object(grep, "_BATCH_FILES", 4):
+            self.assertEqual(grep_files(self.efu, str(self.test_dir), r"main", pool=pool), serial)
+            executor = pool.executor()
+            processes = set(executor._processes)
+            self.assertEqual(grep_files(self.efu, str(self.test_dir), r"print", pool=pool)["matches"], 40)
+        # The second search ran in the same pool, whose processes were kept
+        self.assertIs(pool.executor(), executor)
+        self.assertTrue(processes)
+        self.assertLessEqual(processes, set(executor._processes))
+
+        pool.shutdown()
+        with self.assertRaises(RuntimeError):
+            pool.executor()
+
+    def test_path_filter(self):
+        accept = make_path_filter("/root", include=["*.py", "docs/*"], exclude=["test_*"])
+        self.assertTrue(accept("/root/pkg/mod.py"))
+        self.assertTrue(accept("/root/docs/index.md"))
+        self.assertFalse(accept("/root/pkg/test_mod.py"))
+        self.assertFalse(accept("/root/README.md"))
+
+
+if __name__ == "__main__":
+    unittest.main()
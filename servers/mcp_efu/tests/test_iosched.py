@@ -0,0 +1,149 @@
+import shutil
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.iosched import IoScheduler, TokenBucket, INTERACTIVE, BACKGROUND
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate_is_enforced_after_burst(self):
+        bucket = TokenBucket(rate=1000, burst=100)
+        start = time.monotonic()
+        for _ in range(30):
+            bucket.consume(10)
+        # 300 tokens with 100 available up front take at least 0.2 s
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_consume_without_wait_only_adds_debt(self):
+        bucket = TokenBucket(rate=100)
+        self.assertEqual(bucket.consume(200, wait=False), 0.0)
+        # The next waiting consumer pays for the debt
+        self.assertGreater(bucket.consume(1), 0.5)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestIoScheduler(unittest.TestCase):
+    def test_submit_returns_result_and_exception(self):
+        scheduler = IoScheduler(interactive_workers=2, background_workers=1)
+        self.addCleanup(scheduler.shutdown)
+        self.assertEqual(scheduler.submit(sum, [1, 2, 3]).result(timeout=5), 6)
+        with self.assertRaises(ZeroDivisionError):
+            scheduler.submit(lambda: 1 / 0, priority=BACKGROUND).result(timeout=5)
+        with self.assertRaises(ValueError):
+            scheduler.submit(sum, [], priority="urgent")
+
+    def test_interactive_work_does_not_wait_for_background(self):
+        scheduler = IoScheduler(interactive_workers=1, background_workers=1)
+        self.addCleanup(scheduler.shutdown)
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(10)
+
+        blocked = scheduler.submit(block, priority=BACKGROUND)
+        queued = scheduler.submit(lambda: None, priority=BACKGROUND)
+        try:
+            self.assertTrue(started.wait(5))
+            self.assertEqual(scheduler.submit(scheduler.current_priority).result(timeout=5), INTERACTIVE)
+            stats = scheduler.stats()
+            self.assertEqual(stats["classes"][BACKGROUND]["running"], 1)
+            self.assertEqual(stats["classes"][BACKGROUND]["queued"], 1)
+            self.assertEqual(stats["queue_depth"], 1)
+        finally:
+            release.set()
+        blocked.result(timeout=5)
+        queued.result(timeout=5)
+        self.assertEqual(scheduler.queue_depth(), 0)
+
+    def test_shutdown_finishes_queued_work_and_stops_workers(self):
+        scheduler = IoScheduler(interactive_workers=1, background_workers=1)
+        release = threading.Event()
+        blocked = scheduler.submit(release.wait, 10)
+        queued = scheduler.submit(sum, [1, 2])
+        background = scheduler.submit(sum, [3], priority=BACKGROUND)
+        workers = [thread for pool in scheduler._pools.values() for thread in pool.threads]
+        release.set()
+        scheduler.shutdown()
+        self.assertTrue(blocked.result(timeout=0))
+        self.assertEqual(queued.result(timeout=0), 3)
+        self.assertEqual(background.result(timeout=0), 3)
+        self.assertFalse(any(thread.is_alive() for thread in workers))
+        with self.assertRaises(RuntimeError):
+            scheduler.submit(sum, [])
+
+    def test_shutdown_can_cancel_queued_work(self):
+        scheduler = IoScheduler(interactive_workers=1, background_workers=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(10)
+
+        blocked = scheduler.submit(block)
+        self.assertTrue(started.wait(5))
+        queued = scheduler.submit(sum, [1, 2])
+        scheduler.shutdown(wait=False, cancel_futures=True)
+        self.assertTrue(queued.cancelled())
+        release.set()
+        blocked.result(timeout=5)
+        scheduler.shutdown()
+
+    def test_background_work_is_throttled(self):
+        scheduler = IoScheduler(max_iops=200)
+        self.addCleanup(scheduler.shutdown)
+
+        def charge_ops():
+            for _ in range(300):
+                scheduler.charge(ops=1)
+            return scheduler.current_priority()
+
+        start = time.monotonic()
+        self.assertEqual(scheduler.submit(charge_ops, priority=BACKGROUND).result(timeout=10), BACKGROUND)
+        self.assertGreaterEqual(time.monotonic() - start, 0.4)
+        throttled = scheduler.stats()["throttled_seconds"]
+        self.assertGreater(throttled, 0)
+
+        # Interactive work uses up the budget but never sleeps for it
+        scheduler.submit(charge_ops).result(timeout=10)
+        self.assertEqual(scheduler.stats()["throttled_seconds"], throttled)
+        self.assertEqual(scheduler.stats()["ops"], 600)
+
+
+class TestSchedulerAccounting(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_iosched"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "sub").mkdir(exist_ok=True)
+        (self.test_dir / "sub" / "data.bin").write_bytes(b"x" * 20000)
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_scan_and_hash_are_charged(self):
+        scheduler = IoScheduler()
+        self.addCleanup(scheduler.shutdown)
+        manager = EfuFileManager(scheduler)
+        self.assertEqual(len(manager.get_file_list(str(self.test_dir))), 3)
+        # Two directory listings and three stats
+        self.assertEqual(scheduler.stats()["ops"], 5)
+        manager.get_sha1_hash(str(self.test_dir / "sub" / "data.bin"))
+        self.assertEqual(scheduler.stats()["bytes"], 20000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import shutil
+import sys
+import time
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.jobs import JobManager, JOB_FILE, CHECKPOINT_FILE, RESULTS_FILE
+
+
+class TestJobManager(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_jobs"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "a.txt").write_text("hello")
+        (self.test_dir / "sub").mkdir(exist_ok=True)
+        (self.test_dir / "sub" / "b.txt").write_text("world")
+        (self.test_dir / "sub" / "deeper").mkdir(exist_ok=True)
+        (self.test_dir / "sub" / "deeper" / "c.txt").write_text("!")
+        self.jobs_dir = PROJECT_ROOT / "test_temp_dir_for_jobs_state"
+        self.expected = {entry["filename"] for entry in EfuFileManager().get_file_list(str(self.test_dir))}
+
+    def tearDown(self):
+        for path in (self.test_dir, self.jobs_dir):
+            if path.exists():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _manager(self, **kwargs):
+        manager = JobManager(str(self.jobs_dir), **kwargs)
+        self.addCleanup(manager.scheduler.shutdown)
+        return manager
+
+    def _wait(self, manager, job_id, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status = manager.job_status(job_id)
+            if status["status"] not in ("queued", "running"):
+                return status
+            time.sleep(0.02)
+        self.fail(f"Job {job_id} did not finish.")
+
+    def _all_results(self, manager, job_id):
+        entries = []
+        offset = 0
+        while offset is not None:
+            page = manager.job_results(job_id, offset, 2)
+            entries.extend(page["entries"])
+            offset = page["next_offset"]
+        return entries
+
+    def test_scan_job(self):
+        manager = self._manager(checkpoint_interval=0)
+        job_id = manager.start_scan_job(str(self.test_dir))["job_id"]
+        status = self._wait(manager, job_id)
+        self.assertEqual(status["status"], "completed")
+        self.assertEqual(status["results"], len(self.expected))
+        filenames = [entry["filename"] for entry in self._all_results(manager, job_id)]
+        self.assertEqual(len(filenames), len(self.expected))
+        self.assertEqual(set(filenames), self.expected)
+
+    def test_results_are_indexed_once(self):
+        manager = self._manager(checkpoint_interval=0)
+        job_id = manager.start_scan_job(str(self.test_dir))["job_id"]
+        manager.job_results(job_id, 0, 1)
+        self._wait(manager, job_id)
+        # The index read before the job ended was extended at its checkpoints
+        self.assertEqual(len(manager._jobs[job_id].offsets), len(self.expected) + 1)
+
+        # After a restart the finished job's rows are indexed from its last checkpoint
+        restarted = self._manager()
+        filenames = [entry["filename"] for entry in self._all_results(restarted, job_id)]
+        self.assertEqual(set(filenames), self.expected)
+        self.assertEqual(len(restarted._jobs[job_id].offsets), len(self.expected) + 1)
+
+    def test_hash_job_reports_errors_per_file(self):
+        manager = self._manager()
+        paths = [str(self.test_dir / "a.txt"), str(self.test_dir / "missing.txt")]
+        job_id = manager.start_hash_job(paths, hash_method="md5")["job_id"]
+        self.assertEqual(self._wait(manager, job_id)["status"], "completed")
+        rows = manager.job_results(job_id)["entries"]
+        self.assertEqual(rows[0]["hash"], "5d41402abc4b2a76b9719d911017c592")
+        self.assertIn("error", rows[1])
+
+    def test_interrupted_scan_resumes_from_checkpoint(self):
+        # State as left by a scan that was killed after listing the root
+        # directory, with one uncommitted row written after the checkpoint.
+        root = self.test_dir.resolve()
+        efu = EfuFileManager()
+        committed = [efu._make_entry(root, root.stat(), True)]
+        committed += [efu._make_entry(root / name, (root / name).stat(), (root / name).is_dir()) for name in ("a.txt", "sub")]
+        job_dir = self.jobs_dir / "interrupted"
+        job_dir.mkdir(parents=True)
+        payload = "".join(json.dumps(entry) + "\n" for entry in committed).encode()
+        (job_dir / RESULTS_FILE).write_bytes(payload + b'{"filename": "partial')
+        (job_dir / CHECKPOINT_FILE).write_text(json.dumps({
+            "frontier": [str(root / "sub")], "dirs_scanned": 1, "results_bytes": len(payload), "results": len(committed),
+        }))
+        (job_dir / JOB_FILE).write_text(json.dumps({
+            "job_id": "interrupted", "kind": "scan", "params": {"path": str(root)},
+            "status": "running", "created": time.time(), "updated": time.time(),
+        }))
+
+        manager = self._manager()
+        status = self._wait(manager, "interrupted")
+        self.assertEqual(status["status"], "completed")
+        filenames = [entry["filename"] for entry in self._all_results(manager, "interrupted")]
+        self.assertEqual(len(filenames), len(self.expected))
+        self.assertEqual(set(filenames), self.expected)
+
+    def test_invalid_requests(self):
+        manager = self._manager()
+        with self.assertRaises(ValueError):
+            manager.job_status("nope")
+        with self.assertRaises(ValueError):
+            manager.start_scan_job(str(self.test_dir / "missing"))
+        with self.assertRaises(ValueError):
+            manager.start_hash_job()
+        with self.assertRaises(ValueError):
+            manager.start_hash_job([str(self.test_dir / "a.txt")], hash_method="crc32")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import shutil
+import sys
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu import listing
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+
+
+class TestListingFormats(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_listing"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "a, with comma.txt").write_text("a")
+        (self.test_dir / 'quote".txt').write_text("q")
+        (self.test_dir / "sub").mkdir(exist_ok=True)
+        (self.test_dir / "sub" / "b.txt").write_text("b")
+        (self.test_dir / "sub-sibling").mkdir(exist_ok=True)
+        self.entries = EfuFileManager().get_file_list(str(self.test_dir))
+        self.out_dir = PROJECT_ROOT / "test_temp_dir_for_listing_out"
+        self.out_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        for path in (self.test_dir, self.out_dir):
+            if path.exists():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def test_round_trip_all_formats(self):
+        for fmt in listing.LISTING_FORMATS:
+            with self.subTest(fmt=fmt):
+                path = self.out_dir / f"listing.{fmt}"
+                path.write_text(listing.dumps_listing(self.entries, fmt), encoding="utf-8", newline="")
+                self.assertEqual(list(listing.iter_listing(str(path))), self.entries)
+
+    def test_json_output_matches_json_dumps(self):
+        self.assertEqual(listing.dumps_listing(self.entries, "json"), json.dumps(self.entries, indent=2))
+        self.assertEqual(listing.dumps_listing([], "json"), json.dumps([], indent=2))
+
+    def test_format_detection_without_extension(self):
+        for fmt in listing.LISTING_FORMATS:
+            path = self.out_dir / f"listing_{fmt}"
+            path.write_text(listing.dumps_listing(self.entries, fmt), encoding="utf-8", newline="")
+            self.assertEqual(listing.detect_format(str(path)), fmt)
+
+    def test_name_order_scan_is_sorted(self):
+        entries = list(EfuFileManager().iter_file_list(str(self.test_dir), name_order=True))
+        keys = [listing.path_sort_key(entry["filename"]) for entry in entries]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(sorted(entries, key=lambda e: e["filename"]), sorted(self.entries, key=lambda e: e["filename"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
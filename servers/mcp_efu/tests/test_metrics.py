@@ -0,0 +1,172 @@
+import asyncio
+import shutil
+import sys
+import threading
+import types
+import unittest
+import urllib.request
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.metrics import MetricsRegistry, GAUGE, create_server_metrics, start_metrics_http_server
+from servers.mcp_efu.mcp_efu.profiling import check_profile_params, exclusive_profile, sample_stacks
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_counters_gauges_and_histograms(self):
+        metrics = MetricsRegistry()
+        metrics.counter("requests_total", "Requests.")
+        metrics.gauge("in_flight", "In flight.")
+        metrics.histogram("duration_seconds", "Duration.", buckets=(0.1, 1.0))
+        metrics.inc("requests_total", method="a")
+        metrics.inc("requests_total", 2, method="a")
+        metrics.inc("requests_total", method="b")
+        metrics.add("in_flight", 1)
+        for value in (0.05, 0.5, 0.5, 5.0):
+            metrics.observe("duration_seconds", value, method="a")
+        with self.assertRaises(KeyError):
+            metrics.inc("undeclared_total")
+
+        snapshot = metrics.snapshot()["metrics"]
+        self.assertEqual(
+            snapshot["requests_total"]["samples"],
+            [{"labels": {"method": "a"}, "value": 3}, {"labels": {"method": "b"}, "value": 1}],
+        )
+        self.assertEqual(snapshot["in_flight"]["samples"], [{"labels": {}, "value": 1}])
+        histogram = snapshot["duration_seconds"]["samples"][0]
+        self.assertEqual(histogram["count"], 4)
+        self.assertEqual(histogram["buckets"], {"0.1": 1, "1.0": 3, "+Inf": 4})
+        self.assertEqual(histogram["p50"], 1.0)
+        # Above the last bucket there is no upper bound
+        self.assertIsNone(histogram["p99"])
+
+    def test_prometheus_text(self):
+        metrics = MetricsRegistry()
+        metrics.counter("requests_total", "Requests.")
+        metrics.histogram("duration_seconds", "Duration.", buckets=(0.5,))
+        metrics.inc("requests_total", method='say "hi"')
+        metrics.observe("duration_seconds", 0.25)
+        metrics.register_collector(lambda: [("threads", GAUGE, "Threads.", {}, 3)])
+        text = metrics.prometheus_text()
+        self.assertIn("# TYPE requests_total counter\n", text)
+        self.assertIn('requests_total{method="say \\"hi\\""} 1\n', text)
+        self.assertIn('duration_seconds_bucket{le="0.5"} 1\n', text)
+        self.assertIn('duration_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn("duration_seconds_sum 0.25\n", text)
+        self.assertIn("duration_seconds_count 1\n", text)
+        self.assertIn("# TYPE threads gauge\nthreads 3\n", text)
+
+    def test_http_endpoint(self):
+        metrics = create_server_metrics()
+        metrics.inc("mcp_efu_requests_total", method="tools/list")
+        try:
+            server = start_metrics_http_server(metrics, "127.0.0.1", 0)
+        except PermissionError:
+            self.skipTest("TCP sockets not permitted in this environment.")
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+                body = response.read().decode()
+            self.assertIn('mcp_efu_requests_total{method="tools/list"} 1', body)
+            self.assertIn("mcp_efu_process_threads", body)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestCoreMetrics(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_metrics"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "a.txt").write_bytes(b"x" * 100)
+        (self.test_dir / "sub").mkdir(exist_ok=True)
+        (self.test_dir / "sub" / "b.txt").write_bytes(b"y" * 20)
+        self.metrics = create_server_metrics()
+        self.efu = EfuFileManager(metrics=self.metrics)
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _value(self, name, **labels):
+        for sample in self.metrics.snapshot()["metrics"][name]["samples"]:
+            if sample["labels"] == labels:
+                return sample["value"]
+        return None
+
+    def test_scan_and_hash_are_counted(self):
+        self.efu.get_file_list(str(self.test_dir))
+        self.efu.get_file_list(str(self.test_dir), sort="size")
+        self.assertEqual(self._value("mcp_efu_scanned_entries_total"), 8)
+        self.assertGreater(self._value("mcp_efu_scan_seconds_total"), 0)
+        self.efu.get_md5_hash(str(self.test_dir / "a.txt"))
+        self.efu.get_git_blob_hash(str(self.test_dir / "sub" / "b.txt"))
+        self.assertEqual(self._value("mcp_efu_hashed_bytes_total", algorithm="md5"), 100)
+        self.assertEqual(self._value("mcp_efu_hashed_bytes_total", algorithm="sha1"), 20)
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+    def test_requests_and_event_loop_lag_are_recorded(self):
+        from servers.mcp_efu.mcp_efu.server import MetricsMiddleware
+        from servers.mcp_efu.mcp_efu.transport import LOOP_LAG_INTERVAL_SECONDS
+
+        metrics = create_server_metrics()
+        middleware = MetricsMiddleware(metrics)
+        context = types.SimpleNamespace(method="tools/list", message=None)
+
+        async def call_next(context):
+            return "result"
+
+        async def run():
+            self.assertEqual(await middleware.on_request(context, call_next), "result")
+            await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS * 3)
+            middleware._lag_monitor.cancel()
+
+        asyncio.run(run())
+        samples = {name: metric["samples"] for name, metric in metrics.snapshot()["metrics"].items()}
+        self.assertEqual(samples["mcp_efu_requests_total"][0]["value"], 1)
+        self.assertGreater(samples["mcp_efu_event_loop_lag_seconds"][0]["count"], 0)
+
+
+class TestProfiling(unittest.TestCase):
+    def test_sample_stacks_sees_other_threads(self):
+        stop = threading.Event()
+
+        def busy_loop_for_profile():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=busy_loop_for_profile, name="busy")
+        thread.start()
+        try:
+            result = sample_stacks(0.2, interval=0.005, limit=50)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertGreater(result["samples"], 0)
+        self.assertIn("busy", result["threads"])
+        functions = [row["function"] for row in result["cumulative"]]
+        self.assertTrue(any("busy_loop_for_profile" in name for name in functions))
+
+    def test_only_one_profile_at_a_time(self):
+        with exclusive_profile():
+            with self.assertRaises(ValueError):
+                with exclusive_profile():
+                    pass
+        with exclusive_profile():
+            pass
+
+    def test_invalid_params(self):
+        with self.assertRaises(ValueError):
+            check_profile_params(0, "sampling", 0.01, 10)
+        with self.assertRaises(ValueError):
+            check_profile_params(1, "perf", 0.01, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import sys
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.pagination import SnapshotStore
+
+
+def make_file_list(count):
+    return [
+        {
+            "filename": f"/data/file{i:05d}.txt",
+            "size": i,
+            "date_modified": 133000000000000000 + i,
+            "date_created": 133000000000000000,
+            "attributes": 32,
+        }
+        for i in range(count)
+    ]
+
+
+class TestSnapshotStore(unittest.TestCase):
+    def test_pages_cover_listing_in_order(self):
+        store = SnapshotStore()
+        file_list = make_file_list(25)
+        page = store.first_page("/data", file_list, 10)
+        collected = list(page["entries"])
+        self.assertEqual(page["total"], 25)
+        while page["next_cursor"]:
+            page = store.next_page(page["next_cursor"], 10, "/data")
+            collected.extend(page["entries"])
+        self.assertEqual(collected, file_list)
+        # The snapshot is released once the last page has been served.
+        self.assertEqual(store.stats()["snapshots"], 0)
+
+    def test_pages_keep_directory_counts(self):
+        store = SnapshotStore()
+        file_list = make_file_list(5)
+        file_list[0].update(attributes=16, file_count=4, dir_count=0)
+        page = store.first_page("/data", file_list, 2)
+        collected = list(page["entries"])
+        while page["next_cursor"]:
+            page = store.next_page(page["next_cursor"], 2, "/data")
+            collected.extend(page["entries"])
+        # Only the directory has the counts; files are returned as they were
+        self.assertEqual(collected, file_list)
+
+    def test_single_page_does_not_hold_snapshot(self):
+        store = SnapshotStore()
+        page = store.first_page("/data", make_file_list(3), 10)
+        self.assertEqual(len(page["entries"]), 3)
+        self.assertIsNone(page["next_cursor"])
+        self.assertEqual(store.stats()["snapshots"], 0)
+
+    def test_expired_cursor_raises(self):
+        store = SnapshotStore(ttl=0)
+        page = store.first_page("/data", make_file_list(5), 2)
+        with self.assertRaises(ValueError):
+            store.next_page(page["next_cursor"], 2)
+
+    def test_memory_budget_evicts_oldest_snapshot(self):
+        probe = SnapshotStore()
+        probe.first_page("/data", make_file_list(100), 10)
+        one_snapshot = probe.stats()["bytes"]
+
+        store = SnapshotStore(max_bytes=int(one_snapshot * 1.5))
+        first = store.first_page("/data", make_file_list(100), 10)
+        store.first_page("/data", make_file_list(100), 10)
+        self.assertEqual(store.stats()["snapshots"], 1)
+        self.assertEqual(store.stats()["evictions"], 1)
+        with self.assertRaises(ValueError):
+            store.next_page(first["next_cursor"], 10)
+
+    def test_listing_over_budget_is_spilled_to_disk(self):
+        file_list = make_file_list(100)
+        file_list[0].update(filename="/data/caf\u00e9 \udcff.txt", file_count=3, dir_count=1)
+        store = SnapshotStore(max_bytes=1024)
+        page = store.first_page("/data", file_list, 30)
+        self.assertEqual(store.stats()["spills"], 1)
+        self.assertEqual(store.stats()["snapshots"], 1)
+        # Only the row offsets stay in memory
+        self.assertLess(store.stats()["bytes"], 1024)
+        collected = list(page["entries"])
+        while page["next_cursor"]:
+            page = store.next_page(page["next_cursor"], 30, "/data")
+            collected.extend(page["entries"])
+        self.assertEqual(collected, file_list)
+        self.assertEqual(store.stats()["snapshots"], 0)
+
+    def test_cursor_for_other_path_raises(self):
+        store = SnapshotStore()
+        page = store.first_page("/data", make_file_list(5), 2)
+        with self.assertRaises(ValueError):
+            store.next_page(page["next_cursor"], 2, "/elsewhere")
+
+    def test_invalid_page_size_raises(self):
+        store = SnapshotStore()
+        with self.assertRaises(ValueError):
+            store.first_page("/data", make_file_list(5), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import shutil
+import sys
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu import listing
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.reader import MappedListing, MappedListingPool
+
+
+class TestMappedListing(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_reader"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "a, with comma.txt").write_text("a")
+        (self.test_dir / "sub").mkdir(exist_ok=True)
+        (self.test_dir / "sub" / "b.txt").write_text("b")
+        (self.test_dir / "sub" / "c.log").write_text("c")
+        (self.test_dir / "sub-sibling").mkdir(exist_ok=True)
+        self.entries = EfuFileManager().get_file_list(str(self.test_dir))
+        self.out_dir = PROJECT_ROOT / "test_temp_dir_for_reader_out"
+        self.out_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        for path in (self.test_dir, self.out_dir):
+            if path.exists():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _save(self, fmt, entries=None):
+        path = self.out_dir / f"listing.{fmt}"
+        path.write_text(listing.dumps_listing(self.entries if entries is None else entries, fmt), encoding="utf-8", newline="")
+        return str(path)
+
+    def test_random_access_and_iteration(self):
+        for fmt in ("ndjson", "efu"):
+            with self.subTest(fmt=fmt), MappedListing(self._save(fmt)) as mapped:
+                self.assertEqual(len(mapped), len(self.entries))
+                self.assertEqual(list(mapped), self.entries)
+                self.assertEqual(mapped[-1], self.entries[-1])
+                with self.assertRaises(IndexError):
+                    mapped[len(self.entries)]
+
+    def test_iter_sorted(self):
+        for fmt in ("ndjson", "efu"):
+            with self.subTest(fmt=fmt), MappedListing(self._save(fmt)) as mapped:
+                keys = [listing.path_sort_key(entry["filename"]) for entry in mapped.iter_sorted()]
+                self.assertEqual(keys, sorted(keys))
+                self.assertEqual(len(keys), len(self.entries))
+
+    def test_search_pages_through_matches(self):
+        with MappedListing(self._save("ndjson")) as mapped:
+            collected = []
+            offset = 0
+            while offset is not None:
+                page = mapped.search("*.txt", offset, 1)
+                collected.extend(entry["filename"] for entry in page["entries"])
+                offset = page["next_offset"]
+            self.assertEqual(sorted(Path(name).name for name in collected), ["a, with comma.txt", "b.txt"])
+
+    def test_empty_listing(self):
+        with MappedListing(self._save("ndjson", [])) as mapped:
+            self.assertEqual(len(mapped), 0)
+            self.assertEqual(mapped.search()["entries"], [])
+
+    def test_json_is_rejected(self):
+        with self.assertRaises(ValueError):
+            MappedListing(self._save("json"))
+
+    def test_pool_reopens_changed_listing(self):
+        pool = MappedListingPool()
+        path = self._save("efu")
+        first = pool.open(path)
+        self.assertIs(pool.open(path), first)
+        self._save("efu", self.entries[:1])
+        result = pool.read(path)
+        self.assertEqual(result["total"], 1)
+        self.assertEqual(result["listing"], path)
+
+
+if __name__ == "__main__":
+    unittest.main()
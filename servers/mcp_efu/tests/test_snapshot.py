@@ -0,0 +1,89 @@
+import io
+import shutil
+import sys
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu import listing
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.reader import SnapshotListing, MappedListingPool
+from servers.mcp_efu.mcp_efu.snapshot import write_snapshot, encode_varint, decode_varint
+
+
+class TestSnapshotFormat(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_snapshot"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "a, with comma.txt").write_text("a")
+        (self.test_dir / "ünïcode.txt").write_text("u")
+        (self.test_dir / "sub").mkdir(exist_ok=True)
+        for i in range(40):
+            (self.test_dir / "sub" / f"file{i:02}.txt").write_text("x" * i)
+        (self.test_dir / "sub-sibling").mkdir(exist_ok=True)
+        self.entries = list(EfuFileManager().iter_file_list(str(self.test_dir), name_order=True))
+        self.out_dir = PROJECT_ROOT / "test_temp_dir_for_snapshot_out"
+        self.out_dir.mkdir(exist_ok=True)
+        self.path = self.out_dir / "listing.efusnap"
+
+    def tearDown(self):
+        for path in (self.test_dir, self.out_dir):
+            if path.exists():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _save(self, entries, **kwargs):
+        with open(self.path, "wb") as handle:
+            return write_snapshot(entries, handle, **kwargs)
+
+    def test_varint_round_trip(self):
+        for value in (0, 1, 127, 128, 300, 2 ** 35):
+            self.assertEqual(decode_varint(encode_varint(value), 0), (value, len(encode_varint(value))))
+
+    def test_round_trip_and_random_access(self):
+        for interval in (1, 4, 16):
+            with self.subTest(restart_interval=interval):
+                self.assertEqual(self._save(self.entries, restart_interval=interval), len(self.entries))
+                with SnapshotListing(str(self.path)) as snapshot:
+                    self.assertEqual(list(snapshot), self.entries)
+                    self.assertEqual([snapshot[i] for i in reversed(range(len(snapshot)))], self.entries[::-1])
+                    for index, entry in enumerate(self.entries):
+                        self.assertEqual(snapshot.find(entry["filename"]), index)
+                    self.assertIsNone(snapshot.find(str(self.test_dir / "missing")))
+
+    def test_lossless_conversion_to_text_formats(self):
+        self._save(self.entries)
+        self.assertEqual(listing.detect_format(str(self.path)), "snapshot")
+        snapshot_entries = list(listing.iter_listing(str(self.path)))
+        for fmt in ("json", "efu"):
+            with self.subTest(fmt=fmt):
+                self.assertEqual(listing.dumps_listing(snapshot_entries, fmt), listing.dumps_listing(self.entries, fmt))
+
+    def test_unsorted_entries_are_rejected(self):
+        with self.assertRaises(ValueError):
+            write_snapshot(self.entries[::-1], io.BytesIO())
+
+    def test_fields_a_snapshot_cannot_hold_are_rejected(self):
+        for extra in ({"hash": "0" * 40}, {"file_count": 1, "dir_count": 0}):
+            with self.subTest(fields=sorted(extra)):
+                entries = [dict(self.entries[0], **extra)] + self.entries[1:]
+                with self.assertRaises(ValueError):
+                    write_snapshot(entries, io.BytesIO())
+
+    def test_truncated_snapshot_is_rejected(self):
+        self._save(self.entries)
+        self.path.write_bytes(self.path.read_bytes()[:-3])
+        with self.assertRaises(ValueError):
+            SnapshotListing(str(self.path))
+
+    def test_pool_reads_snapshots(self):
+        self._save(self.entries)
+        result = MappedListingPool().read(str(self.path), "*.txt", 0, 5)
+        self.assertEqual(len(result["entries"]), 5)
+        self.assertEqual(result["total"], len(self.entries))
+
+
+if __name__ == "__main__":
+    unittest.main()
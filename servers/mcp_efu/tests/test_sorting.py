@@ -0,0 +1,77 @@
+import random
+import shutil
+import sys
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from servers.mcp_efu.mcp_efu.core import EfuFileManager
+from servers.mcp_efu.mcp_efu.listing import path_sort_key
+from servers.mcp_efu.mcp_efu.sorting import external_sort, sort_key_function, SORT_KEYS
+
+
+class TestExternalSort(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.entries = [
+            {
+                "filename": f"/root/dir{rng.randrange(10)}/file{index}",
+                "size": rng.randrange(50),
+                "date_modified": rng.randrange(1000),
+                "date_created": 0,
+                "attributes": 32,
+            }
+            for index in range(500)
+        ]
+
+    def test_in_memory_and_spilled_sorts_agree(self):
+        for sort in SORT_KEYS:
+            expected = sorted(self.entries, key=sort_key_function(sort))
+            # A budget of one byte spills every entry into its own run, which
+            # also exercises merging runs beyond the fan-in limit.
+            for budget in (1 << 30, 4096, 1):
+                with self.subTest(sort=sort, budget=budget):
+                    self.assertEqual(list(external_sort(iter(self.entries), sort, budget)), expected)
+
+    def test_ties_are_broken_by_path(self):
+        entries = [{"filename": name, "size": 1} for name in ("/b", "/a/c", "/a-c")]
+        self.assertEqual([entry["filename"] for entry in external_sort(entries, "size", 1)], ["/a/c", "/a-c", "/b"])
+
+    def test_unknown_sort_is_rejected(self):
+        with self.assertRaises(ValueError):
+            list(external_sort(self.entries, "color"))
+
+
+class TestSortedScan(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = PROJECT_ROOT / "test_temp_dir_for_sorting"
+        self.test_dir.mkdir(exist_ok=True)
+        (self.test_dir / "big.bin").write_bytes(b"x" * 300)
+        (self.test_dir / "sub").mkdir(exist_ok=True)
+        (self.test_dir / "sub" / "small.txt").write_text("a")
+        (self.test_dir / "sub-medium.txt").write_text("m" * 20)
+
+    def tearDown(self):
+        if self.test_dir.exists():
+            shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_scan_sort_orders(self):
+        manager = EfuFileManager()
+        by_name = manager.get_file_list(str(self.test_dir), sort="name")
+        keys = [path_sort_key(entry["filename"]) for entry in by_name]
+        self.assertEqual(keys, sorted(keys))
+
+        by_size = manager.get_file_list(str(self.test_dir), sort="size")
+        self.assertEqual(Path(by_size[-1]["filename"]).name, "big.bin")
+        self.assertEqual([entry["size"] for entry in by_size], sorted(entry["size"] for entry in by_name))
+
+    def test_invalid_sort_is_rejected_eagerly(self):
+        with self.assertRaises(ValueError):
+            EfuFileManager().iter_file_list(str(self.test_dir), sort="color")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+# Add the project root to the path to allow running the module with -m
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# Modules that only the server modes need; the startup time threshold is checked by benchmarks/bench_startup.py
+SERVER_MODULES = ("fastmcp", "mcp", "anyio", "asyncio", "mcp_efu.server", "mcp_efu.transport")
+
+
+class TestCliStartup(unittest.TestCase):
+    def setUp(self):
+        self.env = os.environ.copy()
+        package_root = PROJECT_ROOT / "servers" / "mcp_efu"
+        self.env["PYTHONPATH"] = str(package_root) + os.pathsep + self.env.get("PYTHONPATH", "")
+
+    def test_cli_does_not_import_server_modules(self):
+        probe = (
+            "import sys, json, mcp_efu.main;"
+            "print(json.dumps([m for m in ('fastmcp', 'mcp', 'anyio') if m in sys.modules]))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", probe], capture_output=True, text=True, check=True, env=self.env
+        )
+        self.assertEqual(json.loads(result.stdout), [])
+
+    def test_cli_scan_does_not_import_server_modules(self):
+        probe = (
+            "import sys, json;"
+            "from mcp_efu.main import main;"
+            "sys.argv = ['mcp_efu', sys.argv[1], '--output', sys.argv[2]];"
+            "main();"
+            f"print(json.dumps([m for m in {SERVER_MODULES!r} if m in sys.modules]))"
+        )
+        output = PROJECT_ROOT / "test_temp_file_for_startup.json"
+        try:
+            result = subprocess.run(
+                [sys.executable, "-c", probe, str(Path(__file__).resolve().parent), str(output)],
+                capture_output=True, text=True, check=True, env=self.env
+            )
+            self.assertTrue(json.loads(output.read_text(encoding="utf-8")))
+        finally:
+            output.unlink(missing_ok=True)
+        self.assertEqual(json.loads(result.stdout), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
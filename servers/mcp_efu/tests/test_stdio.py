@@ -94,7 +94,8 @@ class TestStdioServerMode(unittest.TestCase):
                 tool_names = {tool.name for tool in result.tools}
                 self.assertEqual(
                     tool_names,
-                    {"get_file_list", "get_md5_hash", "get_sha1_hash", "get_git_blob_hash"},
+                    {"get_file_list", "get_md5_hash", "get_sha1_hash", "get_git_blob_hash", "diff_file_lists", "read_file_list", "get_tree_summary", "estimate_tree", "grep_files",
+                     "start_scan_job", "start_hash_job", "job_status", "job_results", "cancel_job"},
                 )
 
         self._run_async(run)
@@ -117,6 +118,80 @@ class TestStdioServerMode(unittest.TestCase):
 
         self._run_async(run)
 
+    def test_stdio_get_file_list_pages(self):
+        async def run():
+            async with self._session() as session:
+                result = await session.call_tool(
+                    "get_file_list", {"path": str(self.test_dir), "page_size": 3}
+                )
+                page = self._content_to_json(result)
+                self.assertEqual(page["total"], 4)
+                self.assertEqual(len(page["entries"]), 3)
+                self.assertTrue(page["next_cursor"])
+
+                result = await session.call_tool(
+                    "get_file_list",
+                    {"path": str(self.test_dir), "page_size": 3, "cursor": page["next_cursor"]},
+                )
+                last = self._content_to_json(result)
+                self.assertEqual(len(last["entries"]), 1)
+                self.assertIsNone(last["next_cursor"])
+
+                filenames = {item["filename"] for item in page["entries"] + last["entries"]}
+                self.assertEqual(len(filenames), 4)
+
+        self._run_async(run)
+
+    def test_stdio_get_file_list_pages_with_dir_sizes(self):
+        async def run():
+            async with self._session() as session:
+                arguments = {"path": str(self.test_dir), "page_size": 1, "sort": "name", "dir_sizes": True}
+                page = self._content_to_json(await session.call_tool("get_file_list", arguments))
+                entries = list(page["entries"])
+                while page["next_cursor"]:
+                    result = await session.call_tool("get_file_list", dict(arguments, cursor=page["next_cursor"]))
+                    page = self._content_to_json(result)
+                    entries.extend(page["entries"])
+
+                by_name = {item["filename"]: item for item in entries}
+                root = by_name[str(self.test_dir.resolve())]
+                self.assertEqual((root["file_count"], root["dir_count"]), (2, 1))
+                subdir = by_name[str(self.subdir.resolve())]
+                self.assertEqual((subdir["file_count"], subdir["dir_count"]), (1, 0))
+                self.assertNotIn("file_count", by_name[str((self.test_dir / "server_file1.txt").resolve())])
+
+        self._run_async(run)
+
+    def test_stdio_progress_notifications(self):
+        async def run():
+            async with self._session() as session:
+                scan_reports = []
+                hash_reports = []
+
+                async def on_scan(progress, total, message):
+                    scan_reports.append((progress, total, message))
+
+                async def on_hash(progress, total, message):
+                    hash_reports.append((progress, total, message))
+
+                result = await session.call_tool(
+                    "get_file_list", {"path": str(self.test_dir)}, progress_callback=on_scan
+                )
+                self.assertEqual(len(self._content_to_json(result)), 4)
+                self.assertTrue(scan_reports)
+                self.assertEqual(scan_reports[-1][0], 4)
+                self.assertIn("0 directories pending", scan_reports[-1][2])
+
+                target = self.test_dir / "server_file1.txt"
+                size = target.stat().st_size
+                result = await session.call_tool(
+                    "get_md5_hash", {"path": str(target)}, progress_callback=on_hash
+                )
+                self.assertFalse(result.isError)
+                self.assertEqual(hash_reports[-1][:2], (size, size))
+
+        self._run_async(run)
+
     def test_stdio_invalid_path_error(self):
         async def run():
             async with self._session() as session:
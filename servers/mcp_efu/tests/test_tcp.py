@@ -51,10 +51,11 @@ class TestTcpServerMode(unittest.TestCase):
             (
                 "import asyncio, os;"
                 "from mcp_efu.core import EfuFileManager;"
+                "from mcp_efu.iosched import IoScheduler;"
                 "from mcp_efu.transport import start_tcp_server;"
                 "host=os.environ['MCP_EFU_TCP_HOST'];"
                 "port=int(os.environ['MCP_EFU_TCP_PORT']);"
-                "asyncio.run(start_tcp_server(host, port, EfuFileManager()))"
+                "asyncio.run(start_tcp_server(host, port, EfuFileManager(IoScheduler())))"
             ),
         ]
         self.server_process = subprocess.Popen(
@@ -166,6 +167,160 @@ class TestTcpServerMode(unittest.TestCase):
             self.fail(f"An exception occurred: {e}")
 
 
+    def test_tcp_get_file_list_sorted(self):
+        """Test that get_file_list honours the sort option over TCP."""
+        with socket.create_connection((self.host, self.port), timeout=5) as sock:
+            with sock.makefile('rw', encoding='utf-8') as f:
+                self._read_and_validate_server_hello(f)
+
+                request = {
+                    "jsonrpc": "2.0",
+                    "method": "get_file_list",
+                    "params": {"path": str(self.test_dir), "sort": "size"},
+                    "id": 3
+                }
+                f.write(json.dumps(request) + '\n')
+                f.flush()
+
+                response = json.loads(f.readline())
+                sizes = [item["size"] for item in response["result"]]
+                self.assertEqual(len(sizes), 4)
+                self.assertEqual(sizes, sorted(sizes))
+
+    def test_tcp_grep_files(self):
+        """Test that grep_files returns matching lines over TCP."""
+        with socket.create_connection((self.host, self.port), timeout=5) as sock:
+            with sock.makefile('rw', encoding='utf-8') as f:
+                self._read_and_validate_server_hello(f)
+
+                request = {
+                    "jsonrpc": "2.0",
+                    "method": "grep_files",
+                    "params": {"path": str(self.test_dir), "pattern": "^tcp-", "max_matches": 1},
+                    "id": 4
+                }
+                f.write(json.dumps(request) + '\n')
+                f.flush()
+
+                result = json.loads(f.readline())["result"]
+                self.assertEqual(result["matches"], 1)
+                self.assertTrue(result["truncated"])
+                self.assertEqual(result["files"][0]["matches"][0]["line"], 1)
+
+    def test_tcp_tool_calls_run_on_scheduler(self):
+        """Test that tool calls run in the scheduler's interactive class and show up in scheduler/stats."""
+        with socket.create_connection((self.host, self.port), timeout=5) as sock:
+            with sock.makefile('rw', encoding='utf-8') as f:
+                self._read_and_validate_server_hello(f)
+                requests = [
+                    {"jsonrpc": "2.0", "method": "get_file_list", "params": [str(self.test_dir)], "id": 1},
+                    {"jsonrpc": "2.0", "method": "get_sha1_hash", "params": [str(self.test_dir / "tcp_file1.txt")], "id": 2},
+                    {"jsonrpc": "2.0", "method": "scheduler/stats", "id": 3},
+                ]
+                responses = []
+                for request in requests:
+                    f.write(json.dumps(request) + '\n')
+                    f.flush()
+                    responses.append(json.loads(f.readline()))
+
+        self.assertIn(str(self.test_dir / "tcp_file1.txt"), [entry["filename"] for entry in responses[0]["result"]])
+        self.assertIn("hash", responses[1]["result"])
+        classes = responses[2]["result"]["classes"]
+        self.assertEqual(classes["interactive"]["completed"], 2)
+        self.assertEqual(classes["background"]["completed"], 0)
+
+    def test_tcp_jobs_disabled_without_job_manager(self):
+        """Test that job methods are refused when the server was started without a job manager."""
+        with socket.create_connection((self.host, self.port), timeout=5) as sock:
+            with sock.makefile('rw', encoding='utf-8') as f:
+                self._read_and_validate_server_hello(f)
+                request = {"jsonrpc": "2.0", "method": "start_scan_job", "params": {"path": str(self.test_dir)}, "id": 1}
+                f.write(json.dumps(request) + '\n')
+                f.flush()
+                response = json.loads(f.readline())
+
+        self.assertEqual(response["error"]["code"], -32000)
+        self.assertIn("Jobs are not enabled", response["error"]["message"])
+
+    def test_tcp_job_calls_run_on_scheduler(self):
+        """Test that job methods run in the scheduler's interactive class, off the event loop."""
+        jobs_dir = PROJECT_ROOT / "test_temp_dir_for_tcp_jobs"
+        self.addCleanup(shutil.rmtree, jobs_dir, ignore_errors=True)
+        self.port = find_free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "mcp_efu", "--transport", "tcp", "--host", self.host, "--port", str(self.port),
+             "--jobs-dir", str(jobs_dir)],
+            cwd=str(PROJECT_ROOT / "servers" / "mcp_efu"),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_for_server()
+            with socket.create_connection((self.host, self.port), timeout=10) as sock:
+                with sock.makefile('rw', encoding='utf-8') as f:
+                    self._read_and_validate_server_hello(f)
+
+                    def call(method, params=None):
+                        request = {"jsonrpc": "2.0", "method": method, "params": params or {}, "id": 1}
+                        f.write(json.dumps(request) + '\n')
+                        f.flush()
+                        return json.loads(f.readline())
+
+                    job_id = call("start_scan_job", {"path": str(self.test_dir)})["result"]["job_id"]
+                    calls = 1
+                    deadline = time.time() + 10
+                    while call("job_status", {"job_id": job_id})["result"]["status"] in ("queued", "running"):
+                        calls += 1
+                        self.assertLess(time.time(), deadline, "Job did not finish.")
+                        time.sleep(0.05)
+                    calls += 1
+                    results = call("job_results", {"job_id": job_id})["result"]
+                    calls += 1
+                    classes = call("scheduler/stats")["result"]["classes"]
+        finally:
+            server.terminate()
+            server.wait(timeout=5)
+
+        self.assertEqual(len(results["entries"]), 4)
+        self.assertEqual(classes["interactive"]["completed"], calls)
+        self.assertEqual(classes["background"]["completed"], 1)
+
+    def test_tcp_server_metrics_and_profile(self):
+        """Test that requests are counted in server/metrics and that server/profile returns a profile."""
+        with socket.create_connection((self.host, self.port), timeout=10) as sock:
+            with sock.makefile('rw', encoding='utf-8') as f:
+                self._read_and_validate_server_hello(f)
+                requests = [
+                    {"jsonrpc": "2.0", "method": "get_file_list", "params": [str(self.test_dir)], "id": 1},
+                    {"jsonrpc": "2.0", "method": "no_such_method", "id": 2},
+                    {"jsonrpc": "2.0", "method": "server/profile", "params": {"seconds": 0.2, "mode": "cprofile", "limit": 5}, "id": 3},
+                    {"jsonrpc": "2.0", "method": "server/profile", "params": {"seconds": 0.2}, "id": 4},
+                    {"jsonrpc": "2.0", "method": "server/metrics", "id": 5},
+                ]
+                responses = []
+                for request in requests:
+                    f.write(json.dumps(request) + '\n')
+                    f.flush()
+                    responses.append(json.loads(f.readline()))
+
+        cprofile, sampling, metrics = responses[2]["result"], responses[3]["result"], responses[4]["result"]["metrics"]
+        self.assertEqual(cprofile["mode"], "cprofile")
+        self.assertLessEqual(len(cprofile["functions"]), 5)
+        self.assertEqual(sampling["mode"], "sampling")
+        self.assertGreater(sampling["samples"], 0)
+
+        def values(name):
+            return {tuple(sorted(s["labels"].items())): s.get("value", s.get("count")) for s in metrics[name]["samples"]}
+
+        requests_total = values("mcp_efu_requests_total")
+        self.assertEqual(requests_total[(("method", "get_file_list"),)], 1)
+        self.assertEqual(requests_total[(("method", "other"),)], 1)
+        self.assertEqual(values("mcp_efu_request_errors_total")[(("code", "-32601"), ("method", "other"))], 1)
+        self.assertEqual(values("mcp_efu_request_duration_seconds")[(("method", "server/profile"),)], 2)
+        self.assertEqual(values("mcp_efu_connections")[()], 1)
+        self.assertEqual(values("mcp_efu_cache_misses_total")[()], 1)
+        self.assertGreater(values("mcp_efu_received_bytes_total")[()], 0)
+
     def test_tcp_invalid_path_error(self):
         """Test an error response for a non-existent path over TCP."""
         try:
@@ -203,6 +358,21 @@ class TestTcpServerMode(unittest.TestCase):
         except ConnectionRefusedError:
             self.fail("Could not connect to the TCP server. Is it running?")
 
+    def test_tcp_scan_flags_must_be_booleans(self):
+        """Test that scan flags with non-boolean values, even falsy ones, are rejected as invalid params."""
+        with socket.create_connection((self.host, self.port), timeout=5) as sock:
+            with sock.makefile('rw', encoding='utf-8') as f:
+                self._read_and_validate_server_hello(f)
+                responses = []
+                for req_id, value in enumerate((0, "", "yes", None), 1):
+                    request = {"jsonrpc": "2.0", "method": "get_file_list", "params": {"path": str(self.test_dir), "dir_sizes": value}, "id": req_id}
+                    f.write(json.dumps(request) + '\n')
+                    f.flush()
+                    responses.append(json.loads(f.readline()))
+
+        for response in responses:
+            self.assertEqual(response["error"]["code"], -32602)
+
     def test_tcp_tools_list(self):
         """Test a successful tools/list request over TCP."""
         try:
@@ -230,7 +400,8 @@ class TestTcpServerMode(unittest.TestCase):
                     tool_names = {tool["name"] for tool in response["result"]["tools"]}
                     self.assertEqual(
                         tool_names,
-                        {"get_file_list", "get_md5_hash", "get_sha1_hash", "get_git_blob_hash"},
+                        {"get_file_list", "get_md5_hash", "get_sha1_hash", "get_git_blob_hash", "diff_file_lists", "read_file_list", "get_tree_summary", "estimate_tree", "grep_files",
+                         "start_scan_job", "start_hash_job", "job_status", "job_results", "cancel_job"},
                     )
         except ConnectionRefusedError:
             self.fail("Could not connect to the TCP server. Is it running?")
@@ -0,0 +1,222 @@
+"""
+Throughput benchmark for the proxy, with and without --passthrough.
+
+Starts a stand-in upstream server that sends every player a stream of play
+packets and then disconnects, a proxy (main.py) in front of it, and a client
+process that logs in --clients players through the proxy and counts the bytes
+it receives. Each mode reports packets per second, MB per second and the CPU
+time the proxy process used per packet.
+
+    python bench_passthrough.py
+    python bench_passthrough.py --clients 20 --packets 50000 --size 1024 --modes passthrough
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import closing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODES = ("decode", "passthrough")
+DEFAULT_CLIENTS = 4
+DEFAULT_PACKETS = 20000
+DEFAULT_SIZE = 512
+DEFAULT_COMPRESSION_THRESHOLD = 256
+
+
+def find_free_port():
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing is listening on port {port}.")
+
+
+def cpu_seconds(pid):
+    """User and system CPU time of a process, from /proc (Linux only)."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+# Stand-in upstream ------------------------------------------------------------
+
+def run_upstream(args):
+    from twisted.internet import reactor
+    from quarry.net.server import ServerFactory, ServerProtocol
+
+    class StreamingProtocol(ServerProtocol):
+        def player_joined(self):
+            ServerProtocol.player_joined(self)
+            # One pre-encoded frame, written --packets times in batches
+            payload = self.buff_type.pack_string("bench:data") + os.urandom(args.size // 2) * 2
+            data = self.buff_type.pack_varint(self.get_packet_ident("plugin_message")) + payload
+            frame = self.buff_type.pack_packet(data, self.compression_threshold)
+            self.send_batches(frame, args.packets)
+
+        def send_batches(self, frame, remaining):
+            if self.closed:
+                return
+            batch = min(remaining, 500)
+            self.transport.write(frame * batch)
+            if remaining > batch:
+                reactor.callLater(0, self.send_batches, frame, remaining - batch)
+            else:
+                self.transport.loseConnection()
+
+    factory = ServerFactory()
+    factory.protocol = StreamingProtocol
+    factory.online_mode = False
+    factory.compression_threshold = args.compression_threshold
+    factory.listen("127.0.0.1", args.port)
+    reactor.run()
+
+
+# Client ------------------------------------------------------------------------
+
+def run_client(args):
+    from twisted.internet import reactor
+    from quarry.data import packets
+    from quarry.net.auth import OfflineProfile
+    from quarry.net.client import ClientFactory, ClientProtocol
+
+    results = []
+
+    class CountingProtocol(ClientProtocol):
+        started = None
+        received = 0
+
+        def player_joined(self):
+            ClientProtocol.player_joined(self)
+            self.started = time.perf_counter()
+            # Count bytes from here on without decoding them
+            self.data_received = self.count
+
+        def count(self, data):
+            self.received += len(data)
+
+        def connection_lost(self, reason=None):
+            ClientProtocol.connection_lost(self, reason)
+            if self.started is not None:
+                results.append((self.received, time.perf_counter() - self.started))
+            else:
+                results.append(None)
+            if len(results) == args.clients:
+                reactor.stop()
+
+    for index in range(args.clients):
+        factory = ClientFactory(OfflineProfile(f"bench{index}"))
+        factory.protocol = CountingProtocol
+        factory.force_protocol_version = packets.default_protocol_version
+        factory.connect("127.0.0.1", args.port)
+    start = time.perf_counter()
+    reactor.run()
+    elapsed = time.perf_counter() - start
+
+    finished = [result for result in results if result is not None]
+    print(json.dumps({
+        "clients": args.clients,
+        "finished": len(finished),
+        "bytes": sum(received for received, _ in finished),
+        "seconds": elapsed,
+    }))
+
+
+# Driver -------------------------------------------------------------------------
+
+def bench_mode(args, mode):
+    upstream_port, proxy_port = find_free_port(), find_free_port()
+    common = ["--packets", str(args.packets), "--size", str(args.size), "--compression-threshold", str(args.compression_threshold)]
+    processes = []
+    try:
+        processes.append(subprocess.Popen(
+            [sys.executable, __file__, "--role", "upstream", "--port", str(upstream_port), *common],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        wait_for_port(upstream_port)
+        command = [
+            sys.executable, os.path.join(HERE, "main.py"), "--offline",
+            "--listen-host", "127.0.0.1", "--listen-port", str(proxy_port),
+            "--connect-host", "127.0.0.1", "--connect-port", str(upstream_port),
+        ]
+        if mode == "passthrough":
+            command.append("--passthrough")
+        command += args.proxy_arg
+        proxy = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(proxy)
+        wait_for_port(proxy_port)
+
+        cpu_before = cpu_seconds(proxy.pid)
+        client = subprocess.run(
+            [sys.executable, __file__, "--role", "client", "--port", str(proxy_port), "--clients", str(args.clients), *common],
+            capture_output=True, text=True, timeout=args.timeout,
+        )
+        proxy_cpu = cpu_seconds(proxy.pid) - cpu_before
+        if client.returncode != 0:
+            raise RuntimeError(f"Client failed: {client.stderr.strip()}")
+        result = json.loads(client.stdout)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=5)
+
+    packet_count = args.packets * result["finished"]
+    return {
+        "clients_finished": result["finished"],
+        "packets": packet_count,
+        "bytes": result["bytes"],
+        "seconds": round(result["seconds"], 3),
+        "packets_per_second": round(packet_count / result["seconds"]),
+        "mb_per_second": round(result["bytes"] / (1024 * 1024) / result["seconds"], 2),
+        "proxy_cpu_seconds": round(proxy_cpu, 3),
+        "proxy_cpu_us_per_packet": round(proxy_cpu / packet_count * 1e6, 3) if packet_count else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure proxy throughput with and without --passthrough.")
+    parser.add_argument("--role", choices=("driver", "upstream", "client"), default="driver", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="Proxy modes to measure (default: both).")
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS, help=f"Players streaming at the same time (default: {DEFAULT_CLIENTS}).")
+    parser.add_argument("--packets", type=int, default=DEFAULT_PACKETS, help=f"Packets sent to each player (default: {DEFAULT_PACKETS}).")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help=f"Approximate packet payload size in bytes (default: {DEFAULT_SIZE}).")
+    parser.add_argument(
+        "--compression-threshold",
+        type=int,
+        default=DEFAULT_COMPRESSION_THRESHOLD,
+        help=f"Upstream compression threshold; the proxy uses 256 towards the client (default: {DEFAULT_COMPRESSION_THRESHOLD}).",
+    )
+    parser.add_argument("--proxy-arg", action="append", default=[], help="Extra option for the proxy, e.g. --proxy-arg=--packet-stats-port=9100 (repeatable).")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for a run (default: 300).")
+    args = parser.parse_args()
+
+    if args.role == "upstream":
+        run_upstream(args)
+    elif args.role == "client":
+        run_client(args)
+    else:
+        results = {mode: bench_mode(args, mode) for mode in args.modes}
+        print(json.dumps({
+            "clients": args.clients,
+            "packets_per_client": args.packets,
+            "size": args.size,
+            "compression_threshold": args.compression_threshold,
+            "results": results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
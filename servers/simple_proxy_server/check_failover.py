@@ -0,0 +1,218 @@
+"""
+Failover check for the proxy with several upstream servers.
+
+Starts --upstreams stand-in upstream servers, each of which tells every
+player that joins which server it is, and a proxy (main.py) balancing over
+them. A client process logs --players players in once, then the first
+upstream server is stopped and the same players log in again. The check
+passes when every login succeeds both times, nobody lands on the stopped
+server, and (with --balance player-hash) only the players of the stopped
+server move.
+
+    python check_failover.py
+    python check_failover.py --upstreams 4 --players 100 --balance least-connections
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import closing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_UPSTREAMS = 3
+DEFAULT_PLAYERS = 30
+DEFAULT_STATUS_INTERVAL = 0.5
+# Logins in flight at once; below the proxy's player limit (quarry's default of 20)
+MAX_CONCURRENT_LOGINS = 10
+CHANNEL_PREFIX = "failover:"
+
+
+def find_free_port():
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing is listening on port {port}.")
+
+
+# Stand-in upstream ------------------------------------------------------------
+
+def run_upstream(args):
+    from twisted.internet import reactor
+    from quarry.net.server import ServerFactory, ServerProtocol
+
+    class NamingProtocol(ServerProtocol):
+        def player_joined(self):
+            ServerProtocol.player_joined(self)
+            # The channel name tells the client which server it reached
+            self.send_packet("plugin_message", self.buff_type.pack_string(f"{CHANNEL_PREFIX}{args.port}"))
+
+    factory = ServerFactory()
+    factory.protocol = NamingProtocol
+    factory.online_mode = False
+    factory.motd = f"Upstream {args.port}"
+    factory.listen("127.0.0.1", args.port)
+    reactor.run()
+
+
+# Client ------------------------------------------------------------------------
+
+def run_client(args):
+    from twisted.internet import reactor
+    from quarry.data import packets
+    from quarry.net.auth import OfflineProfile
+    from quarry.net.client import ClientFactory, ClientProtocol
+
+    names = [f"player{index:04d}" for index in range(args.players)]
+    servers = {}
+
+    class ReportingProtocol(ClientProtocol):
+        def packet_plugin_message(self, buff):
+            channel = buff.unpack_string()
+            buff.discard()
+            if channel.startswith(CHANNEL_PREFIX):
+                servers[self.factory.profile.display_name] = int(channel[len(CHANNEL_PREFIX):])
+                self.close()
+
+        def connection_lost(self, reason=None):
+            ClientProtocol.connection_lost(self, reason)
+            finished.append(self.factory.profile.display_name)
+            if len(finished) == len(names):
+                reactor.stop()
+            elif waiting:
+                login(waiting.pop())
+
+    def login(name):
+        factory = ClientFactory(OfflineProfile(name))
+        factory.protocol = ReportingProtocol
+        factory.force_protocol_version = packets.default_protocol_version
+        factory.connect("127.0.0.1", args.port)
+
+    finished = []
+    waiting = names[::-1]
+    for _ in range(min(MAX_CONCURRENT_LOGINS, len(names))):
+        login(waiting.pop())
+    reactor.callLater(args.timeout, reactor.stop)
+    start = time.perf_counter()
+    reactor.run()
+    print(json.dumps({
+        "servers": {name: servers.get(name) for name in names},
+        "seconds": time.perf_counter() - start,
+    }))
+
+
+# Driver -------------------------------------------------------------------------
+
+def login_round(args, proxy_port):
+    client = subprocess.run(
+        [sys.executable, __file__, "--role", "client", "--port", str(proxy_port), "--players", str(args.players),
+         "--timeout", str(args.timeout)],
+        capture_output=True, text=True, timeout=args.timeout + 30,
+    )
+    if client.returncode != 0:
+        raise RuntimeError(f"Client failed: {client.stderr.strip()}")
+    return json.loads(client.stdout)
+
+
+def check_failover(args):
+    upstream_ports = [find_free_port() for _ in range(args.upstreams)]
+    proxy_port = find_free_port()
+    upstreams = []
+    processes = []
+    try:
+        for port in upstream_ports:
+            upstream = subprocess.Popen(
+                [sys.executable, __file__, "--role", "upstream", "--port", str(port)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            upstreams.append(upstream)
+            processes.append(upstream)
+            wait_for_port(port)
+        command = [
+            sys.executable, os.path.join(HERE, "main.py"), "--offline",
+            "--listen-host", "127.0.0.1", "--listen-port", str(proxy_port),
+            "--balance", args.balance, "--status-interval", str(args.status_interval), "--stats-interval", "0",
+        ]
+        for port in upstream_ports:
+            command += ["--upstream", f"127.0.0.1:{port}"]
+        processes.append(subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        wait_for_port(proxy_port)
+
+        before = login_round(args, proxy_port)
+        stopped = upstream_ports[0]
+        upstreams[0].terminate()
+        upstreams[0].wait(timeout=5)
+        after = login_round(args, proxy_port)
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+                process.wait(timeout=5)
+
+    names = sorted(before["servers"])
+    moved = [name for name in names if after["servers"][name] != before["servers"][name]]
+    unexpected_moves = [name for name in moved if before["servers"][name] != stopped]
+    failures = {
+        "failed_logins_before": [name for name in names if before["servers"][name] is None],
+        "failed_logins_after": [name for name in names if after["servers"][name] is None],
+        "on_stopped_server": [name for name in names if after["servers"][name] == stopped],
+    }
+    if args.balance == "player-hash":
+        failures["unexpected_moves"] = unexpected_moves
+    return {
+        "balance": args.balance,
+        "players": args.players,
+        "stopped": stopped,
+        "before": dict(Counter(before["servers"].values())),
+        "after": dict(Counter(after["servers"].values())),
+        "moved": len(moved),
+        "seconds_before": round(before["seconds"], 3),
+        "seconds_after": round(after["seconds"], 3),
+        "failures": failures,
+        "ok": not any(failures.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the proxy moves players off an upstream server that stops.")
+    parser.add_argument("--role", choices=("driver", "upstream", "client"), default="driver", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--upstreams", type=int, default=DEFAULT_UPSTREAMS, help=f"Stand-in upstream servers (default: {DEFAULT_UPSTREAMS}).")
+    parser.add_argument("--players", type=int, default=DEFAULT_PLAYERS, help=f"Players logged in each round (default: {DEFAULT_PLAYERS}).")
+    parser.add_argument("--balance", default="player-hash", choices=("least-connections", "player-hash"), help="Balancer the proxy uses (default: player-hash).")
+    parser.add_argument(
+        "--status-interval",
+        type=float,
+        default=DEFAULT_STATUS_INTERVAL,
+        help=f"The proxy's --status-interval (default: {DEFAULT_STATUS_INTERVAL:g}).",
+    )
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for a round of logins (default: 60).")
+    args = parser.parse_args()
+
+    if args.role == "upstream":
+        run_upstream(args)
+    elif args.role == "client":
+        run_client(args)
+    else:
+        if args.upstreams < 2:
+            parser.error("--upstreams must be at least 2")
+        result = check_failover(args)
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,773 @@
 import argparse
-from quarry.net.proxy import Proxy, DownstreamFactory
+import bisect
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from twisted.internet import reactor, task
+from quarry.data import packets
+from quarry.net.client import ClientFactory, ClientProtocol
+from quarry.net.protocol import ProtocolError
+from quarry.net.proxy import Bridge, Downstream, DownstreamFactory, Upstream, UpstreamFactory
+from quarry.types.buffer import Buffer
+
+# Largest packet frame the protocol allows (a 3-byte VarInt length)
+MAX_FRAME_LENGTH = 2097151
+
+# A cached status older than this many refresh intervals is not served
+STATUS_MAX_AGE_INTERVALS = 3
+# Client addresses tracked by the status rate limiter before idle ones are dropped
+MAX_RATE_LIMITED_ADDRESSES = 10000
+# Failed status pings in a row before an upstream server is taken out of rotation
+HEALTH_CHECK_FAILURES = 2
+# Points per upstream server on the player-hash ring
+HASH_RING_POINTS = 100
+# With packet stats on, the handling time of one in this many decoded packets is measured
+DEFAULT_TIMING_SAMPLE = 100
+
+
+def read_varint(data, pos):
+    """
+    Reads a VarInt from `data` at `pos`. Returns (value, position after it),
+    or (None, pos) if the VarInt is not complete yet.
+    """
+    value = 0
+    for shift in range(0, 35, 7):
+        if pos >= len(data):
+            return None, pos
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+    raise ProtocolError("VarInt is too big")
+
+
+def peek_packet_ident(data, start, end, compression_threshold):
+    """
+    Returns the packet id of the frame body data[start:end] without decoding
+    the rest of the packet. Compressed bodies are only inflated far enough to
+    read the id.
+    """
+    if compression_threshold >= 0:
+        data_length, start = read_varint(data, start)
+        if data_length:
+            try:
+                head = zlib.decompressobj().decompress(data[start:end], 5)
+            except zlib.error as e:
+                raise ProtocolError("Bad compressed packet: %s" % e)
+            return read_varint(head, 0)[0]
+    return read_varint(data, start)[0]
+
+
+def _enable_passthrough(bridge, source, dest, hooked_idents, peek=peek_packet_ident):
+    """
+    Patches the `source` endpoint's ``data_received()`` method to split the
+    incoming data into frames and write them to `dest` as they are. Only
+    frames whose packet id is in `hooked_idents` are decoded and passed to the
+    bridge. If both sides use the same compression threshold, frames are not
+    even decompressed; otherwise each frame is re-framed for `dest`. `peek`
+    reads the packet id of each frame (PacketStats passes one that counts).
+    """
+    pending = bytearray()
+    direction = source.recv_direction
+
+    def data_received(data):
+        # Bytes the endpoint had buffered but not parsed when passthrough began
+        if len(source.recv_buff) > 0:
+            pending.extend(source.recv_buff.read())
+        pending.extend(source.cipher.decrypt(data))
+
+        out = []
+        pos = run_start = 0
+        try:
+            while not source.closed:
+                length, body = read_varint(pending, pos)
+                if length is None:
+                    break
+                # Checked before waiting for the rest, which would otherwise be buffered without limit
+                if length > MAX_FRAME_LENGTH:
+                    raise ProtocolError("Packet frame is too long: %d bytes" % length)
+                if body + length > len(pending):
+                    break
+                frame_end = body + length
+                threshold = source.compression_threshold
+
+                ident = peek(pending, body, frame_end, threshold)
+                if ident in hooked_idents:
+                    # Decode this one; everything before it goes out first to keep the order
+                    out.append(pending[run_start:pos])
+                    dest.transport.write(dest.cipher.encrypt(b"".join(out)))
+                    out = []
+                    buff = source.buff_type(bytes(pending[pos:frame_end]))
+                    buff = buff.unpack_packet(source.buff_type, threshold)
+                    name = source.get_packet_name(buff.unpack_varint())
+                    bridge.packet_received(buff, direction, name)
+                    run_start = frame_end
+                elif threshold != dest.compression_threshold:
+                    out.append(pending[run_start:pos])
+                    buff = source.buff_type(bytes(pending[pos:frame_end]))
+                    buff = buff.unpack_packet(source.buff_type, threshold)
+                    out.append(dest.buff_type.pack_packet(buff.read(), dest.compression_threshold))
+                    run_start = frame_end
+                pos = frame_end
+        except ProtocolError as e:
+            source.protocol_error(e)
+            return
+
+        out.append(pending[run_start:pos])
+        del pending[:pos]
+        data = b"".join(out)
+        if data:
+            dest.transport.write(dest.cipher.encrypt(data))
+        if pos:
+            source.connection_timer.restart()
+
+    source.data_received = data_received
+
 
 # This defines the proxy server that will sit between the client and the upstream server.
-# We can add custom logic here later to modify packets.
-class SimpleProxy(Proxy):
-    pass
+# We can add custom logic here later to modify packets: a method named
+# packet_<direction>_<packet name> (for example packet_upstream_chat_message)
+# receives that packet, and must send it on itself if it should be forwarded.
+class SimpleProxy(Bridge):
+    upstream_factory_class = None  # Set to SimpleUpstreamFactory below
+    # Packet ids with a hook, per (class, protocol version, direction)
+    _hooked_idents_cache = {}
+    # The upstream Backend this player is routed to, and those already tried
+    backend = None
+    tried_backends = ()
+
+    def hooked_idents(self, protocol_version, direction):
+        """Returns the play-mode packet ids that have a packet_<direction>_<name> method."""
+        key = (type(self), protocol_version, direction)
+        idents = self._hooked_idents_cache.get(key)
+        if idents is None:
+            idents = frozenset(
+                ident
+                for (version, mode, packet_direction, ident), name in packets.packet_names.items()
+                if version == protocol_version and mode == "play" and packet_direction == direction
+                and hasattr(self, "packet_%s_%s" % (direction, name))
+            )
+            self._hooked_idents_cache[key] = idents
+        return idents
+
+    def connect(self):
+        """Connects to the upstream server the balancer picks for this player."""
+        self.tried_backends = []
+        self.connect_next_backend()
+
+    def connect_next_backend(self):
+        backend = self.downstream_factory.pool.choose(self.downstream.display_name, self.tried_backends)
+        if backend is None:
+            self.downstream.close("No upstream server is available.")
+            return
+        self.tried_backends.append(backend)
+        self.backend = backend
+        backend.connection_opened(self)
+        self.connect_host = backend.host
+        self.connect_port = backend.port
+        Bridge.connect(self)
+
+    def upstream_connect_failed(self, reason):
+        """Called when the upstream server refused or timed out; tries the next one."""
+        self.logger.info("Upstream %s failed: %s" % (self.backend.address, reason.getErrorMessage()))
+        self.backend.connection_closed(self)
+        self.backend.connect_failed()
+        if not self.downstream.closed:
+            self.connect_next_backend()
+
+    def downstream_disconnected(self):
+        if self.backend is not None:
+            self.backend.connection_closed(self)
+        if self.downstream_factory.packet_stats is not None:
+            self.downstream_factory.packet_stats.connection_closed(self)
+        Bridge.downstream_disconnected(self)
+
+    def upstream_disconnected(self):
+        self.backend.connection_closed(self)
+        if self.downstream_factory.packet_stats is not None:
+            self.downstream_factory.packet_stats.connection_closed(self)
+        Bridge.upstream_disconnected(self)
+
+    def upstream_ready(self):
+        if self.downstream.closed:
+            # The player left while the upstream connection was being made
+            self.upstream.close()
+            return
+        if self.downstream_factory.packet_stats is not None:
+            self.downstream_factory.packet_stats.connection_opened(self)
+        if self.downstream_factory.passthrough:
+            self.enable_passthrough()
+        else:
+            Bridge.upstream_ready(self)
+
+    def enable_passthrough(self):
+        """
+        Enables passthrough. Frames are copied between the endpoints without
+        decoding, except for packets that have a hook on this class.
+        """
+        # Packets left in the endpoints' current read are still routed via the bridge
+        self.enable_forwarding()
+        version = self.downstream.protocol_version
+        stats = self.downstream_factory.packet_stats
+        for source, dest, direction in ((self.downstream, self.upstream, "upstream"), (self.upstream, self.downstream, "downstream")):
+            hooked_idents = self.hooked_idents(version, direction)
+            if stats is None:
+                _enable_passthrough(self, source, dest, hooked_idents)
+            else:
+                _enable_passthrough(self, source, dest, hooked_idents, stats.counting_peek(self, direction, hooked_idents))
+        self.logger.debug("Passthrough enabled")
+
+# Traffic of one player's connection, for PacketStats.
+class ConnectionStats:
+    __slots__ = ("player", "backend", "version", "opened", "packets", "bytes")
+
+    def __init__(self, bridge):
+        self.player = bridge.downstream.display_name
+        self.backend = bridge.backend.address
+        self.version = bridge.downstream.protocol_version
+        self.opened = time.monotonic()
+        # Per direction: "upstream" is player to server, "downstream" server to player
+        self.packets = {"upstream": 0, "downstream": 0}
+        self.bytes = {"upstream": 0, "downstream": 0}
+
+    def snapshot(self, now):
+        seconds = now - self.opened
+        return {
+            "player": self.player,
+            "backend": self.backend,
+            "seconds": round(seconds, 1),
+            "packets": dict(self.packets),
+            "bytes": dict(self.bytes),
+            "bytes_per_second": {
+                direction: round(count / seconds) if seconds > 0 else 0
+                for direction, count in self.bytes.items()
+            },
+        }
+
+# Counts packets and bytes per packet type and direction and per connection,
+# and times one in `sample_every` of the decoded packets. Only created with
+# --packet-stats or --packet-stats-port: without it, no instrumentation code
+# runs at all. Bytes are frame sizes as received for forwarded frames in
+# passthrough mode, and decoded payload sizes for decoded packets.
+class PacketStats:
+    def __init__(self, pool, sample_every=DEFAULT_TIMING_SAMPLE):
+        self.pool = pool
+        self.sample_every = sample_every
+        self.started = time.time()
+        # (direction, name) -> [packets, bytes], for decoded packets
+        self.by_name = {}
+        # (protocol version, direction, packet id) -> [packets, bytes], for passthrough frames
+        self.by_ident = {}
+        # (direction, name) -> [samples, seconds, max seconds]
+        self.timings = {}
+        self.connections = {}
+        self.closed_connections = 0
+        self.decoded = 0
+
+    def connection_opened(self, bridge):
+        self.connections[bridge] = ConnectionStats(bridge)
+        bridge.packet_received = lambda buff, direction, name: self.counted_packet_received(bridge, buff, direction, name)
+
+    def connection_closed(self, bridge):
+        if self.connections.pop(bridge, None) is not None:
+            self.closed_connections += 1
+
+    def counted_packet_received(self, bridge, buff, direction, name):
+        connection = self.connections.get(bridge)
+        if connection is not None:
+            size = len(buff)
+            connection.packets[direction] += 1
+            connection.bytes[direction] += size
+            counts = self.by_name.get((direction, name))
+            if counts is None:
+                counts = self.by_name[(direction, name)] = [0, 0]
+            counts[0] += 1
+            counts[1] += size
+        self.timed_packet_received(bridge, buff, direction, name)
+
+    def timed_packet_received(self, bridge, buff, direction, name):
+        self.decoded += 1
+        if self.decoded % self.sample_every:
+            Bridge.packet_received(bridge, buff, direction, name)
+            return
+        start = time.perf_counter()
+        Bridge.packet_received(bridge, buff, direction, name)
+        seconds = time.perf_counter() - start
+        timing = self.timings.get((direction, name))
+        if timing is None:
+            timing = self.timings[(direction, name)] = [0, 0.0, 0.0]
+        timing[0] += 1
+        timing[1] += seconds
+        if seconds > timing[2]:
+            timing[2] = seconds
+
+    def counting_peek(self, bridge, direction, hooked_idents):
+        """
+        Returns a peek function for _enable_passthrough that counts each frame.
+        Hooked packets are left to counted_packet_received, as they are decoded.
+        """
+        connection = self.connections[bridge]
+        packet_counts = connection.packets
+        byte_counts = connection.bytes
+        by_ident = self.by_ident
+        version = connection.version
+
+        def peek(data, start, end, compression_threshold):
+            ident = peek_packet_ident(data, start, end, compression_threshold)
+            if ident in hooked_idents:
+                return ident
+            packet_counts[direction] += 1
+            byte_counts[direction] += end - start
+            counts = by_ident.get((version, direction, ident))
+            if counts is None:
+                counts = by_ident[(version, direction, ident)] = [0, 0]
+            counts[0] += 1
+            counts[1] += end - start
+            return ident
+
+        return peek
+
+    def snapshot(self):
+        """Returns the stats as a JSON-serializable dict, packet types sorted by bytes."""
+        merged = {}
+        for (direction, name), (count, size) in self.by_name.items():
+            entry = merged.setdefault((direction, name), [0, 0])
+            entry[0] += count
+            entry[1] += size
+        for (version, direction, ident), (count, size) in self.by_ident.items():
+            name = packets.packet_names.get((version, "play", direction, ident), "0x%02x" % ident)
+            entry = merged.setdefault((direction, name), [0, 0])
+            entry[0] += count
+            entry[1] += size
+
+        by_direction = {"upstream": {}, "downstream": {}}
+        for (direction, name), (count, size) in sorted(merged.items(), key=lambda item: -item[1][1]):
+            entry = by_direction[direction][name] = {"packets": count, "bytes": size}
+            timing = self.timings.get((direction, name))
+            if timing is not None:
+                entry["handling"] = {
+                    "samples": timing[0],
+                    "mean_us": round(timing[1] / timing[0] * 1e6, 2),
+                    "max_us": round(timing[2] * 1e6, 2),
+                }
+
+        now = time.monotonic()
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "timing_sample": self.sample_every,
+            "packets": by_direction,
+            "connections": [connection.snapshot(now) for connection in self.connections.values()],
+            "closed_connections": self.closed_connections,
+            "backends": self.pool.stats(),
+        }
+
+    def dump(self, path):
+        """Writes the snapshot to `path`, replacing the previous one atomically."""
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temporary, path)
+
+    def listen(self, port, host="127.0.0.1"):
+        """Serves the snapshot as JSON over HTTP on host:port."""
+        from twisted.web import resource, server
+
+        stats = self
+
+        class StatsResource(resource.Resource):
+            isLeaf = True
+
+            def render_GET(self, request):
+                request.setHeader(b"content-type", b"application/json")
+                return json.dumps(stats.snapshot(), indent=2).encode("utf-8")
+
+        reactor.listenTCP(port, server.Site(StatsResource()), interface=host)
+
+# Counts the bytes each upstream server sends to its players.
+class SimpleUpstream(Upstream):
+    def dataReceived(self, data):
+        self.bridge.backend.bytes_in += len(data)
+        return Upstream.dataReceived(self, data)
+
+class SimpleUpstreamFactory(UpstreamFactory):
+    protocol = SimpleUpstream
+
+    def clientConnectionFailed(self, connector, reason):
+        self.bridge.upstream_connect_failed(reason)
+
+SimpleProxy.upstream_factory_class = SimpleUpstreamFactory
+
+# Fetches the upstream server's status for the StatusCache.
+class StatusClientProtocol(ClientProtocol):
+    def status_response(self, data):
+        self.factory.status_cache.update(data)
+        self.close()
+
+    def connection_lost(self, reason=None):
+        ClientProtocol.connection_lost(self, reason)
+        self.factory.status_cache.refresh_done()
+
+class StatusClientFactory(ClientFactory):
+    protocol = StatusClientProtocol
+    protocol_mode_next = "status"
+    connection_timeout = 5
+    status_cache = None
+
+    def clientConnectionFailed(self, connector, reason):
+        self.status_cache.refresh_done(reason)
+
+# Keeps a pre-encoded copy of the upstream server's status response, refreshed
+# in the background, so server-list pings are answered without contacting the
+# upstream server. Each refresh also serves as a health check: `on_result` is
+# called with whether it succeeded.
+class StatusCache:
+    def __init__(self, host, port, interval, on_result=None):
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.on_result = on_result
+        self.data = None
+        self.payload = None
+        self.updated = None
+        self.refreshing = False
+        self.received = False
+        self.logger = logging.getLogger("StatusCache")
+        self.loop = task.LoopingCall(self.refresh)
+
+    def start(self):
+        self.loop.start(self.interval, now=True)
+
+    def refresh(self):
+        if self.refreshing:
+            return
+        self.refreshing = True
+        self.received = False
+        factory = StatusClientFactory()
+        factory.status_cache = self
+        factory.connect(self.host, self.port)
+
+    def update(self, data):
+        self.data = data
+        self.payload = Buffer.pack_json(data)
+        self.updated = time.monotonic()
+        self.received = True
+
+    def refresh_done(self, reason=None):
+        self.refreshing = False
+        if reason is not None:
+            self.logger.debug("Status refresh of %s:%d failed: %s" % (self.host, self.port, reason.getErrorMessage()))
+        if self.on_result is not None:
+            self.on_result(self.received)
+
+    def get(self):
+        """Returns the status_response payload, or None if there is no recent one."""
+        if self.payload is None or time.monotonic() - self.updated > self.interval * STATUS_MAX_AGE_INTERVALS:
+            return None
+        return self.payload
+
+# One upstream server: its health, status cache and connection and traffic counters.
+class Backend:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.address = "%s:%d" % (host, port)
+        self.healthy = True
+        self.status = None
+        self.failed_checks = 0
+        # Bridges connecting or connected to this server
+        self.bridges = set()
+        self.connections = 0
+        self.connect_failures = 0
+        # Bytes received from the server, and from the players routed to it
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def active(self):
+        return len(self.bridges)
+
+    def connection_opened(self, bridge):
+        self.bridges.add(bridge)
+        self.connections += 1
+
+    def connection_closed(self, bridge):
+        self.bridges.discard(bridge)
+
+    def connect_failed(self):
+        self.connect_failures += 1
+        # Without health checks nothing would bring the server back into rotation
+        if self.status is not None:
+            self.healthy = False
+
+    def check_result(self, ok):
+        if ok:
+            self.failed_checks = 0
+            self.healthy = True
+        else:
+            self.failed_checks += 1
+            if self.failed_checks >= HEALTH_CHECK_FAILURES:
+                self.healthy = False
+
+    def stats(self):
+        return {
+            "address": self.address,
+            "healthy": self.healthy,
+            "active": self.active,
+            "connections": self.connections,
+            "connect_failures": self.connect_failures,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+# Balancers pick a Backend for a player from a non-empty list of candidates.
+class LeastConnections:
+    def __init__(self, backends):
+        pass
+
+    def choose(self, candidates, player_name):
+        return min(candidates, key=lambda backend: (backend.active, backend.connections))
+
+class PlayerHash:
+    """
+    Consistent hashing by player name: a player keeps landing on the same
+    server, and when a server leaves the rotation only its players move.
+    """
+    def __init__(self, backends):
+        self.ring = sorted(
+            (self.hash("%s#%d" % (backend.address, point)), index)
+            for index, backend in enumerate(backends)
+            for point in range(HASH_RING_POINTS)
+        )
+        self.points = [point for point, _ in self.ring]
+        self.backends = backends
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def choose(self, candidates, player_name):
+        start = bisect.bisect(self.points, self.hash(player_name.lower()))
+        for offset in range(len(self.ring)):
+            backend = self.backends[self.ring[(start + offset) % len(self.ring)][1]]
+            if backend in candidates:
+                return backend
+        return None
+
+BALANCERS = {
+    "least-connections": LeastConnections,
+    "player-hash": PlayerHash,
+}
+
+# The upstream servers, the balancer and the combined status shown in the server list.
+class BackendPool:
+    def __init__(self, backends, balancer="least-connections", status_interval=0):
+        self.backends = backends
+        self.balancer = BALANCERS[balancer](backends)
+        if status_interval > 0:
+            for backend in backends:
+                backend.status = StatusCache(backend.host, backend.port, status_interval, backend.check_result)
+        self._combined_key = None
+        self._combined_payload = None
+
+    def start(self):
+        for backend in self.backends:
+            if backend.status is not None:
+                backend.status.start()
+
+    def choose(self, player_name, exclude=()):
+        """Returns the Backend for a new login, preferring healthy servers, or None."""
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+        # If no server passed its last health checks, try them anyway
+        healthy = [backend for backend in candidates if backend.healthy]
+        return self.balancer.choose(healthy or candidates, player_name)
+
+    def status_payload(self):
+        """
+        Returns the status_response payload: the status of the first healthy
+        server with a recent one, with the player counts of all of them.
+        """
+        caches = [
+            backend.status for backend in self.backends
+            if backend.healthy and backend.status is not None and backend.status.get() is not None
+        ]
+        if len(caches) <= 1:
+            return caches[0].payload if caches else None
+        key = tuple(id(cache.payload) for cache in caches)
+        if key != self._combined_key:
+            data = dict(caches[0].data)
+            players = dict(data.get("players", {}))
+            players["online"] = sum(cache.data.get("players", {}).get("online", 0) for cache in caches)
+            players["max"] = sum(cache.data.get("players", {}).get("max", 0) for cache in caches)
+            data["players"] = players
+            self._combined_payload = Buffer.pack_json(data)
+            self._combined_key = key
+        return self._combined_payload
+
+    def stats(self):
+        return [backend.stats() for backend in self.backends]
+
+# Token bucket per client address: `rate` requests per second, up to `burst` at once.
+class RateLimiter:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        # address -> [tokens, time of the last request]
+        self.buckets = {}
+
+    def allow(self, address):
+        now = time.monotonic()
+        bucket = self.buckets.get(address)
+        if bucket is None:
+            if len(self.buckets) >= MAX_RATE_LIMITED_ADDRESSES:
+                self.prune(now)
+            bucket = self.buckets[address] = [self.burst, now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def prune(self, now):
+        # Buckets that have refilled are the same as new ones
+        refill_seconds = self.burst / self.rate
+        for address, (_, last) in list(self.buckets.items()):
+            if now - last >= refill_seconds:
+                del self.buckets[address]
+
+# Answers status requests from the StatusCache and rate-limits them per address.
+# Only logins open a connection to the upstream server.
+class SimpleDownstream(Downstream):
+    def dataReceived(self, data):
+        backend = self.bridge.backend
+        if backend is not None:
+            backend.bytes_out += len(data)
+        return Downstream.dataReceived(self, data)
+
+    def packet_handshake(self, buff):
+        Downstream.packet_handshake(self, buff)
+        limiter = self.factory.status_limiter
+        if self.protocol_mode == "status" and limiter is not None and not limiter.allow(self.remote_addr.host):
+            self.close()
+
+    def packet_status_request(self, buff):
+        payload = self.factory.pool.status_payload()
+        if payload is None:
+            # No recent upstream status: answer with the proxy's own
+            Downstream.packet_status_request(self, buff)
+        else:
+            self.send_packet("status_response", payload)
 
 # This factory creates instances of our SimpleProxy.
 class SimpleProxyFactory(DownstreamFactory):
-    proxy_class = SimpleProxy
+    protocol = SimpleDownstream
+    bridge_class = SimpleProxy
     # We set a high protocol_version to support a wide range of client versions.
     protocol_version = 999
+    # Forward raw frames after login instead of decoding every packet (--passthrough)
+    passthrough = False
+    # The upstream servers (a BackendPool)
+    pool = None
+    # RateLimiter for server-list pings (None: disabled)
+    status_limiter = None
+    # PacketStats (None: no instrumentation)
+    packet_stats = None
+
+def parse_upstream(value):
+    """Parses HOST[:PORT] for --upstream."""
+    host, _, port = value.rpartition(":")
+    if not host or not port.isdigit():
+        return value, 25565
+    return host, int(port)
+
+def print_stats(pool, interval, previous):
+    # Traffic per server since the last call, from the totals kept in `previous`
+    for stats in pool.stats():
+        last = previous.get(stats["address"], stats)
+        rate_in = (stats["bytes_in"] - last["bytes_in"]) / interval / 1024
+        rate_out = (stats["bytes_out"] - last["bytes_out"]) / interval / 1024
+        previous[stats["address"]] = stats
+        print(
+            f" >> {stats['address']}: {'up' if stats['healthy'] else 'DOWN'}, {stats['active']} active, "
+            f"{stats['connections']} total, {stats['connect_failures']} failed, "
+            f"{rate_in:.1f} KiB/s in, {rate_out:.1f} KiB/s out",
+            flush=True,
+        )
 
 def main():
     # Set up command-line arguments to make the proxy configurable
     parser = argparse.ArgumentParser()
     parser.add_argument("-a", "--listen-host", default="0.0.0.0", help="Host to listen on (default: 0.0.0.0)")
     parser.add_argument("-p", "--listen-port", default=25565, type=int, help="Port to listen on (default: 25565)")
-    parser.add_argument("-b", "--connect-host", required=True, help="Host of the upstream Minecraft server to connect to")
+    parser.add_argument("-b", "--connect-host", help="Host of the upstream Minecraft server to connect to")
     parser.add_argument("-q", "--connect-port", default=25565, type=int, help="Port of the upstream Minecraft server (default: 25565)")
+    parser.add_argument("-u", "--upstream", action="append", default=[], metavar="HOST[:PORT]", help="An upstream Minecraft server; repeat to balance players across several")
+    parser.add_argument("--balance", default="least-connections", choices=sorted(BALANCERS), help="How players are assigned to upstream servers (default: least-connections)")
+    parser.add_argument("--passthrough", action="store_true", help="After login, forward packets without decoding them (only hooked packets are decoded)")
+    parser.add_argument("--offline", action="store_true", help="Don't authenticate players with Mojang (for local testing)")
+    parser.add_argument("--status-interval", default=5.0, type=float, help="Seconds between status pings to each upstream server, which refresh the cached status and check its health; 0 disables both (default: 5)")
+    parser.add_argument("--status-rate", default=1.0, type=float, help="Status requests allowed per second per client address; 0 disables the limit (default: 1)")
+    parser.add_argument("--status-burst", default=5, type=int, help="Status requests a client address may make at once (default: 5)")
+    parser.add_argument("--packet-stats", metavar="FILE", help="Count packets per type, direction and connection, and write the counts to FILE as JSON every --packet-stats-interval seconds")
+    parser.add_argument("--packet-stats-port", type=int, help="Count packets like --packet-stats and serve the counts as JSON over HTTP on 127.0.0.1:PORT")
+    parser.add_argument("--packet-stats-interval", default=10.0, type=float, help="Seconds between writes of the --packet-stats file (default: 10)")
+    parser.add_argument("--packet-stats-sample", default=DEFAULT_TIMING_SAMPLE, type=int, help=f"Time the handling of one in this many decoded packets (default: {DEFAULT_TIMING_SAMPLE})")
+    parser.add_argument("--stats-interval", default=60.0, type=float, help="Seconds between per-server connection and traffic summaries; 0 disables them (default: 60)")
     args = parser.parse_args()
 
+    if args.packet_stats_sample < 1:
+        parser.error("--packet-stats-sample must be at least 1")
+
+    upstreams = [parse_upstream(value) for value in args.upstream]
+    if args.connect_host:
+        upstreams.insert(0, (args.connect_host, args.connect_port))
+    if not upstreams:
+        parser.error("give the upstream server with --connect-host or --upstream")
+
     # Create the factory for our proxy
-    factory = SimpleProxyFactory(args.connect_host, args.connect_port)
+    factory = SimpleProxyFactory()
+    factory.pool = BackendPool([Backend(host, port) for host, port in upstreams], args.balance, args.status_interval)
+    factory.pool.start()
+    factory.online_mode = not args.offline
+    factory.passthrough = args.passthrough
+    if args.status_rate > 0:
+        factory.status_limiter = RateLimiter(args.status_rate, args.status_burst)
+    if args.packet_stats or args.packet_stats_port:
+        factory.packet_stats = PacketStats(factory.pool, args.packet_stats_sample)
+        if args.packet_stats:
+            task.LoopingCall(factory.packet_stats.dump, args.packet_stats).start(args.packet_stats_interval, now=False)
+        if args.packet_stats_port:
+            factory.packet_stats.listen(args.packet_stats_port)
 
     # Start listening for connections
     factory.listen(args.listen_host, args.listen_port)
 
     print(f"MCP server proxy started!")
     print(f" >> Listening for clients on {args.listen_host}:{args.listen_port}")
-    print(f" >> Forwarding connections to {args.connect_host}:{args.connect_port}")
+    for host, port in upstreams:
+        print(f" >> Forwarding connections to {host}:{port}")
+    if len(upstreams) > 1:
+        print(f" >> Balancing players by {args.balance}")
+    if args.passthrough:
+        print(" >> Passthrough enabled: packets are forwarded without decoding after login")
+    if args.status_interval > 0:
+        print(f" >> Answering pings from the upstream status, refreshed every {args.status_interval:g}s")
+    if args.packet_stats:
+        print(f" >> Writing packet stats to {args.packet_stats} every {args.packet_stats_interval:g}s")
+    if args.packet_stats_port:
+        print(f" >> Serving packet stats on http://127.0.0.1:{args.packet_stats_port}/")
     print("Press Ctrl+C to stop.")
+    if args.stats_interval > 0:
+        task.LoopingCall(print_stats, factory.pool, args.stats_interval, {}).start(args.stats_interval, now=False)
+    reactor.run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import unittest
+
+# main.py is run as a script, so import it from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Backend, BackendPool, PlayerHash  # noqa: E402
+
+NAMES = ["player%03d" % index for index in range(300)]
+
+
+def make_backends(count):
+    return [Backend("127.0.0.1", 26000 + index) for index in range(count)]
+
+
+class TestPlayerHash(unittest.TestCase):
+    def setUp(self):
+        self.backends = make_backends(3)
+        self.balancer = PlayerHash(self.backends)
+
+    def test_same_player_same_server(self):
+        for name in NAMES[:20]:
+            self.assertIs(self.balancer.choose(self.backends, name), self.balancer.choose(self.backends, name))
+            self.assertIs(self.balancer.choose(self.backends, name), self.balancer.choose(self.backends, name.upper()))
+
+    def test_players_are_spread(self):
+        counts = {backend: 0 for backend in self.backends}
+        for name in NAMES:
+            counts[self.balancer.choose(self.backends, name)] += 1
+        for count in counts.values():
+            self.assertGreater(count, len(NAMES) // 6)
+
+    def test_only_players_of_a_leaving_server_move(self):
+        before = {name: self.balancer.choose(self.backends, name) for name in NAMES}
+        gone = self.backends[1]
+        remaining = [backend for backend in self.backends if backend is not gone]
+        after = {name: self.balancer.choose(remaining, name) for name in NAMES}
+
+        for name in NAMES:
+            if before[name] is not gone:
+                self.assertIs(after[name], before[name], name)
+        moved_to = {after[name] for name in NAMES if before[name] is gone}
+        # The leaving server's players are spread over both others
+        self.assertEqual(moved_to, set(remaining))
+
+        # When it returns, its players come back and nobody else moves
+        self.assertEqual({name: self.balancer.choose(self.backends, name) for name in NAMES}, before)
+
+    def test_no_candidates(self):
+        self.assertIsNone(self.balancer.choose([], "player"))
+
+
+class TestBackendPool(unittest.TestCase):
+    def test_least_connections_prefers_fewest_active(self):
+        backends = make_backends(3)
+        pool = BackendPool(backends)
+        backends[0].connection_opened(object())
+        backends[1].connection_opened(object())
+        self.assertIs(pool.choose("player"), backends[2])
+
+    def test_healthy_servers_first(self):
+        backends = make_backends(3)
+        pool = BackendPool(backends, "player-hash")
+        backends[0].healthy = backends[2].healthy = False
+        for name in NAMES[:50]:
+            self.assertIs(pool.choose(name), backends[1])
+
+    def test_unhealthy_servers_when_none_is_healthy(self):
+        backends = make_backends(2)
+        pool = BackendPool(backends)
+        for backend in backends:
+            backend.healthy = False
+        self.assertIn(pool.choose("player"), backends)
+
+    def test_excluded_servers_are_not_retried(self):
+        backends = make_backends(3)
+        pool = BackendPool(backends)
+        backends[0].healthy = False
+        self.assertIs(pool.choose("player", exclude=[backends[1]]), backends[2])
+        # The unhealthy server is the last resort
+        self.assertIs(pool.choose("player", exclude=backends[1:]), backends[0])
+        self.assertIsNone(pool.choose("player", exclude=backends))
+
+
+class TestBackendHealth(unittest.TestCase):
+    def test_failed_checks_take_server_out_of_rotation(self):
+        backend = Backend("127.0.0.1", 26000)
+        backend.check_result(False)
+        self.assertTrue(backend.healthy)
+        backend.check_result(False)
+        self.assertFalse(backend.healthy)
+        backend.check_result(True)
+        self.assertTrue(backend.healthy)
+        self.assertEqual(backend.failed_checks, 0)
+
+    def test_failed_connect_marks_down_only_with_health_checks(self):
+        backend = Backend("127.0.0.1", 26000)
+        backend.connect_failed()
+        self.assertTrue(backend.healthy)
+        pool = BackendPool([backend], status_interval=5)
+        backend.connect_failed()
+        self.assertFalse(backend.healthy)
+        self.assertEqual(backend.connect_failures, 2)
+        self.assertIsNotNone(pool.backends[0].status)
+
+
+if __name__ == "__main__":
+    unittest.main()
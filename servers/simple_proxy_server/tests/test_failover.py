@@ -0,0 +1,31 @@
+import argparse
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from check_failover import check_failover  # noqa: E402
+
+
+class TestFailover(unittest.TestCase):
+    def run_check(self, balance):
+        args = argparse.Namespace(upstreams=3, players=20, balance=balance, status_interval=0.5, timeout=30)
+        try:
+            return check_failover(args)
+        except PermissionError:
+            self.skipTest("TCP sockets not permitted in this environment.")
+
+    def test_player_hash_moves_only_players_of_stopped_server(self):
+        result = self.run_check("player-hash")
+        self.assertTrue(result["ok"], result["failures"])
+        self.assertNotIn(result["stopped"], result["after"])
+
+    def test_least_connections_avoids_stopped_server(self):
+        result = self.run_check("least-connections")
+        self.assertTrue(result["ok"], result["failures"])
+        self.assertNotIn(result["stopped"], result["after"])
+
+
+if __name__ == "__main__":
+    unittest.main()
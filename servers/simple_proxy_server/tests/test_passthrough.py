@@ -0,0 +1,192 @@
+import os
+import sys
+import unittest
+
+# main.py is run as a script, so import it from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quarry.net.crypto import Cipher  # noqa: E402
+from quarry.types.buffer import Buffer  # noqa: E402
+
+from main import MAX_FRAME_LENGTH, _enable_passthrough  # noqa: E402
+
+HOOKED = 0x02
+
+
+def packet(ident, payload):
+    return Buffer.pack_varint(ident) + payload
+
+
+def frame(ident, payload, compression_threshold=-1):
+    return Buffer.pack_packet(packet(ident, payload), compression_threshold)
+
+
+def unpack_frames(data, compression_threshold=-1):
+    """Splits `data` into frames and returns the (packet id, payload) of each."""
+    buff = Buffer(data)
+    result = []
+    while len(buff):
+        body = buff.unpack_packet(Buffer, compression_threshold)
+        result.append((body.unpack_varint(), body.read()))
+    return result
+
+
+class FakeTimer:
+    def __init__(self):
+        self.restarts = 0
+
+    def restart(self):
+        self.restarts += 1
+
+
+class FakeTransport:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    def data(self):
+        return b"".join(self.writes)
+
+
+# Stands in for the quarry endpoint a Bridge reads from or writes to.
+class FakeEndpoint:
+    recv_direction = "upstream"
+    buff_type = Buffer
+    closed = False
+
+    def __init__(self, compression_threshold=-1):
+        self.compression_threshold = compression_threshold
+        self.recv_buff = Buffer()
+        self.cipher = Cipher()
+        self.transport = FakeTransport()
+        self.connection_timer = FakeTimer()
+        self.errors = []
+
+    def get_packet_name(self, ident):
+        return "packet_%02x" % ident
+
+    def protocol_error(self, error):
+        self.errors.append(error)
+
+
+class FakeBridge:
+    def __init__(self, dest):
+        self.dest = dest
+        # (direction, name, payload, bytes written to dest before it)
+        self.received = []
+
+    def packet_received(self, buff, direction, name):
+        self.received.append((direction, name, buff.read(), len(self.dest.transport.data())))
+
+
+class TestPassthrough(unittest.TestCase):
+    def connect(self, source_threshold=-1, dest_threshold=-1):
+        self.source = FakeEndpoint(source_threshold)
+        self.dest = FakeEndpoint(dest_threshold)
+        self.bridge = FakeBridge(self.dest)
+        _enable_passthrough(self.bridge, self.source, self.dest, frozenset([HOOKED]))
+
+    def test_frames_split_across_reads(self):
+        self.connect()
+        data = frame(0x01, b"a" * 10) + frame(0x03, b"b" * 300) + frame(0x04, b"")
+        for start in range(0, len(data), 7):
+            self.source.data_received(data[start:start + 7])
+
+        self.assertEqual(self.dest.transport.data(), data)
+        # Only whole frames are written
+        for chunk in self.dest.transport.writes:
+            unpack_frames(chunk)
+        self.assertEqual(self.source.connection_timer.restarts, len(self.dest.transport.writes))
+
+    def test_incomplete_frame_is_held_back(self):
+        self.connect()
+        first = frame(0x01, b"first")
+        second = frame(0x03, b"second")
+        self.source.data_received(first + second[:3])
+        self.assertEqual(self.dest.transport.data(), first)
+        self.source.data_received(second[3:])
+        self.assertEqual(self.dest.transport.data(), first + second)
+
+    def test_leftover_recv_buff_goes_first(self):
+        self.connect()
+        first = frame(0x01, b"buffered")
+        second = frame(0x03, b"split")
+        self.source.recv_buff.add(first + second[:4])
+        self.source.data_received(second[4:])
+        self.assertEqual(self.dest.transport.data(), first + second)
+        self.assertEqual(len(self.source.recv_buff), 0)
+
+    def test_hooked_packets_are_decoded_in_order(self):
+        self.connect()
+        before = frame(0x01, b"before")
+        after = frame(0x03, b"after")
+        self.source.data_received(before + frame(HOOKED, b"hooked") + after + frame(HOOKED, b"again"))
+
+        # Hooked frames go to the bridge, not to dest, after everything before them is written
+        self.assertEqual(self.bridge.received, [
+            ("upstream", "packet_02", b"hooked", len(before)),
+            ("upstream", "packet_02", b"again", len(before + after)),
+        ])
+        self.assertEqual(self.dest.transport.data(), before + after)
+
+    def test_same_threshold_is_not_recompressed(self):
+        self.connect(64, 64)
+        data = frame(0x01, b"small", 64) + frame(0x03, bytes(range(256)) * 4, 64)
+        self.source.data_received(data)
+        self.assertEqual(self.dest.transport.data(), data)
+
+    def test_reframed_for_uncompressed_dest(self):
+        self.connect(64, -1)
+        payloads = [(0x01, b"small"), (0x03, b"x" * 1000)]
+        self.source.data_received(b"".join(frame(ident, payload, 64) for ident, payload in payloads))
+        self.assertEqual(unpack_frames(self.dest.transport.data(), -1), payloads)
+
+    def test_reframed_for_compressed_dest(self):
+        self.connect(-1, 16)
+        payloads = [(0x01, b"small"), (0x03, b"x" * 1000), (0x04, b"")]
+        self.source.data_received(b"".join(frame(ident, payload) for ident, payload in payloads))
+        data = self.dest.transport.data()
+        self.assertEqual(unpack_frames(data, 16), payloads)
+        # The large packet was compressed for dest
+        self.assertLess(len(data), 1000)
+
+    def test_hooked_compressed_packet(self):
+        self.connect(16, 16)
+        payload = b"y" * 500
+        self.source.data_received(frame(0x01, b"plain", 16) + frame(HOOKED, payload, 16))
+        self.assertEqual(self.bridge.received, [("upstream", "packet_02", payload, len(frame(0x01, b"plain", 16)))])
+        self.assertEqual(unpack_frames(self.dest.transport.data(), 16), [(0x01, b"plain")])
+
+    def test_encrypted_stream(self):
+        self.connect()
+        client, server = Cipher(), Cipher()
+        client.enable(b"k" * 16)
+        self.source.cipher.enable(b"k" * 16)
+        self.dest.cipher.enable(b"d" * 16)
+        server.enable(b"d" * 16)
+
+        data = frame(0x01, b"one") + frame(HOOKED, b"hooked") + frame(0x03, b"two" * 50)
+        encrypted = client.encrypt(data)
+        for start in range(0, len(encrypted), 5):
+            self.source.data_received(encrypted[start:start + 5])
+
+        self.assertEqual(unpack_frames(server.decrypt(self.dest.transport.data())), [(0x01, b"one"), (0x03, b"two" * 50)])
+        self.assertEqual([received[2] for received in self.bridge.received], [b"hooked"])
+
+    def test_too_long_frame_is_protocol_error(self):
+        self.connect()
+        self.source.data_received(Buffer.pack_varint(MAX_FRAME_LENGTH + 1) + b"x" * 10)
+        self.assertEqual(len(self.source.errors), 1)
+        self.assertEqual(self.dest.transport.writes, [])
+
+    def test_closed_source_stops_forwarding(self):
+        self.connect()
+        self.source.closed = True
+        self.source.data_received(frame(0x01, b"late"))
+        self.assertEqual(self.dest.transport.writes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# main.py is run as a script, so import it from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quarry.types.buffer import Buffer  # noqa: E402
+
+from main import MAX_RATE_LIMITED_ADDRESSES, STATUS_MAX_AGE_INTERVALS, Backend, BackendPool, RateLimiter, StatusCache  # noqa: E402
+
+STATUS = {"version": {"name": "1.20", "protocol": 763}, "players": {"online": 3, "max": 20}, "description": "test"}
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ClockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("main.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestRateLimiter(ClockTestCase):
+    def test_burst_then_limited(self):
+        limiter = RateLimiter(rate=1, burst=3)
+        self.assertEqual([limiter.allow("1.2.3.4") for _ in range(4)], [True, True, True, False])
+        # Other addresses have their own bucket
+        self.assertTrue(limiter.allow("5.6.7.8"))
+
+    def test_tokens_refill(self):
+        limiter = RateLimiter(rate=2, burst=2)
+        self.assertTrue(limiter.allow("1.2.3.4"))
+        self.assertTrue(limiter.allow("1.2.3.4"))
+        self.assertFalse(limiter.allow("1.2.3.4"))
+
+        self.clock.now += 0.5
+        self.assertTrue(limiter.allow("1.2.3.4"))
+        self.assertFalse(limiter.allow("1.2.3.4"))
+
+        # Refilling stops at the burst size
+        self.clock.now += 60
+        self.assertEqual([limiter.allow("1.2.3.4") for _ in range(3)], [True, True, False])
+
+    def test_denied_requests_do_not_build_up_debt(self):
+        limiter = RateLimiter(rate=1, burst=1)
+        self.assertTrue(limiter.allow("1.2.3.4"))
+        for _ in range(3):
+            self.clock.now += 0.25
+            self.assertFalse(limiter.allow("1.2.3.4"))
+        # A second after the first request there is a token again
+        self.clock.now += 0.25
+        self.assertTrue(limiter.allow("1.2.3.4"))
+
+    def test_idle_addresses_are_pruned_when_full(self):
+        limiter = RateLimiter(rate=1, burst=2)
+        for index in range(MAX_RATE_LIMITED_ADDRESSES - 1):
+            limiter.buckets["10.0.%d.%d" % divmod(index, 256)] = [0, self.clock.now - 10]
+        self.assertTrue(limiter.allow("1.2.3.4"))
+        self.assertEqual(len(limiter.buckets), MAX_RATE_LIMITED_ADDRESSES)
+
+        # Full: the next new address drops the refilled buckets, not the one still limited
+        self.clock.now += 1
+        self.assertTrue(limiter.allow("5.6.7.8"))
+        self.assertEqual(set(limiter.buckets), {"1.2.3.4", "5.6.7.8"})
+
+    def test_no_pruning_below_the_limit(self):
+        limiter = RateLimiter(rate=1, burst=1)
+        limiter.allow("1.2.3.4")
+        self.clock.now += 100
+        limiter.allow("5.6.7.8")
+        self.assertEqual(set(limiter.buckets), {"1.2.3.4", "5.6.7.8"})
+
+
+class TestStatusCache(ClockTestCase):
+    def setUp(self):
+        ClockTestCase.setUp(self)
+        self.results = []
+        self.cache = StatusCache("127.0.0.1", 26000, 5, self.results.append)
+
+    def test_empty_until_updated(self):
+        self.assertIsNone(self.cache.get())
+        self.cache.update(STATUS)
+        self.assertIsNotNone(self.cache.get())
+
+    def test_stale_status_is_not_served(self):
+        self.cache.update(STATUS)
+        payload = self.cache.get()
+        self.clock.now += 5 * STATUS_MAX_AGE_INTERVALS
+        self.assertIs(self.cache.get(), payload)
+        self.clock.now += 0.1
+        self.assertIsNone(self.cache.get())
+
+        # A new response makes it servable again
+        self.cache.update(STATUS)
+        self.assertIsNotNone(self.cache.get())
+
+    def test_refresh_result(self):
+        self.cache.refreshing = True
+        self.cache.update(STATUS)
+        self.cache.refresh_done()
+        self.assertFalse(self.cache.refreshing)
+        # A connection closed without a status response is a failed check
+        self.cache.received = False
+        self.cache.refresh_done()
+        self.assertEqual(self.results, [True, False])
+
+    def test_pool_skips_stale_status(self):
+        backends = [Backend("127.0.0.1", 26000), Backend("127.0.0.1", 26001)]
+        pool = BackendPool(backends, status_interval=5)
+        backends[0].status.update(STATUS)
+        self.clock.now += 5 * STATUS_MAX_AGE_INTERVALS + 1
+        backends[1].status.update(dict(STATUS, description="second"))
+        self.assertIs(pool.status_payload(), backends[1].status.payload)
+
+        # Both recent: the player counts are combined
+        backends[0].status.update(STATUS)
+        combined = Buffer(pool.status_payload()).unpack_json()
+        self.assertEqual(combined["players"], {"online": 6, "max": 40})
+
+
+if __name__ == "__main__":
+    unittest.main()